@@ -1,73 +1,105 @@
 import os
 import sys
-import random
-import string
-from flask import Flask, request, jsonify
+import uuid
+import threading
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-import sqlite3
 import json
 
 sys.path.append(os.path.abspath("../models"))
 sys.path.append(os.path.abspath("../ProcessData"))
 
-from chatbot import ask_policy_bot
+from chatbot import ask_policy_bot, stream_policy_bot, get_components, components_ready, warm_up
 from load_documents import process_pdf
+from job_queue import JobQueue
+from chat_store import get_chat_store
+from pipeline_metrics import render_metrics, stage
 
-# Khởi tạo Flask và SQLAlchemy
+# Khởi tạo Flask
 app = Flask(__name__)
 CORS(app)
 
-# Cấu hình cơ sở dữ liệu SQLite
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///messages.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
-
-# Mô hình lưu trữ tin nhắn
-class MessageHistory(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    conversation_id = db.Column(db.String(100), nullable=False)
-    user_message = db.Column(db.String(500), nullable=False)
-    bot_response = db.Column(db.String(500), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-
-# Khởi tạo cơ sở dữ liệu (nếu chưa có)
-with app.app_context():
-    db.create_all()
-
-# Hàm tạo conversation_id ngẫu nhiên
+def describe_ingest_error(error_msg):
+    """Chuyển lỗi thường gặp khi xử lý PDF thành thông báo dễ hiểu"""
+    if "JVM" in error_msg or "Java" in error_msg:
+        return "Lỗi Java: Vui lòng cài đặt Java JDK và thiết lập JAVA_HOME"
+    elif "Tesseract" in error_msg:
+        return "Lỗi Tesseract: Vui lòng cài đặt Tesseract OCR"
+    elif "Permission denied" in error_msg:
+        return "Lỗi quyền truy cập: Không thể tạo thư mục hoặc ghi file"
+    return f"Lỗi xử lý PDF: {error_msg}"
+
+def run_pdf_job(payload, context):
+    """Job nạp PDF chạy nền; phần trích xuất chạy trong process con để không làm chậm chat"""
+    try:
+        return process_pdf(payload["file_path"], progress=context.update, in_subprocess=True)
+    except Exception as e:
+        print(f"Error processing PDF: {str(e)}")
+        raise RuntimeError(describe_ingest_error(str(e))) from e
+
+# Hàng đợi job nạp tài liệu, tạo ở lần dùng đầu tiên trong process server. Không tạo lúc
+# import: process con (spawn) của pool trích xuất nạp lại file này dưới tên __mp_main__,
+# nếu tạo ở đây mỗi process con sẽ chạy lại các job dở dang (_resume) và không bao giờ thoát
+_ingest_jobs = None
+_ingest_jobs_lock = threading.Lock()
+
+def get_ingest_jobs():
+    """Hàng đợi job nạp tài liệu dùng chung; các job dở dang được chạy lại khi tạo"""
+    global _ingest_jobs
+    if _ingest_jobs is None:
+        with _ingest_jobs_lock:
+            if _ingest_jobs is None:
+                _ingest_jobs = JobQueue({"pdf": run_pdf_job})
+    return _ingest_jobs
+
+def warm_up_on_startup():
+    try:
+        timings = warm_up()
+        print(f"Chatbot warm-up xong: {timings}")
+    except Exception as e:
+        print(f"Chatbot warm-up lỗi, sẽ thử lại ở request đầu tiên: {str(e)}")
+
+def start_services():
+    """Khởi động các thành phần chạy nền của server; chỉ gọi trong process server"""
+    # Lưu trữ chat dùng chung (chat_history.db); dữ liệu messages.db cũ được gộp vào khi khởi động
+    get_chat_store()
+    # Chạy lại các job nạp tài liệu dở dang từ lần chạy trước
+    get_ingest_jobs()
+    # Chatbot (LLM, Chroma...) được tạo ở request đầu tiên; CHATBOT_WARMUP=1 tạo sẵn và nạp
+    # chỉ mục ngay khi khởi động, chạy nền để server nhận request ngay
+    if os.getenv("CHATBOT_WARMUP", "0") == "1":
+        threading.Thread(target=warm_up_on_startup, name="chatbot-warmup", daemon=True).start()
+
+# Hàm tạo conversation_id ngẫu nhiên: tiền tố ngày để dễ đọc, uuid4 để hai cuộc hội thoại
+# bắt đầu cùng lúc không dùng chung memory/lịch sử
 def generate_conversation_id():
     today = datetime.utcnow().strftime('%Y-%m-%d')
-    random_str = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
-    return f"{today}_{random_str}"
-
-def get_db_connection():
-    conn = sqlite3.connect('chat_history.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    conn = get_db_connection()
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS conversations (
-            id TEXT PRIMARY KEY,
-            date TEXT NOT NULL
-        )
-    ''')
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            conversation_id TEXT NOT NULL,
-            content TEXT NOT NULL,
-            is_bot BOOLEAN NOT NULL,
-            timestamp TEXT NOT NULL,
-            sources TEXT,
-            FOREIGN KEY (conversation_id) REFERENCES conversations (id)
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    return f"{today}_{uuid.uuid4().hex}"
+
+def build_chat_payload(question, answer, sources, response_time, conversation_id, end_time):
+    """Tạo JSON trả về cho client từ kết quả của chatbot"""
+    sources = sources or {}
+    prompt_tokens = sources.get("prompt_tokens", 0)
+    completion_tokens = sources.get("completion_tokens", 0)
+    total_tokens = prompt_tokens + completion_tokens
+    return {
+        "question": question,
+        "answer": answer,
+        "response_time": round(response_time, 2),
+        "token_usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": total_tokens
+        },
+        "conversation_id": conversation_id,
+        "timestamp": end_time.isoformat(),
+        "sources": sources
+    }
+
+def format_sse(event, data):
+    """Định dạng một sự kiện server-sent events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 @app.route("/api/chat", methods=["POST"])
 def chat():
@@ -81,11 +113,15 @@ def chat():
             print("No question provided in request")
             return jsonify({"error": "No question provided"}), 400
 
+        # Tạo conversation_id mới nếu chưa có, để chatbot dùng đúng memory của cuộc hội thoại
+        if not conversation_id:
+            conversation_id = generate_conversation_id()
+
         try:
             print(f"Calling ask_policy_bot with question: {question}")
             # Bắt đầu tính thời gian
             start_time = datetime.now()
-            response = ask_policy_bot(question)
+            response = ask_policy_bot(question, conversation_id=conversation_id)
             end_time = datetime.now()
             response_time = (end_time - start_time).total_seconds()
 
@@ -101,65 +137,14 @@ def chat():
                 print("No answer received from chatbot")
                 return jsonify({"error": "Không nhận được câu trả lời từ chatbot"}), 500
 
-            # Tạo conversation_id mới nếu chưa có
-            if not conversation_id:
-                conversation_id = datetime.now().strftime('%Y%m%d_%H%M%S')
-                conn = get_db_connection()
-                conn.execute(
-                    'INSERT INTO conversations (id, date) VALUES (?, ?)',
-                    (conversation_id, datetime.now().isoformat())
-                )
-                conn.commit()
-                conn.close()
-
-            # Lưu tin nhắn của user
-            conn = get_db_connection()
-            conn.execute(
-                'INSERT INTO messages (conversation_id, content, is_bot, timestamp) VALUES (?, ?, ?, ?)',
-                (conversation_id, question, False, datetime.now().isoformat())
-            )
-
-            # Lưu tin nhắn của bot
             sources = response.get("sources", {}) if isinstance(response, dict) else {}
-            conn.execute(
-                'INSERT INTO messages (conversation_id, content, is_bot, timestamp, sources) VALUES (?, ?, ?, ?, ?)',
-                (conversation_id, answer, True, datetime.now().isoformat(), json.dumps(sources))
-            )
-            conn.commit()
-            conn.close()
+            with stage("persist"):
+                get_chat_store().save_turn(conversation_id, question, answer, sources)
 
             # Trả về response với đầy đủ thông tin
-            prompt_tokens = sources.get("prompt_tokens", 0)
-            completion_tokens = sources.get("completion_tokens", 0)
-            total_tokens = prompt_tokens + completion_tokens
-
-            print("Trả về JSON:", {
-                "question": question,
-                "answer": answer,
-                "response_time": round(response_time, 2),
-                "token_usage": {
-                    "prompt_tokens": prompt_tokens,
-                    "completion_tokens": completion_tokens,
-                    "total_tokens": total_tokens
-                },
-                "conversation_id": conversation_id,
-                "timestamp": end_time.isoformat(),
-                "sources": sources
-            })
-
-            return jsonify({
-                "question": question,
-                "answer": answer,
-                "response_time": round(response_time, 2),
-                "token_usage": {
-                    "prompt_tokens": prompt_tokens,
-                    "completion_tokens": completion_tokens,
-                    "total_tokens": total_tokens
-                },
-                "conversation_id": conversation_id,
-                "timestamp": end_time.isoformat(),
-                "sources": sources
-            })
+            payload = build_chat_payload(question, answer, sources, response_time, conversation_id, end_time)
+            print("Trả về JSON:", payload)
+            return jsonify(payload)
 
         except Exception as bot_error:
             error_msg = str(bot_error)
@@ -177,6 +162,83 @@ def chat():
         print(f"Error in chat endpoint: {str(e)}")
         return jsonify({"error": f"Lỗi server: {str(e)}"}), 500
 
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    data = request.json or {}
+    question = data.get("question")
+    conversation_id = data.get("conversation_id")
+
+    if not question:
+        return jsonify({"error": "No question provided"}), 400
+
+    if not conversation_id:
+        conversation_id = generate_conversation_id()
+
+    def generate():
+        start_time = datetime.now()
+        try:
+            # Gửi conversation_id ngay để client gắn các token tiếp theo
+            yield format_sse("start", {"conversation_id": conversation_id})
+
+            response = None
+            for event in stream_policy_bot(question, conversation_id=conversation_id):
+                if event["type"] == "token":
+                    yield format_sse("token", {"content": event["content"]})
+                else:
+                    response = event["result"]
+            end_time = datetime.now()
+            response_time = (end_time - start_time).total_seconds()
+
+            error_msg = (response.get("metadata") or {}).get("error")
+            answer = response.get("answer")
+            if error_msg or not answer:
+                print(f"Error from chatbot: {error_msg}")
+                yield format_sse("error", {"error": f"Lỗi chatbot: {error_msg or 'Không nhận được câu trả lời từ chatbot'}"})
+                return
+
+            sources = response.get("sources") or {}
+            with stage("persist"):
+                get_chat_store().save_turn(conversation_id, question, answer, sources)
+
+            payload = build_chat_payload(question, answer, sources, response_time, conversation_id, end_time)
+            payload.update({
+                "table": response.get("table"),
+                "image_path": response.get("image_path"),
+                "formula": response.get("formula")
+            })
+            yield format_sse("final", payload)
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            yield format_sse("error", {"error": f"Lỗi server: {str(e)}"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/api/cache/stats", methods=["GET"])
+def cache_stats():
+    try:
+        answer_cache = get_components().answer_cache
+    except Exception as e:
+        return jsonify({"error": f"Lỗi khởi tạo chatbot: {str(e)}"}), 503
+    if answer_cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **answer_cache.stats()})
+
+@app.route("/api/warmup", methods=["GET", "POST"])
+def warmup():
+    """GET: chatbot đã được tạo chưa; POST: tạo chatbot và nạp sẵn chỉ mục tìm kiếm"""
+    if request.method == "GET":
+        return jsonify({"ready": components_ready()})
+    try:
+        timings = warm_up()
+    except Exception as e:
+        print(f"Error in warmup endpoint: {str(e)}")
+        return jsonify({"ready": False, "error": f"Lỗi khởi tạo chatbot: {str(e)}"}), 503
+    return jsonify({"ready": True, "timings_ms": timings})
+
 @app.route("/api/upload-pdf", methods=["POST"])
 def upload_pdf():
     try:
@@ -193,22 +255,13 @@ def upload_pdf():
         if not file_path.lower().endswith('.pdf'):
             return jsonify({"error": "File phải có định dạng PDF"}), 400
             
-        try:
-            result = process_pdf(file_path)
-            return jsonify({"message": result})
-        except Exception as process_error:
-            error_msg = str(process_error)
-            print(f"Error processing PDF: {error_msg}")
-            
-            # Kiểm tra các lỗi phổ biến
-            if "JVM" in error_msg or "Java" in error_msg:
-                return jsonify({"error": "Lỗi Java: Vui lòng cài đặt Java JDK và thiết lập JAVA_HOME"}), 500
-            elif "Tesseract" in error_msg:
-                return jsonify({"error": "Lỗi Tesseract: Vui lòng cài đặt Tesseract OCR"}), 500
-            elif "Permission denied" in error_msg:
-                return jsonify({"error": "Lỗi quyền truy cập: Không thể tạo thư mục hoặc ghi file"}), 500
-            else:
-                return jsonify({"error": f"Lỗi xử lý PDF: {error_msg}"}), 500
+        # Xử lý nền, client theo dõi tiến độ qua /api/jobs/<job_id>
+        job = get_ingest_jobs().submit("pdf", {"file_path": os.path.abspath(file_path)})
+        return jsonify({
+            "message": f"Đã đưa {os.path.basename(file_path)} vào hàng đợi xử lý",
+            "job_id": job["id"],
+            "status": job["status"]
+        }), 202
                 
     except Exception as e:
         print(f"Error in upload-pdf endpoint: {str(e)}")
@@ -219,57 +272,57 @@ def process_default():
     try:
         default_pdf = "ICT205_ASS.pdf"
         if os.path.exists(default_pdf):
-            result = process_pdf(default_pdf)
-            return jsonify({"message": result})
+            job = get_ingest_jobs().submit("pdf", {"file_path": os.path.abspath(default_pdf)})
+            return jsonify({
+                "message": f"Đã đưa {default_pdf} vào hàng đợi xử lý",
+                "job_id": job["id"],
+                "status": job["status"]
+            }), 202
         else:
             return jsonify({"error": f"File {default_pdf} không tồn tại"}), 404
     except Exception as e:
         print(f"Error: {str(e)}")  # In ra lỗi chi tiết
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = get_ingest_jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "Không tìm thấy job"}), 404
+    return jsonify(job)
+
+@app.route("/api/jobs", methods=["GET"])
+def list_jobs():
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({"jobs": get_ingest_jobs().list(limit)})
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Histogram thời gian từng bước của pipeline chat và số token LLM, định dạng Prometheus"""
+    return Response(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route("/api/message-history", methods=["GET"])
 def message_history():
     try:
         date_str = request.args.get("date")  
+        limit = request.args.get("limit", type=int)
+        cursor = request.args.get("cursor")
 
         if date_str:
             try:
                 date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
-                start = datetime.combine(date_obj, datetime.min.time())
-                end = datetime.combine(date_obj, datetime.max.time())
-
-                messages = MessageHistory.query.filter(
-                    MessageHistory.timestamp.between(start, end)
-                ).order_by(MessageHistory.timestamp).all()
-
-                result = [
-                    {
-                        "conversation_id": msg.conversation_id,
-                        "user_message": msg.user_message,
-                        "bot_response": msg.bot_response,
-                        "timestamp": msg.timestamp.isoformat()
-                    }
-                    for msg in messages
-                ]
-                return jsonify(result)
             except ValueError:
                 return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
+            start = datetime.combine(date_obj, datetime.min.time())
+            end = datetime.combine(date_obj, datetime.max.time())
+            items, next_cursor = get_chat_store().turns_between(start, end, limit, cursor)
         else:
-            # Mặc định: trả về tất cả
-            conversations = db.session.query(MessageHistory.conversation_id).distinct().all()
-            conversation_list = []
-
-            for conversation in conversations:
-                conversation_id = conversation[0]
-                messages = MessageHistory.query.filter_by(conversation_id=conversation_id).order_by(MessageHistory.timestamp).all()
-                message_list = [
-                    {"user_message": msg.user_message, "bot_response": msg.bot_response, "timestamp": msg.timestamp}
-                    for msg in messages
-                ]
-                conversation_list.append({"conversation_id": conversation_id, "messages": message_list})
-
-            return jsonify(conversation_list)
+            # Mặc định: từng trang hội thoại, mới nhất trước
+            items, next_cursor = get_chat_store().turns_by_conversation(limit, cursor)
+        return jsonify({"items": items, "next_cursor": next_cursor})
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error: {str(e)}")  # In ra lỗi chi tiết
         return jsonify({"error": str(e)}), 500
@@ -277,22 +330,13 @@ def message_history():
 @app.route('/api/conversations', methods=['GET'])
 def get_conversations():
     try:
-        conn = get_db_connection()
-        conversations = conn.execute('''
-            SELECT c.id, c.date, m.content as first_message
-            FROM conversations c
-            LEFT JOIN messages m ON c.id = m.conversation_id AND m.is_bot = 0
-            GROUP BY c.id
-            ORDER BY c.date DESC
-        ''').fetchall()
-        conn.close()
-
-        return jsonify([{
-            'id': conv['id'],
-            'date': conv['date'],
-            'first_message': conv['first_message']
-        } for conv in conversations])
+        conversations, next_cursor = get_chat_store().list_conversations(
+            request.args.get('limit', type=int), request.args.get('cursor')
+        )
+        return jsonify({'conversations': conversations, 'next_cursor': next_cursor})
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error in get_conversations: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -300,30 +344,14 @@ def get_conversations():
 @app.route('/api/conversations/<conversation_id>', methods=['GET'])
 def get_conversation(conversation_id):
     try:
-        conn = get_db_connection()
-        messages = conn.execute('''
-            SELECT content, is_bot, timestamp, sources
-            FROM messages
-            WHERE conversation_id = ?
-            ORDER BY timestamp ASC
-        ''', (conversation_id,)).fetchall()
-        conn.close()
-
-        return jsonify({
-            'messages': [{
-                'content': msg['content'],
-                'isBot': bool(msg['is_bot']),
-                'timestamp': msg['timestamp'],
-                'sources': json.loads(msg['sources']) if msg['sources'] else None
-            } for msg in messages]
-        })
+        return jsonify({'messages': get_chat_store().get_messages(conversation_id)})
 
     except Exception as e:
         print(f"Error in get_conversation: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 if __name__ == "__main__":
-    init_db()
+    start_services()
     # Thay đổi cách chạy server để tránh lỗi socket
     app.run(debug=True, use_reloader=False)
     
\ No newline at end of file
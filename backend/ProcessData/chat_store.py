@@ -0,0 +1,503 @@
+import os
+import json
+import queue
+import base64
+import sqlite3
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Cơ sở dữ liệu chat duy nhất (hội thoại, tin nhắn); memory_store cũng đọc từ đây
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", "chat_history.db")
+# Số kết nối SQLite tối đa dùng chung giữa các request
+CHAT_DB_POOL_SIZE = int(os.getenv("CHAT_DB_POOL_SIZE", "8"))
+# Cơ sở dữ liệu cũ của MessageHistory (Flask-SQLAlchemy đặt trong thư mục instance)
+LEGACY_MESSAGES_DB = os.getenv("LEGACY_MESSAGES_DB", os.path.join("instance", "messages.db"))
+# Kích thước trang mặc định và tối đa của các API lịch sử
+DEFAULT_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = 200
+# "async": lượt hỏi-đáp vào hàng đợi ghi và được ghi theo lô bởi một thread nền (có thể mất
+# tối đa CHAT_FLUSH_INTERVAL_MS dữ liệu nếu process chết đột ngột); "sync": ghi và commit ngay
+CHAT_WRITE_MODE = os.getenv("CHAT_WRITE_MODE", "async").lower()
+# Số lượt tối đa trong hàng đợi; save_turn chờ khi đầy thay vì giữ bộ nhớ vô hạn
+CHAT_WRITE_BUFFER = int(os.getenv("CHAT_WRITE_BUFFER", "1000"))
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100"))
+CHAT_FLUSH_INTERVAL_MS = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", "200"))
+# Thời gian tối đa một request đọc chờ các lượt đang chờ ghi của nó
+CHAT_FLUSH_TIMEOUT = float(os.getenv("CHAT_FLUSH_TIMEOUT", "10"))
+
+SCHEMA_VERSION = 2
+
+_INSERT_CONVERSATION = 'INSERT OR IGNORE INTO conversations (id, date) VALUES (?, ?)'
+_INSERT_MESSAGE = 'INSERT INTO messages (conversation_id, content, is_bot, timestamp, sources) VALUES (?, ?, ?, ?, ?)'
+# Tóm tắt trên dòng conversations được cập nhật ngay khi ghi, danh sách hội thoại không phải quét messages
+_UPSERT_CONVERSATION_TURN = '''
+    INSERT INTO conversations (id, date, first_message, message_count, last_activity)
+    VALUES (?, ?, ?, 2, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        first_message = COALESCE(conversations.first_message, excluded.first_message),
+        message_count = conversations.message_count + 2,
+        last_activity = excluded.last_activity
+'''
+_SELECT_CONVERSATIONS_PAGE = '''
+    SELECT id, date, first_message, message_count, last_activity FROM conversations
+    WHERE ? IS NULL OR (date, id) < (?, ?)
+    ORDER BY date DESC, id DESC
+    LIMIT ?
+'''
+_SELECT_MESSAGES = '''
+    SELECT content, is_bot, timestamp, sources FROM messages
+    WHERE conversation_id = ?
+    ORDER BY timestamp, id
+'''
+_SELECT_RECENT = '''
+    SELECT content, is_bot FROM messages
+    WHERE conversation_id = ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+# Mỗi câu hỏi của user kèm câu trả lời kế tiếp của bot trong cùng hội thoại, trong một truy vấn
+_SELECT_TURNS_PAGE = '''
+    SELECT u.id, u.conversation_id, u.content, u.timestamp,
+        (SELECT b.content FROM messages b
+         WHERE b.conversation_id = u.conversation_id AND b.is_bot = 1
+           AND (b.timestamp, b.id) > (u.timestamp, u.id)
+         ORDER BY b.timestamp, b.id LIMIT 1) AS bot_response
+    FROM messages u
+    WHERE u.is_bot = 0 AND u.timestamp BETWEEN ? AND ?
+      AND (? IS NULL OR (u.timestamp, u.id) > (?, ?))
+    ORDER BY u.timestamp, u.id
+    LIMIT ?
+'''
+_SELECT_MESSAGES_IN = '''
+    SELECT conversation_id, content, is_bot, timestamp FROM messages
+    WHERE conversation_id IN ({placeholders})
+    ORDER BY conversation_id, timestamp, id
+'''
+
+# Tín hiệu trong hàng đợi ghi
+_FLUSH = object()
+_STOP = object()
+
+
+def encode_cursor(*key: Any) -> str:
+    """Cursor phân trang (chuỗi an toàn cho URL) chứa khóa sắp xếp của phần tử cuối trang"""
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], size: int = 2) -> Optional[list]:
+    """Đọc cursor do encode_cursor tạo; ValueError nếu cursor không hợp lệ"""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != size:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def page_size(limit: Optional[int]) -> int:
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+def pair_turns(rows) -> List[Dict[str, Any]]:
+    """Ghép các tin nhắn (đã sắp theo hội thoại, thời gian) thành lượt hỏi-đáp user/bot"""
+    turns = []
+    pending = None
+    for conversation_id, content, is_bot, timestamp in rows:
+        if not is_bot:
+            pending = {
+                "conversation_id": conversation_id,
+                "user_message": content,
+                "bot_response": None,
+                "timestamp": timestamp,
+            }
+            turns.append(pending)
+        elif pending is not None and pending["conversation_id"] == conversation_id and pending["bot_response"] is None:
+            pending["bot_response"] = content
+    return turns
+
+
+class ChatStore:
+    """Lớp lưu trữ chat duy nhất: pool kết nối SQLite ở chế độ WAL, câu lệnh cố định được
+    sqlite3 cache sẵn trên mỗi kết nối, index trên (conversation_id, timestamp).
+
+    Dòng `conversations` giữ sẵn first_message/message_count/last_activity, cập nhật trong
+    cùng transaction ghi tin nhắn. Các API danh sách phân trang theo keyset: cursor là khóa
+    sắp xếp của phần tử cuối trang trước, không dùng OFFSET.
+
+    Ở chế độ "async", save_turn chỉ đưa lượt hỏi-đáp vào hàng đợi có giới hạn; một thread
+    ghi gom nhiều lượt vào một transaction. Mỗi lượt có số thứ tự tăng dần, các hàm đọc chờ
+    tới khi lượt cuối của hội thoại liên quan (hoặc mọi lượt đã nhận, với API danh sách)
+    được commit, nên client luôn đọc được những gì mình vừa ghi.
+
+    Khi khởi tạo, schema được nâng lên SCHEMA_VERSION; lần đầu sẽ gộp dữ liệu từ
+    `message_history` của messages.db cũ vào bảng messages.
+    """
+
+    def __init__(self, db_path: str = CHAT_DB_PATH, pool_size: int = CHAT_DB_POOL_SIZE,
+                 legacy_db_path: Optional[str] = LEGACY_MESSAGES_DB, write_mode: str = CHAT_WRITE_MODE,
+                 buffer_size: int = CHAT_WRITE_BUFFER, batch_size: int = CHAT_WRITE_BATCH_SIZE,
+                 flush_interval: float = CHAT_FLUSH_INTERVAL_MS / 1000):
+        self.db_path = db_path
+        self.pool_size = max(1, pool_size)
+        self.legacy_db_path = legacy_db_path
+        self.write_mode = write_mode
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._pool_lock = threading.Lock()
+        self._migrate()
+
+        # Hàng đợi ghi: số thứ tự đã cấp, các số chưa commit, và lượt cuối đang chờ của mỗi hội thoại
+        self._writes: queue.Queue = queue.Queue(maxsize=max(1, buffer_size))
+        self._written = threading.Condition()
+        self._accepted_seq = 0
+        self._uncommitted: set = set()
+        self._pending_by_conversation: Dict[str, int] = {}
+        # Lượt của các lô ghi lỗi sau mọi lần thử: được giữ lại và ghi lại đồng bộ ở flush/close
+        self._failed: Dict[int, Tuple] = {}
+        self.last_write_error: Optional[Exception] = None
+        self._writer: Optional[threading.Thread] = None
+        if self.write_mode == "async":
+            self._writer = threading.Thread(target=self._write_loop, name="chat-store-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Mượn một kết nối từ pool; rollback nếu khối with lỗi giữa chừng"""
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def save_turn(self, conversation_id: str, question: str, answer: str, sources: Any) -> None:
+        """Lưu một lượt hỏi-đáp và cập nhật tóm tắt hội thoại trong một transaction.
+
+        Dòng conversations được tạo nếu chưa có, kể cả khi client tự đặt conversation_id.
+        """
+        # Thời điểm lấy lúc nhận, không phải lúc thread nền ghi
+        turn = (conversation_id, question, answer, sources, datetime.now().isoformat(), datetime.now().isoformat())
+        if self._writer is None:
+            with self.connection() as conn:
+                self._insert_turns(conn, [turn])
+                conn.commit()
+            return
+        with self._written:
+            self._accepted_seq += 1
+            seq = self._accepted_seq
+            self._uncommitted.add(seq)
+            self._pending_by_conversation[conversation_id] = seq
+        self._writes.put((seq, turn))
+
+    def flush(self, conversation_id: Optional[str] = None, timeout: float = CHAT_FLUSH_TIMEOUT) -> bool:
+        """Chờ các lượt đang chờ ghi (của một hội thoại, hoặc mọi lượt đã nhận) được commit.
+
+        Lượt mà thread nền ghi lỗi được ghi lại ngay trên thread gọi. Trả về False nếu hết
+        `timeout` mà vẫn chưa ghi xong, hoặc còn lượt không ghi được (xem `last_write_error`).
+        """
+        if self._writer is None:
+            return self._retry_failed(conversation_id)
+        # Các lượt có thể vào hàng đợi không theo thứ tự số, nên chờ tới khi không còn
+        # số nào <= target chưa commit
+        def written() -> bool:
+            return not self._uncommitted or min(self._uncommitted) > target
+
+        with self._written:
+            target = self._pending_by_conversation.get(conversation_id) if conversation_id else self._accepted_seq
+            done = not target or written()
+        if not done:
+            # Kết thúc lô đang gom ngay thay vì đợi hết flush_interval
+            self._writes.put(_FLUSH)
+            with self._written:
+                if not self._written.wait_for(written, timeout=timeout):
+                    return False
+        return self._retry_failed(conversation_id)
+
+    def close(self) -> None:
+        """Ghi nốt hàng đợi và dừng thread ghi (gọi khi tắt process).
+
+        Raise RuntimeError nếu vẫn còn lượt không ghi được vào cơ sở dữ liệu.
+        """
+        writer, self._writer = self._writer, None
+        if writer is not None and writer.is_alive():
+            self._writes.put(_STOP)
+            writer.join()
+        if not self._retry_failed():
+            raise RuntimeError(
+                f"Không ghi được {len(self._failed)} lượt hỏi-đáp vào {self.db_path}: {self.last_write_error}"
+            ) from self.last_write_error
+
+    def _retry_failed(self, conversation_id: Optional[str] = None) -> bool:
+        """Ghi đồng bộ các lượt mà thread nền ghi lỗi; trả về False nếu vẫn lỗi"""
+        with self._written:
+            seqs = sorted(seq for seq, turn in self._failed.items() if conversation_id is None or turn[0] == conversation_id)
+            # Lấy ra khỏi _failed trước khi ghi để hai request flush không ghi trùng
+            turns = [(seq, self._failed.pop(seq)) for seq in seqs]
+        if not turns:
+            return True
+        try:
+            with self.connection() as conn:
+                self._insert_turns(conn, [turn for _, turn in turns])
+                conn.commit()
+        except Exception as e:
+            print(f"Error rewriting {len(turns)} failed chat turns: {str(e)}")
+            with self._written:
+                self.last_write_error = e
+                self._failed.update(turns)
+            return False
+        return True
+
+    def list_conversations(self, limit: Optional[int] = None,
+                           cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Một trang hội thoại, mới nhất trước; trả về (trang, cursor trang sau hoặc None)"""
+        limit = page_size(limit)
+        date, conversation_id = decode_cursor(cursor) or (None, None)
+        self.flush()
+        with self.connection() as conn:
+            rows = conn.execute(_SELECT_CONVERSATIONS_PAGE, (date, date, conversation_id, limit + 1)).fetchall()
+        items = [{
+            "id": row["id"],
+            "date": row["date"],
+            "first_message": row["first_message"],
+            "message_count": row["message_count"],
+            "last_activity": row["last_activity"],
+        } for row in rows[:limit]]
+        next_cursor = encode_cursor(items[-1]["date"], items[-1]["id"]) if len(rows) > limit else None
+        return items, next_cursor
+
+    def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        self.flush(conversation_id)
+        with self.connection() as conn:
+            rows = conn.execute(_SELECT_MESSAGES, (conversation_id,)).fetchall()
+        return [{
+            "content": row["content"],
+            "isBot": bool(row["is_bot"]),
+            "timestamp": row["timestamp"],
+            "sources": json.loads(row["sources"]) if row["sources"] else None
+        } for row in rows]
+
+    def recent_messages(self, conversation_id: str, limit: int) -> List[Tuple[str, bool]]:
+        """`limit` tin nhắn gần nhất của một hội thoại (cũ -> mới), dùng để nạp lại memory"""
+        if not conversation_id:
+            return []
+        self.flush(conversation_id)
+        with self.connection() as conn:
+            rows = conn.execute(_SELECT_RECENT, (conversation_id, limit)).fetchall()
+        return [(row["content"], bool(row["is_bot"])) for row in reversed(rows)]
+
+    def turns_between(self, start: datetime, end: datetime, limit: Optional[int] = None,
+                      cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Một trang lượt hỏi-đáp có câu hỏi trong [start, end], cũ trước"""
+        limit = page_size(limit)
+        timestamp, message_id = decode_cursor(cursor) or (None, None)
+        self.flush()
+        with self.connection() as conn:
+            rows = conn.execute(
+                _SELECT_TURNS_PAGE,
+                (start.isoformat(), end.isoformat(), timestamp, timestamp, message_id, limit + 1)
+            ).fetchall()
+        items = [{
+            "conversation_id": row["conversation_id"],
+            "user_message": row["content"],
+            "bot_response": row["bot_response"],
+            "timestamp": row["timestamp"],
+        } for row in rows[:limit]]
+        last = rows[limit - 1] if len(rows) > limit else None
+        return items, (encode_cursor(last["timestamp"], last["id"]) if last else None)
+
+    def turns_by_conversation(self, limit: Optional[int] = None,
+                              cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Một trang hội thoại kèm các lượt hỏi-đáp: một truy vấn cho trang, một cho tin nhắn"""
+        conversations, next_cursor = self.list_conversations(limit, cursor)
+        ids = [conversation["id"] for conversation in conversations]
+        if not ids:
+            return [], next_cursor
+        with self.connection() as conn:
+            rows = conn.execute(_SELECT_MESSAGES_IN.format(placeholders=", ".join("?" * len(ids))), ids).fetchall()
+        turns: Dict[str, List[Dict[str, Any]]] = {conversation_id: [] for conversation_id in ids}
+        for turn in pair_turns(rows):
+            turns[turn.pop("conversation_id")].append(turn)
+        return [{"conversation_id": cid, "messages": turns[cid]} for cid in ids], next_cursor
+
+    def _insert_turns(self, conn: sqlite3.Connection, turns: List[Tuple]) -> None:
+        for conversation_id, question, answer, sources, asked_at, answered_at in turns:
+            conn.execute(_UPSERT_CONVERSATION_TURN, (conversation_id, asked_at, question, answered_at))
+            conn.execute(_INSERT_MESSAGE, (conversation_id, question, False, asked_at, None))
+            conn.execute(_INSERT_MESSAGE, (conversation_id, answer, True, answered_at, json.dumps(sources)))
+
+    def _write_loop(self) -> None:
+        """Thread ghi: gom tới batch_size lượt hoặc flush_interval giây rồi ghi trong một transaction"""
+        stopping = False
+        while not stopping:
+            item = self._writes.get()
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif item is not _FLUSH:
+                    batch.append(item)
+                if stopping or item is _FLUSH or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._writes.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if stopping:
+                # Lấy nốt những gì còn trong hàng đợi trước khi dừng
+                while True:
+                    try:
+                        item = self._writes.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _FLUSH and item is not _STOP:
+                        batch.append(item)
+            if batch:
+                self._commit_batch(batch)
+
+    def _commit_batch(self, batch: List[Tuple[int, Tuple]]) -> None:
+        error = None
+        for attempt in range(3):
+            try:
+                with self.connection() as conn:
+                    self._insert_turns(conn, [turn for _, turn in batch])
+                    conn.commit()
+                error = None
+                break
+            except Exception as e:
+                error = e
+                print(f"Error writing chat history batch ({len(batch)} turns, attempt {attempt + 1}): {str(e)}")
+                time.sleep(0.5 * (attempt + 1))
+        # Dù lỗi cũng bỏ các số của lô khỏi hàng chờ, để request đọc không chờ mãi; lượt lỗi
+        # được giữ trong _failed cho flush/close ghi lại
+        with self._written:
+            if error is not None:
+                self.last_write_error = error
+                self._failed.update(batch)
+            self._uncommitted.difference_update(seq for seq, _ in batch)
+            for conversation_id in [cid for cid, seq in self._pending_by_conversation.items() if seq not in self._uncommitted]:
+                del self._pending_by_conversation[conversation_id]
+            self._written.notify_all()
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                return self._connect()
+        return self._pool.get()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _migrate(self) -> None:
+        with self.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    first_message TEXT,
+                    message_count INTEGER NOT NULL DEFAULT 0,
+                    last_activity TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    is_bot BOOLEAN NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    sources TEXT,
+                    FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_conversation_ts ON messages (conversation_id, timestamp, id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp)')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < 1:
+                self._import_legacy(conn)
+            if version < 2:
+                self._add_conversation_summary(conn)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_conversations_date_id ON conversations (date, id)')
+            conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            conn.commit()
+
+    def _add_conversation_summary(self, conn: sqlite3.Connection) -> None:
+        """Thêm các cột tóm tắt vào conversations và tính lại từ messages bằng lệnh theo tập"""
+        columns = {row["name"] for row in conn.execute('PRAGMA table_info(conversations)')}
+        if "first_message" not in columns:
+            conn.execute('ALTER TABLE conversations ADD COLUMN first_message TEXT')
+        if "message_count" not in columns:
+            conn.execute('ALTER TABLE conversations ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0')
+        if "last_activity" not in columns:
+            conn.execute('ALTER TABLE conversations ADD COLUMN last_activity TEXT')
+        # Index cũ chỉ trên date, thay bằng (date, id) cho phân trang keyset
+        conn.execute('DROP INDEX IF EXISTS idx_conversations_date')
+        # Tin nhắn của conversation_id chưa từng có dòng conversations (client tự đặt ID)
+        conn.execute('''
+            INSERT OR IGNORE INTO conversations (id, date)
+            SELECT conversation_id, MIN(timestamp) FROM messages GROUP BY conversation_id
+        ''')
+        conn.execute('''
+            UPDATE conversations SET
+                message_count = (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = conversations.id),
+                last_activity = (SELECT MAX(m.timestamp) FROM messages m WHERE m.conversation_id = conversations.id),
+                first_message = (SELECT m.content FROM messages m
+                                 WHERE m.conversation_id = conversations.id AND m.is_bot = 0
+                                 ORDER BY m.timestamp, m.id LIMIT 1)
+        ''')
+
+    def _import_legacy(self, conn: sqlite3.Connection) -> None:
+        """Chép message_history (mỗi dòng một cặp user/bot) của messages.db cũ sang bảng messages"""
+        if not self.legacy_db_path or not os.path.exists(self.legacy_db_path):
+            return
+        legacy = sqlite3.connect(self.legacy_db_path)
+        try:
+            rows = legacy.execute(
+                'SELECT conversation_id, user_message, bot_response, timestamp FROM message_history ORDER BY timestamp, id'
+            ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Error reading legacy message history: {str(e)}")
+            return
+        finally:
+            legacy.close()
+        for conversation_id, user_message, bot_response, timestamp in rows:
+            # SQLAlchemy lưu DATETIME dạng "YYYY-MM-DD HH:MM:SS.ffffff"
+            timestamp = (timestamp or datetime.now().isoformat()).replace(" ", "T")
+            conn.execute(_INSERT_CONVERSATION, (conversation_id, timestamp))
+            conn.execute(_INSERT_MESSAGE, (conversation_id, user_message, False, timestamp, None))
+            conn.execute(_INSERT_MESSAGE, (conversation_id, bot_response, True, timestamp, None))
+        print(f"Đã gộp {len(rows)} lượt hỏi-đáp từ {self.legacy_db_path} vào {self.db_path}")
+
+
+_store: Optional[ChatStore] = None
+_store_lock = threading.Lock()
+
+
+def get_chat_store() -> ChatStore:
+    """ChatStore dùng chung trong process (app.py và memory của chatbot dùng cùng một pool)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ChatStore()
+        return _store
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+from typing import Any, List, Optional
+
+ELEMENT_REGISTRY_DB = "element_registry.sqlite"
+
+# Khóa chỉ số trong metadata của từng loại phần tử do process_pdf sinh ra
+INDEX_KEYS = {
+    'table': 'table_index',
+    'chart': 'chart_index',
+    'formula': 'formula_index',
+}
+
+
+class ElementRegistry:
+    """Bảng tra cứu (tài liệu, loại, chỉ số) và (loại, trang) -> chunk ID trong ChromaDB.
+
+    Câu hỏi nêu rõ "bảng N"/"biểu đồ N" được trả lời bằng cách lấy thẳng chunk theo ID
+    thay vì tìm kiếm tương đồng. Chỉ số giống hệt nhãn "Table N"/"Chart N" trong nội dung.
+    """
+
+    def __init__(self, chroma_dir: str = "./chroma_db", db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(chroma_dir, ELEMENT_REGISTRY_DB)
+        self._init_db()
+
+    def upsert(self, docs: List[Any], ids: List[str]) -> None:
+        """Đăng ký các chunk bảng/biểu đồ/công thức (chunk văn bản không có chỉ số nên bỏ qua)"""
+        rows = []
+        for doc, chunk_id in zip(docs, ids):
+            element_type = doc.metadata.get('type')
+            if element_type not in INDEX_KEYS:
+                continue
+            rows.append((
+                chunk_id,
+                doc.metadata.get('source', ''),
+                element_type,
+                int(doc.metadata[INDEX_KEYS[element_type]]),
+                int(doc.metadata['page_number'])
+            ))
+        conn = self._connect()
+        try:
+            conn.executemany(
+                'INSERT OR REPLACE INTO elements (chunk_id, source, type, element_index, page_number) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete(self, ids: List[str]) -> None:
+        conn = self._connect()
+        try:
+            conn.executemany('DELETE FROM elements WHERE chunk_id = ?', [(chunk_id,) for chunk_id in ids])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def find(self, element_type: str, element_index: int, source: Optional[str] = None) -> List[str]:
+        """Chunk ID của phần tử có chỉ số cho trước, trong một tài liệu hoặc mọi tài liệu"""
+        query = 'SELECT chunk_id FROM elements WHERE type = ? AND element_index = ?'
+        params: list = [element_type, element_index]
+        if source is not None:
+            query += ' AND source = ?'
+            params.append(source)
+        return self._fetch_ids(query + ' ORDER BY source, page_number', params)
+
+    def by_page(self, element_type: str, page_number: int, source: Optional[str] = None) -> List[str]:
+        """Chunk ID của mọi phần tử một loại trên một trang, theo thứ tự chỉ số"""
+        query = 'SELECT chunk_id FROM elements WHERE type = ? AND page_number = ?'
+        params: list = [element_type, page_number]
+        if source is not None:
+            query += ' AND source = ?'
+            params.append(source)
+        return self._fetch_ids(query + ' ORDER BY source, element_index', params)
+
+    def _fetch_ids(self, query: str, params: list) -> List[str]:
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute(query, params).fetchall()]
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS elements (
+                    chunk_id TEXT PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    element_index INTEGER NOT NULL,
+                    page_number INTEGER NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_elements_index ON elements (type, element_index, source)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_elements_page ON elements (type, page_number, source)')
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+# Số khóa tối đa trong một câu lệnh IN (...) của SQLite
+_LOOKUP_BATCH = 500
+
+
+def embedding_key(text: str, model_name: str) -> str:
+    """Khóa cache theo nội dung: sha256 của tên model + nội dung chunk"""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """Bọc một Embeddings và lưu vector của từng chunk vào SQLite theo hash nội dung.
+
+    Các chunk đã từng được embed (kể cả từ tài liệu khác có cùng đoạn văn) sẽ được
+    lấy lại từ cache thay vì gọi API.
+    """
+
+    def __init__(self, underlying: Embeddings, db_path: str, model_name: Optional[str] = None):
+        self.underlying = underlying
+        self.db_path = db_path
+        self.model_name = model_name or getattr(underlying, "model", None) or type(underlying).__name__
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [embedding_key(text, self.model_name) for text in texts]
+        cached = self._lookup(set(keys))
+
+        # Chỉ embed mỗi nội dung mới một lần, kể cả khi trùng trong cùng batch
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new_entries = dict(zip(missing.keys(), vectors))
+            self._store(new_entries)
+            cached.update(new_entries)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+        return [list(cached[key]) for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    vector BLOB NOT NULL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _lookup(self, keys: set) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        keys = list(keys)
+        conn = self._connect()
+        try:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+        finally:
+            conn.close()
+        return found
+
+    def _store(self, entries: Dict[str, List[float]]) -> None:
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                [(key, self.model_name, array("f", vector).tobytes()) for key, vector in entries.items()]
+            )
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,182 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+# Số chunk trong một lô embed/ghi vào ChromaDB
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "64"))
+# Số lô gửi tới API embedding cùng lúc (giảm tự động khi bị giới hạn tốc độ)
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+# Số lần thử lại một lô lỗi trước khi bỏ cuộc
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", "1.0"))
+EMBED_BACKOFF_MAX = float(os.getenv("EMBED_BACKOFF_MAX", "60.0"))
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Nhận diện lỗi 429 / RateLimitError của client OpenAI (hoặc server embedding tương thích)"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return "RateLimit" in type(error).__name__
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Lỗi 4xx (trừ 408/409/429) do chính request sai (400 input không hợp lệ, 401 sai key...):
+    gửi lại cũng không khác nên báo lỗi ngay. Lỗi mạng, 5xx và các lỗi không có mã đều thử lại"""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 409, 429)
+    return True
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Đọc header Retry-After của response lỗi nếu có"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class AdaptiveLimiter:
+    """Giới hạn số lô đang gửi, tự điều chỉnh theo phản hồi của API.
+
+    Khi bị giới hạn tốc độ: giảm một nửa số lô song song và tạm dừng mọi lô theo
+    backoff lũy thừa (hoặc theo Retry-After). Mỗi lô thành công tăng dần lại giới
+    hạn cho tới `max_in_flight`, nhờ vậy thông lượng bám sát quota của API. Lô lỗi vì
+    lý do khác (`failed=True`) chỉ trả chỗ, không tính là thành công cũng không giảm giới hạn.
+    """
+
+    def __init__(self, max_in_flight: int = EMBED_MAX_IN_FLIGHT, base_delay: float = EMBED_BACKOFF_BASE,
+                 max_delay: float = EMBED_BACKOFF_MAX):
+        self.max_in_flight = max(1, max_in_flight)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limit = self.max_in_flight
+        self.delay = 0.0
+        self.rate_limited = 0
+        self._in_flight = 0
+        self._resume_at = 0.0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while True:
+                wait = self._resume_at - time.monotonic()
+                if wait <= 0 and self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, rate_limited: bool = False, retry_after: Optional[float] = None, failed: bool = False) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+                self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+                pause = retry_after if retry_after is not None else self.delay * random.uniform(0.5, 1.0)
+                self._resume_at = max(self._resume_at, time.monotonic() + pause)
+            elif failed:
+                # Lỗi mạng/5xx không nói gì về quota: giữ nguyên giới hạn và backoff
+                pass
+            else:
+                self.delay /= 2
+                self._successes += 1
+                if self.limit < self.max_in_flight and self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class EmbeddingWriter:
+    """Embed document theo lô song song và ghi vào ChromaDB ngay khi từng lô xong.
+
+    Mỗi lô được thử lại độc lập nên lô đã thành công không bao giờ bị gửi lại. Việc
+    ghi vào Chroma chỉ diễn ra trên thread gọi `write`.
+    """
+
+    def __init__(self, vectorstore, embedding: Embeddings, batch_size: int = EMBED_BATCH_SIZE,
+                 max_in_flight: int = EMBED_MAX_IN_FLIGHT, max_retries: int = EMBED_MAX_RETRIES,
+                 limiter: Optional[AdaptiveLimiter] = None):
+        self.vectorstore = vectorstore
+        self.embedding = embedding
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.limiter = limiter or AdaptiveLimiter(self.max_in_flight)
+
+    def write(self, docs: List[Document], ids: List[str],
+              progress: Optional[Callable[..., None]] = None) -> int:
+        """Embed và upsert `docs` với `ids` tương ứng, trả về số vector đã ghi.
+
+        `progress(None, chunks_embedded=..., vectors_written=...)` được gọi sau mỗi lô.
+        Nếu có lô vẫn lỗi sau khi hết số lần thử, các lô khác vẫn được ghi rồi mới báo lỗi.
+        """
+        report = progress or (lambda stage=None, **counts: None)
+        batches = [
+            (docs[start:start + self.batch_size], ids[start:start + self.batch_size])
+            for start in range(0, len(docs), self.batch_size)
+        ]
+        embedded = 0
+        written = 0
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed-batch") as executor:
+            futures = {executor.submit(self._embed_batch, batch_docs): index for index, (batch_docs, _) in enumerate(batches)}
+            for future in as_completed(futures):
+                batch_docs, batch_ids = batches[futures[future]]
+                try:
+                    vectors = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                embedded += len(batch_docs)
+                report(None, chunks_embedded=embedded)
+                # Chroma upsert theo ID nên chạy lại không tạo bản sao. Wrapper Chroma của langchain
+                # không có API công khai ghi vector đã tính sẵn (add_texts sẽ embed lại), nên ghi
+                # thẳng vào collection bên dưới: phụ thuộc thuộc tính `_collection` của wrapper
+                self.vectorstore._collection.upsert(
+                    ids=batch_ids,
+                    embeddings=vectors,
+                    metadatas=[doc.metadata for doc in batch_docs],
+                    documents=[doc.page_content for doc in batch_docs]
+                )
+                written += len(batch_docs)
+                report(None, vectors_written=written)
+        if errors:
+            raise RuntimeError(
+                f"Không thể embed {len(errors)}/{len(batches)} lô: {errors[0]}"
+            ) from errors[0]
+        return written
+
+    def _embed_batch(self, batch_docs: List[Document]) -> List[List[float]]:
+        texts = [doc.page_content for doc in batch_docs]
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                vectors = self.embedding.embed_documents(texts)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                self.limiter.release(rate_limited=rate_limited, retry_after=retry_after_seconds(e), failed=True)
+                if not rate_limited and not is_retryable_error(e):
+                    raise
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                if not rate_limited:
+                    # Lỗi tạm thời khác (mạng, 5xx): chờ ngắn trước khi thử lại riêng lô này
+                    time.sleep(min(EMBED_BACKOFF_MAX, EMBED_BACKOFF_BASE * 2 ** (attempt - 1)))
+                print(f"Retrying embedding batch ({attempt}/{self.max_retries}): {str(e)}")
+                continue
+            self.limiter.release()
+            return vectors
@@ -5,12 +5,33 @@ import tabula
 import cv2
 import numpy as np
 from PIL import Image
-import pytesseract
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Collection, Callable
+from pdfminer.pdftypes import resolve1
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+import multiprocessing
+import hashlib
+import sys
+import types
+import threading
+from contextlib import contextmanager
+from ocr_service import get_ocr_service
 import os
 import re
 
+# Số process trích xuất song song theo trang (0 = số CPU, 1 = chạy tuần tự)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "1"))
+# Bộ trích xuất bảng: 'pdfplumber' dùng lại layout của trang đã parse, 'tabula' gọi tabula-py cho từng trang
+TABLE_EXTRACTOR = os.getenv("TABLE_EXTRACTOR", "pdfplumber")
+# Tài liệu ít trang hơn ngưỡng này chạy tuần tự vì chi phí khởi tạo process lớn hơn lợi ích
+PARALLEL_MIN_PAGES = int(os.getenv("EXTRACT_PARALLEL_MIN_PAGES", "8"))
+# Độ phân giải (dpi) để dò contour biểu đồ và để cắt ảnh biểu đồ; 72 là mặc định của pdfplumber
+CHART_DETECT_RESOLUTION = int(os.getenv("CHART_DETECT_RESOLUTION", "48"))
+CHART_RENDER_RESOLUTION = int(os.getenv("CHART_RENDER_RESOLUTION", "72"))
+# Kích thước tối thiểu (point) của một vùng biểu đồ, tương ứng 100px ở 72 dpi
+CHART_MIN_SIZE_PT = 100
+
 @dataclass
 class DocumentElement:
     type: str  # 'text', 'table', 'chart', 'formula'
@@ -18,13 +39,73 @@ class DocumentElement:
     page_number: int
     metadata: Optional[Dict] = None
 
-def extract_tables_from_pdf(pdf_path: str) -> List[DocumentElement]:
-    """Extract tables from PDF using tabula-py"""
-    tables = []
+def hash_file(path: str) -> str:
+    """Hash sha256 của toàn bộ nội dung file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _hash_page(page) -> str:
+    """Hash nội dung một trang từ content stream và các XObject (ảnh, form) mà trang dùng"""
+    digest = hashlib.sha256()
     try:
-        # Read all tables from the PDF
-        dfs = tabula.read_pdf(pdf_path, pages='all', multiple_tables=True)
-        for page_num, df in enumerate(dfs, 1):
+        page_obj = page.page_obj
+        for stream in page_obj.contents:
+            digest.update(resolve1(stream).get_data())
+        resources = resolve1(page_obj.resources) or {}
+        xobjects = resolve1(resources.get('XObject', {})) or {}
+        for name in sorted(xobjects):
+            digest.update(name.encode('utf-8'))
+            digest.update(resolve1(xobjects[name]).get_rawdata() or b'')
+    except Exception:
+        # Không đọc được stream thô: dùng text của trang
+        digest = hashlib.sha256((page.extract_text() or '').encode('utf-8'))
+    return digest.hexdigest()
+
+def compute_page_hashes(pdf_path: str) -> Dict[int, str]:
+    """Trả về hash nội dung của từng trang, đánh số từ 1"""
+    with pdfplumber.open(pdf_path) as pdf:
+        return {page_num: _hash_page(page) for page_num, page in enumerate(pdf.pages, 1)}
+
+def _table_element(table_dict: Dict[str, Any], page_num: int, table_index: int) -> DocumentElement:
+    return DocumentElement(
+        type='table',
+        content=table_dict,
+        page_number=page_num,
+        metadata={'table_index': table_index}
+    )
+
+def _rows_to_table_dict(rows: List[List[Optional[str]]]) -> Optional[Dict[str, Any]]:
+    """Chuyển bảng dạng list các dòng (dòng đầu là header) sang cùng cấu trúc với DataFrame của tabula"""
+    rows = [row for row in rows if row and any(cell not in (None, '') for cell in row)]
+    if len(rows) < 2:
+        return None
+    columns = []
+    for idx, name in enumerate(rows[0]):
+        name = (name or '').replace('\n', ' ').strip() or f"Unnamed: {idx}"
+        # Header trùng tên được đánh số như pandas
+        base, suffix = name, 1
+        while name in columns:
+            name = f"{base}.{suffix}"
+            suffix += 1
+        columns.append(name)
+    data = [
+        {col: (cell.replace('\n', ' ') if isinstance(cell, str) else cell) for col, cell in zip(columns, row)}
+        for row in rows[1:]
+    ]
+    return {
+        'data': data,
+        'columns': columns,
+        'shape': (len(data), len(columns))
+    }
+
+def extract_tables_from_page(page, page_num: int, pdf_path: str) -> List[DocumentElement]:
+    """Extract tables from a single page; table_index is relative to the page and renumbered by the caller"""
+    tables = []
+    if TABLE_EXTRACTOR == 'tabula':
+        for df in tabula.read_pdf(pdf_path, pages=page_num, multiple_tables=True):
             if not df.empty:
                 # Convert DataFrame to dictionary for better serialization
                 table_dict = {
@@ -32,14 +113,28 @@ def extract_tables_from_pdf(pdf_path: str) -> List[DocumentElement]:
                     'columns': df.columns.tolist(),
                     'shape': df.shape
                 }
-                tables.append(DocumentElement(
-                    type='table',
-                    content=table_dict,
-                    page_number=page_num,
-                    metadata={'table_index': len(tables)}
-                ))
+                tables.append(_table_element(table_dict, page_num, len(tables)))
+    else:
+        for rows in page.extract_tables():
+            table_dict = _rows_to_table_dict(rows)
+            if table_dict:
+                tables.append(_table_element(table_dict, page_num, len(tables)))
+    return tables
+
+def extract_tables_from_pdf(pdf_path: str, pages: Optional[Collection[int]] = None) -> List[DocumentElement]:
+    """Extract tables from PDF page by page so each table keeps its page number"""
+    tables = []
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            for page_num, page in enumerate(pdf.pages, 1):
+                if pages is not None and page_num not in pages:
+                    continue
+                tables.extend(extract_tables_from_page(page, page_num, pdf_path))
+                page.flush_cache()
     except Exception as e:
         print(f"Error extracting tables: {str(e)}")
+    for table_index, table in enumerate(tables):
+        table.metadata['table_index'] = table_index
     return tables
 
 def ensure_charts_dir():
@@ -50,7 +145,136 @@ def ensure_charts_dir():
         print(f"Đã tạo thư mục {charts_dir}")
     return charts_dir
 
-def extract_charts_from_pdf(pdf_path: str) -> List[DocumentElement]:
+def render_page(page, resolution: int = CHART_RENDER_RESOLUTION) -> np.ndarray:
+    """Render a page to an RGB array at the given resolution (dpi)"""
+    return np.array(page.to_image(resolution=resolution).original)
+
+def page_may_contain_chart(page) -> bool:
+    """Kiểm tra nhanh bằng các object của pdfplumber xem trang có thể chứa biểu đồ không.
+
+    Trang chỉ có chữ (không ảnh, không đường vẽ, không hình chữ nhật) được bỏ qua mà
+    không cần render. Vùng biểu đồ phải lớn hơn CHART_MIN_SIZE_PT theo cả hai chiều.
+    """
+    for image in page.images:
+        if image['x1'] - image['x0'] >= CHART_MIN_SIZE_PT and image['bottom'] - image['top'] >= CHART_MIN_SIZE_PT:
+            return True
+
+    graphics = page.curves + page.rects + page.lines
+    if not graphics:
+        return False
+    # Các hình vẽ vector cộng lại phải trải rộng đủ để tạo thành một vùng biểu đồ
+    x0 = min(obj['x0'] for obj in graphics)
+    x1 = max(obj['x1'] for obj in graphics)
+    top = min(obj['top'] for obj in graphics)
+    bottom = max(obj['bottom'] for obj in graphics)
+    return x1 - x0 >= CHART_MIN_SIZE_PT and bottom - top >= CHART_MIN_SIZE_PT
+
+def extract_charts_from_page(page, page_num: int, pdf_name: str, charts_dir: str, pending_ocr: Optional[list] = None) -> List[DocumentElement]:
+    """Extract charts from a single pdfplumber page using OpenCV and Tesseract.
+
+    Contours are detected on a low-resolution render; only pages with accepted
+    regions are rendered again at full resolution to crop the chart images.
+    All crops of the page go to the OCR service as one request. When `pending_ocr`
+    is given the OCR result is not awaited: the request is appended to it and the
+    caller fills chart text later with `resolve_pending_ocr`.
+    """
+    charts = []
+    if not page_may_contain_chart(page):
+        return charts
+
+    # Convert page to a downscaled image for contour detection
+    small = render_page(page, CHART_DETECT_RESOLUTION)
+    scale = CHART_RENDER_RESOLUTION / CHART_DETECT_RESOLUTION
+
+    # Convert to grayscale
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    # Apply threshold to get binary image
+    _, binary = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
+
+    # Find contours
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    # Get page dimensions, thresholds are expressed at full resolution
+    height, width = small.shape[:2]
+    page_area = height * width
+    min_area = 10000 / (scale * scale)
+    min_side = 100 / scale
+
+    accepted = []
+    for idx, contour in enumerate(contours):
+        # Calculate contour properties
+        area = cv2.contourArea(contour)
+        x, y, w, h = cv2.boundingRect(contour)
+        aspect_ratio = float(w)/h if h > 0 else 0
+
+        # Filter contours based on multiple criteria
+        if (area > min_area and  # Minimum area
+            area < page_area * 0.8 and  # Maximum area (80% of page)
+            0.2 < aspect_ratio < 5 and  # Reasonable aspect ratio
+            w > min_side and h > min_side):  # Minimum dimensions
+
+            # Check if the region contains enough non-white pixels, đo trên ảnh thu nhỏ
+            non_white_ratio = np.count_nonzero(small[y:y+h, x:x+w] < 240) / (w * h)
+            if non_white_ratio > 0.1:  # At least 10% non-white pixels
+                accepted.append((idx, area, x, y, w, h, aspect_ratio, non_white_ratio))
+
+    if not accepted:
+        return charts
+
+    # Chỉ render độ phân giải đầy đủ khi trang thật sự có vùng biểu đồ
+    img_array = render_page(page, CHART_RENDER_RESOLUTION)
+    full_height, full_width = img_array.shape[:2]
+    chart_imgs = []
+
+    for idx, area, x, y, w, h, aspect_ratio, non_white_ratio in accepted:
+        # Extract the region from the full-resolution render
+        fx, fy = int(x * scale), int(y * scale)
+        fw = min(int(round(w * scale)), full_width - fx)
+        fh = min(int(round(h * scale)), full_height - fy)
+        chart_img = img_array[fy:fy+fh, fx:fx+fw]
+
+        # Tạo tên file ảnh với định dạng: pdf_name_page_chart.png
+        chart_filename = f"{pdf_name}_page{page_num}_chart{idx}.png"
+        chart_path = os.path.join(charts_dir, chart_filename)
+
+        # Save chart image
+        cv2.imwrite(chart_path, chart_img)
+        chart_imgs.append(chart_img)
+
+        # Add to charts list, text được điền sau khi OCR xong
+        charts.append(DocumentElement(
+            type='chart',
+            content={
+                'image_path': chart_path,
+                'text': '',
+                'position': {'x': fx, 'y': fy, 'width': fw, 'height': fh},
+                'properties': {
+                    'area': area * scale * scale,
+                    'aspect_ratio': aspect_ratio,
+                    'non_white_ratio': non_white_ratio
+                }
+            },
+            page_number=page_num,
+            metadata={'chart_index': idx}
+        ))
+
+    # Extract text from charts using OCR
+    request = (get_ocr_service().submit_page(chart_imgs), charts)
+    if pending_ocr is None:
+        resolve_pending_ocr([request])
+    else:
+        pending_ocr.append(request)
+    return charts
+
+def resolve_pending_ocr(pending_ocr: list) -> None:
+    """Chờ các request OCR đang chạy và điền text vào các phần tử biểu đồ tương ứng"""
+    for future, charts in pending_ocr:
+        for chart, chart_text in zip(charts, future.result()):
+            chart.content['text'] = chart_text
+    pending_ocr.clear()
+
+def extract_charts_from_pdf(pdf_path: str, pages: Optional[Collection[int]] = None) -> List[DocumentElement]:
     """Extract charts from PDF using OpenCV and Tesseract"""
     charts = []
     try:
@@ -62,221 +286,178 @@ def extract_charts_from_pdf(pdf_path: str) -> List[DocumentElement]:
             pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
             
             for page_num, page in enumerate(pdf.pages, 1):
-                # Convert page to image
-                img = page.to_image()
-                img_array = np.array(img.original)
-                
-                # Convert to grayscale
-                gray = cv2.cvtColor(img_array, cv2.COLOR_BGR2GRAY)
-                
-                # Apply threshold to get binary image
-                _, binary = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY_INV)
-                
-                # Find contours
-                contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                
-                # Get page dimensions
-                height, width = img_array.shape[:2]
-                page_area = height * width
-                
-                for idx, contour in enumerate(contours):
-                    # Calculate contour properties
-                    area = cv2.contourArea(contour)
-                    x, y, w, h = cv2.boundingRect(contour)
-                    aspect_ratio = float(w)/h if h > 0 else 0
-                    
-                    # Filter contours based on multiple criteria
-                    if (area > 10000 and  # Minimum area
-                        area < page_area * 0.8 and  # Maximum area (80% of page)
-                        0.2 < aspect_ratio < 5 and  # Reasonable aspect ratio
-                        w > 100 and h > 100):  # Minimum dimensions
-                        
-                        # Extract the region
-                        chart_img = img_array[y:y+h, x:x+w]
-                        
-                        # Check if the region contains enough non-white pixels
-                        non_white_pixels = np.sum(chart_img < 240)
-                        if non_white_pixels > (w * h * 0.1):  # At least 10% non-white pixels
-                            
-                            # Tạo tên file ảnh với định dạng: pdf_name_page_chart.png
-                            chart_filename = f"{pdf_name}_page{page_num}_chart{idx}.png"
-                            chart_path = os.path.join(charts_dir, chart_filename)
-                            
-                            # Save chart image
-                            cv2.imwrite(chart_path, chart_img)
-                            
-                            # Extract text from chart using OCR
-                            try:
-                                chart_text = pytesseract.image_to_string(chart_img, lang='eng+vie')
-                            except:
-                                chart_text = "Không thể trích xuất text từ biểu đồ"
-                            
-                            # Add to charts list
-                            charts.append(DocumentElement(
-                                type='chart',
-                                content={
-                                    'image_path': chart_path,
-                                    'text': chart_text,
-                                    'position': {'x': x, 'y': y, 'width': w, 'height': h},
-                                    'properties': {
-                                        'area': area,
-                                        'aspect_ratio': aspect_ratio,
-                                        'non_white_ratio': non_white_pixels / (w * h)
-                                    }
-                                },
-                                page_number=page_num,
-                                metadata={'chart_index': idx}
-                            ))
+                if pages is not None and page_num not in pages:
+                    continue
+                charts.extend(extract_charts_from_page(page, page_num, pdf_name, charts_dir))
     except Exception as e:
         print(f"Error extracting charts: {str(e)}")
     return charts
 
+# Đơn vị đo lường dùng cho cả pattern trích xuất lẫn phân loại 'measurement'
+_UNITS = (
+    'm|kg|s|A|K|mol|cd|Hz|N|Pa|J|W|C|V|Ω|F|H|T|Wb|lm|lx|Bq|Gy|Sv|kat|L|t|ha|eV|u|Da|bar|atm|mmHg|Torr|psi|cal|kcal|Wh|kWh|dB|ppm|ppb|ppt|'
+    'mol/L|g/L|mg/L|μg/L|ng/L|pg/L|mol/m³|g/m³|mg/m³|μg/m³|ng/m³|pg/m³|mol/kg|g/kg|mg/kg|μg/kg|ng/kg|pg/kg|mol/mol|g/g|mg/g|μg/g|ng/g|pg/g|'
+    'mol/m²|g/m²|mg/m²|μg/m²|ng/m²|pg/m²|mol/s|g/s|mg/s|μg/s|ng/s|pg/s|mol/min|g/min|mg/min|μg/min|ng/min|pg/min|mol/h|g/h|mg/h|μg/h|ng/h|pg/h|'
+    'mol/d|g/d|mg/d|μg/d|ng/d|pg/d|mol/wk|g/wk|mg/wk|μg/wk|ng/wk|pg/wk|mol/mo|g/mo|mg/mo|μg/mo|ng/mo|pg/mo|mol/yr|g/yr|mg/yr|μg/yr|ng/yr|pg/yr'
+)
+_MEASUREMENT_RE = re.compile(r'\d+\s*(?:' + _UNITS + ')')
+_GREEK_LOWER = "αβγδεζηθικλμνξοπρστυφχψως"
+_VARIABLE_RE = re.compile(r'[a-zA-Z][a-zA-Z0-9]*')
+_CONSTANT_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+def _has_any(chars: set, candidates: str) -> bool:
+    return any(c in chars for c in candidates)
+
+def _has_greek(chars: set) -> bool:
+    return any('α' <= c <= 'ω' or 'Α' <= c <= 'Ω' for c in chars)
+
+def _has_digit(chars: set) -> bool:
+    return any(c.isdigit() for c in chars)
+
+# Enhanced patterns for mathematical expressions, compiled once. Each pattern has a
+# cheap gate on the page's character set: a pattern whose required characters are
+# absent cannot match, so its regex scan is skipped entirely.
+# Patterns that start with a run of letters/digits carry a lookbehind so the scan only
+# tries the start of each run instead of backtracking from every character inside it;
+# a match starting mid-run always implies one at the run start, so matches are unchanged.
+# A single combined scan (one alternation of lookahead-captured groups, replaying each
+# pattern's non-overlap) gives identical output but is not faster here: it evaluates every
+# pattern at every candidate position, while separate finditer passes skip past their matches.
+_FORMULA_PATTERNS = [
+    # LaTeX style formulas
+    (re.compile(r'\$([^$]+)\$'), lambda chars, text: '$' in chars),  # Inline math
+    (re.compile(r'\$\$([^$]+)\$\$'), lambda chars, text: '$' in chars),  # Display math
+    # Equations and expressions
+    (re.compile(r'(?<![a-zA-Z])([a-zA-Z][a-zA-Z0-9]*\s*=\s*[^=]+)'), lambda chars, text: '=' in chars),  # Equations with variables
+    (re.compile(r'(?<![a-zA-Z])([a-zA-Z][a-zA-Z0-9]*\s*\([^)]+\)\s*=\s*[^=]+)'),
+     lambda chars, text: '=' in chars and '(' in chars and ')' in chars),  # Function definitions
+    (re.compile(r'(?<![a-zA-Z])([a-zA-Z][a-zA-Z0-9]*\s*\([^)]+\)\s*[+\-*/]\s*[^=]+)'),
+     lambda chars, text: '(' in chars and ')' in chars and _has_any(chars, '+-*/')),  # Function expressions
+    # Fractions and ratios
+    (re.compile(r'(?<!\d)(\d+/\d+)'), lambda chars, text: '/' in chars),  # Simple fractions
+    (re.compile(r'(?<![a-zA-Z0-9])([a-zA-Z0-9]+\s*/\s*[a-zA-Z0-9]+)'), lambda chars, text: '/' in chars),  # Fractions with variables
+    # Square roots and radicals
+    (re.compile(r'√\s*\(([^)]+)\)'), lambda chars, text: '√' in chars),  # Square root
+    (re.compile(r'sqrt\s*\(([^)]+)\)'), lambda chars, text: 'sqrt' in text),  # Square root (alternative notation)
+    # Powers and exponents
+    (re.compile(r'(?<![a-zA-Z0-9])([a-zA-Z0-9]+\s*\^\s*[a-zA-Z0-9]+)'), lambda chars, text: '^' in chars),  # Power with ^
+    (re.compile(r'(?<![a-zA-Z0-9])([a-zA-Z0-9]+\s*\*\*\s*[a-zA-Z0-9]+)'), lambda chars, text: '**' in text),  # Power with **
+    # Subscripts
+    (re.compile(r'(?<![a-zA-Z0-9])([a-zA-Z0-9]+\s*_\s*[a-zA-Z0-9]+)'), lambda chars, text: '_' in chars),  # Subscript
+    # Summations and products
+    (re.compile(r'(∑|∏)\s*([^∑∏]+)'), lambda chars, text: _has_any(chars, '∑∏')),  # Summation or product
+    # Integrals
+    (re.compile(r'∫\s*([^∫]+)'), lambda chars, text: '∫' in chars),  # Integral
+    # Greek letters and special symbols
+    (re.compile(r'([α-ωΑ-Ω][a-zA-Z0-9]*)'), lambda chars, text: _has_greek(chars)),  # Greek letters
+    # Matrices
+    (re.compile(r'\[([^\[\]]+)\]'), lambda chars, text: '[' in chars and ']' in chars),  # Matrix notation
+    # Inequalities
+    (re.compile(r'(?<![a-zA-Z0-9])([a-zA-Z0-9]+\s*[<>≤≥]\s*[a-zA-Z0-9]+)'), lambda chars, text: _has_any(chars, '<>≤≥')),  # Inequalities
+    # Percentages
+    (re.compile(r'(?<!\d)(\d+%)'), lambda chars, text: '%' in chars),  # Percentages
+    # Units and measurements
+    (re.compile(r'(?<!\d)(\d+\s*(?:' + _UNITS + '))'), lambda chars, text: _has_digit(chars)),  # Units
+]
+
+# Bảng thay thế ký hiệu sang LaTeX theo đúng thứ tự áp dụng
+_LATEX_REPLACEMENTS = [
+    ('^', '^{'), ('_', '_{'), ('√', r'\sqrt{'), ('sqrt', r'\sqrt{'),
+    ('∑', r'\sum'), ('∏', r'\prod'), ('∫', r'\int'),
+    ('α', r'\alpha'), ('β', r'\beta'), ('γ', r'\gamma'), ('δ', r'\delta'), ('ε', r'\varepsilon'),
+    ('ζ', r'\zeta'), ('η', r'\eta'), ('θ', r'\theta'), ('ι', r'\iota'), ('κ', r'\kappa'),
+    ('λ', r'\lambda'), ('μ', r'\mu'), ('ν', r'\nu'), ('ξ', r'\xi'), ('ο', r'\omicron'),
+    ('π', r'\pi'), ('ρ', r'\rho'), ('σ', r'\sigma'), ('τ', r'\tau'), ('υ', r'\upsilon'),
+    ('φ', r'\phi'), ('χ', r'\chi'), ('ψ', r'\psi'), ('ω', r'\omega'),
+    ('≤', r'\leq'), ('≥', r'\geq'), ('≠', r'\neq'), ('±', r'\pm'), ('∞', r'\infty'),
+    ('∂', r'\partial'), ('∇', r'\nabla'), ('∅', r'\emptyset'), ('∈', r'\in'), ('∉', r'\notin'),
+    ('⊂', r'\subset'), ('⊃', r'\supset'), ('∪', r'\cup'), ('∩', r'\cap'),
+    ('∀', r'\forall'), ('∃', r'\exists'), ('∄', r'\nexists'), ('∝', r'\propto'),
+    ('ℵ', r'\aleph'), ('ℜ', r'\Re'), ('ℑ', r'\Im'), ('℘', r'\wp'),
+    ('ℶ', r'\beth'), ('ℷ', r'\gimel'), ('ℸ', r'\daleth'),
+]
+
+def _sequential_latex(symbol: str) -> str:
+    for old, new in _LATEX_REPLACEMENTS:
+        symbol = symbol.replace(old, new)
+    return symbol
+
+# Kết quả của từng ký hiệu được tính trước bằng cách áp dụng cả chuỗi thay thế (ví dụ '√'
+# đi qua cả bước '√' lẫn bước 'sqrt'), nên một lần quét cho ra đúng kết quả như thay thế tuần tự
+_LATEX_MAP = {old: _sequential_latex(old) for old, _ in _LATEX_REPLACEMENTS}
+_LATEX_RE = re.compile('|'.join(re.escape(old) for old in sorted(_LATEX_MAP, key=len, reverse=True)))
+
+def to_latex(formula: str) -> str:
+    """Create LaTeX-like representation in a single pass over the formula"""
+    return _LATEX_RE.sub(lambda m: _LATEX_MAP[m.group(0)], formula)
+
+@lru_cache(maxsize=8192)
+def _analyze_formula(formula: str):
+    """Phân loại một công thức một lần duy nhất; kết quả được cache vì cùng chuỗi lặp lại rất nhiều"""
+    variables = tuple(set(_VARIABLE_RE.findall(formula)))
+    constants = tuple(set(_CONSTANT_RE.findall(formula)))
+    flags = {
+        'has_equals': '=' in formula,
+        'has_fraction': '/' in formula,
+        'has_power': '^' in formula or '**' in formula,
+        'has_subscript': '_' in formula,
+        'has_square_root': '√' in formula or 'sqrt' in formula,
+        'has_summation': '∑' in formula,
+        'has_product': '∏' in formula,
+        'has_integral': '∫' in formula,
+        'has_greek': any(greek in formula for greek in _GREEK_LOWER),
+        'has_matrix': '[' in formula and ']' in formula,
+        'has_inequality': any(op in formula for op in "<>≤≥"),
+        'has_percentage': '%' in formula,
+        'has_measurement': bool(_MEASUREMENT_RE.search(formula)),
+    }
+
+    # Enhanced formula type identification
+    if flags['has_equals']:
+        formula_type = "equation"
+    elif flags['has_fraction']:
+        formula_type = "fraction"
+    elif flags['has_power']:
+        formula_type = "power"
+    elif flags['has_subscript']:
+        formula_type = "subscript"
+    elif flags['has_square_root']:
+        formula_type = "square_root"
+    elif flags['has_summation'] or flags['has_product']:
+        formula_type = "summation_or_product"
+    elif flags['has_integral']:
+        formula_type = "integral"
+    elif flags['has_greek']:
+        formula_type = "greek_notation"
+    elif flags['has_matrix']:
+        formula_type = "matrix"
+    elif flags['has_inequality']:
+        formula_type = "inequality"
+    elif flags['has_percentage']:
+        formula_type = "percentage"
+    elif flags['has_measurement']:
+        formula_type = "measurement"
+    else:
+        formula_type = "unknown"
+
+    return formula_type, to_latex(formula), variables, constants, tuple(flags.items())
+
 def extract_formulas_from_text(text: str, page_num: int) -> List[DocumentElement]:
-    """Extract mathematical formulas from text using enhanced regex patterns"""
+    """Extract mathematical formulas from text using precompiled regex patterns"""
     formulas = []
+    chars = set(text)
     
-    # Enhanced patterns for mathematical expressions
-    patterns = [
-        # LaTeX style formulas
-        r'\$([^$]+)\$',  # Inline math
-        r'\$\$([^$]+)\$\$',  # Display math
-        # Equations and expressions
-        r'([a-zA-Z][a-zA-Z0-9]*\s*=\s*[^=]+)',  # Equations with variables
-        r'([a-zA-Z][a-zA-Z0-9]*\s*\([^)]+\)\s*=\s*[^=]+)',  # Function definitions
-        r'([a-zA-Z][a-zA-Z0-9]*\s*\([^)]+\)\s*[+\-*/]\s*[^=]+)',  # Function expressions
-        # Fractions and ratios
-        r'(\d+/\d+)',  # Simple fractions
-        r'([a-zA-Z0-9]+\s*/\s*[a-zA-Z0-9]+)',  # Fractions with variables
-        # Square roots and radicals
-        r'√\s*\(([^)]+)\)',  # Square root
-        r'sqrt\s*\(([^)]+)\)',  # Square root (alternative notation)
-        # Powers and exponents
-        r'([a-zA-Z0-9]+\s*\^\s*[a-zA-Z0-9]+)',  # Power with ^
-        r'([a-zA-Z0-9]+\s*\*\*\s*[a-zA-Z0-9]+)',  # Power with **
-        # Subscripts
-        r'([a-zA-Z0-9]+\s*_\s*[a-zA-Z0-9]+)',  # Subscript
-        # Summations and products
-        r'(∑|∏)\s*([^∑∏]+)',  # Summation or product
-        # Integrals
-        r'∫\s*([^∫]+)',  # Integral
-        # Greek letters and special symbols
-        r'([α-ωΑ-Ω][a-zA-Z0-9]*)',  # Greek letters
-        # Matrices
-        r'\[([^\[\]]+)\]',  # Matrix notation
-        # Inequalities
-        r'([a-zA-Z0-9]+\s*[<>≤≥]\s*[a-zA-Z0-9]+)',  # Inequalities
-        # Percentages
-        r'(\d+%)',  # Percentages
-        # Units and measurements
-        r'(\d+\s*(?:m|kg|s|A|K|mol|cd|Hz|N|Pa|J|W|C|V|Ω|F|H|T|Wb|lm|lx|Bq|Gy|Sv|kat|L|t|ha|eV|u|Da|bar|atm|mmHg|Torr|psi|cal|kcal|Wh|kWh|dB|ppm|ppb|ppt|mol/L|g/L|mg/L|μg/L|ng/L|pg/L|mol/m³|g/m³|mg/m³|μg/m³|ng/m³|pg/m³|mol/kg|g/kg|mg/kg|μg/kg|ng/kg|pg/kg|mol/mol|g/g|mg/g|μg/g|ng/g|pg/g|mol/m²|g/m²|mg/m²|μg/m²|ng/m²|pg/m²|mol/s|g/s|mg/s|μg/s|ng/s|pg/s|mol/min|g/min|mg/min|μg/min|ng/min|pg/min|mol/h|g/h|mg/h|μg/h|ng/h|pg/h|mol/d|g/d|mg/d|μg/d|ng/d|pg/d|mol/wk|g/wk|mg/wk|μg/wk|ng/wk|pg/wk|mol/mo|g/mo|mg/mo|μg/mo|ng/mo|pg/mo|mol/yr|g/yr|mg/yr|μg/yr|ng/yr|pg/yr))',  # Units
-    ]
-    
-    for pattern in patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
+    for pattern, gate in _FORMULA_PATTERNS:
+        if not gate(chars, text):
+            continue
+        for match in pattern.finditer(text):
             formula = match.group(1).strip()
             # Get context (text before and after the formula)
             start = max(0, match.start() - 150)  # Increased context window
             end = min(len(text), match.end() + 150)
             context = text[start:end]
             
-            # Enhanced formula type identification
-            formula_type = "unknown"
-            if "=" in formula:
-                formula_type = "equation"
-            elif "/" in formula:
-                formula_type = "fraction"
-            elif "^" in formula or "**" in formula:
-                formula_type = "power"
-            elif "_" in formula:
-                formula_type = "subscript"
-            elif "√" in formula or "sqrt" in formula:
-                formula_type = "square_root"
-            elif "∑" in formula or "∏" in formula:
-                formula_type = "summation_or_product"
-            elif "∫" in formula:
-                formula_type = "integral"
-            elif any(greek in formula for greek in "αβγδεζηθικλμνξοπρστυφχψως"):
-                formula_type = "greek_notation"
-            elif "[" in formula and "]" in formula:
-                formula_type = "matrix"
-            elif any(op in formula for op in "<>≤≥"):
-                formula_type = "inequality"
-            elif "%" in formula:
-                formula_type = "percentage"
-            elif re.search(r'\d+\s*(?:m|kg|s|A|K|mol|cd|Hz|N|Pa|J|W|C|V|Ω|F|H|T|Wb|lm|lx|Bq|Gy|Sv|kat|L|t|ha|eV|u|Da|bar|atm|mmHg|Torr|psi|cal|kcal|Wh|kWh|dB|ppm|ppb|ppt|mol/L|g/L|mg/L|μg/L|ng/L|pg/L|mol/m³|g/m³|mg/m³|μg/m³|ng/m³|pg/m³|mol/kg|g/kg|mg/kg|μg/kg|ng/kg|pg/kg|mol/mol|g/g|mg/g|μg/g|ng/g|pg/g|mol/m²|g/m²|mg/m²|μg/m²|ng/m²|pg/m²|mol/s|g/s|mg/s|μg/s|ng/s|pg/s|mol/min|g/min|mg/min|μg/min|ng/min|pg/min|mol/h|g/h|mg/h|μg/h|ng/h|pg/h|mol/d|g/d|mg/d|μg/d|ng/d|pg/d|mol/wk|g/wk|mg/wk|μg/wk|ng/wk|pg/wk|mol/mo|g/mo|mg/mo|μg/mo|ng/mo|pg/mo|mol/yr|g/yr|mg/yr|μg/yr|ng/yr|pg/yr)', formula):
-                formula_type = "measurement"
-            
-            # Extract variables and constants
-            variables = set(re.findall(r'[a-zA-Z][a-zA-Z0-9]*', formula))
-            constants = set(re.findall(r'\b\d+(?:\.\d+)?\b', formula))
-            
-            # Create LaTeX-like representation using string replacement
-            latex = formula
-            replacements = [
-                ('^', '^{'),
-                ('_', '_{'),
-                ('√', r'\sqrt{'),
-                ('sqrt', r'\sqrt{'),
-                ('∑', r'\sum'),
-                ('∏', r'\prod'),
-                ('∫', r'\int'),
-                ('α', r'\alpha'),
-                ('β', r'\beta'),
-                ('γ', r'\gamma'),
-                ('δ', r'\delta'),
-                ('ε', r'\varepsilon'),
-                ('ζ', r'\zeta'),
-                ('η', r'\eta'),
-                ('θ', r'\theta'),
-                ('ι', r'\iota'),
-                ('κ', r'\kappa'),
-                ('λ', r'\lambda'),
-                ('μ', r'\mu'),
-                ('ν', r'\nu'),
-                ('ξ', r'\xi'),
-                ('ο', r'\omicron'),
-                ('π', r'\pi'),
-                ('ρ', r'\rho'),
-                ('σ', r'\sigma'),
-                ('τ', r'\tau'),
-                ('υ', r'\upsilon'),
-                ('φ', r'\phi'),
-                ('χ', r'\chi'),
-                ('ψ', r'\psi'),
-                ('ω', r'\omega'),
-                ('≤', r'\leq'),
-                ('≥', r'\geq'),
-                ('≠', r'\neq'),
-                ('±', r'\pm'),
-                ('∞', r'\infty'),
-                ('∂', r'\partial'),
-                ('∇', r'\nabla'),
-                ('∅', r'\emptyset'),
-                ('∈', r'\in'),
-                ('∉', r'\notin'),
-                ('⊂', r'\subset'),
-                ('⊃', r'\supset'),
-                ('∪', r'\cup'),
-                ('∩', r'\cap'),
-                ('∅', r'\emptyset'),
-                ('∀', r'\forall'),
-                ('∃', r'\exists'),
-                ('∄', r'\nexists'),
-                ('∝', r'\propto'),
-                ('∞', r'\infty'),
-                ('ℵ', r'\aleph'),
-                ('ℜ', r'\Re'),
-                ('ℑ', r'\Im'),
-                ('℘', r'\wp'),
-                ('ℵ', r'\aleph'),
-                ('ℶ', r'\beth'),
-                ('ℷ', r'\gimel'),
-                ('ℸ', r'\daleth')
-            ]
-            
-            for old, new in replacements:
-                latex = latex.replace(old, new)
+            formula_type, latex, variables, constants, flags = _analyze_formula(formula)
             
             formulas.append(DocumentElement(
                 type='formula',
@@ -293,51 +474,151 @@ def extract_formulas_from_text(text: str, page_num: int) -> List[DocumentElement
                     'formula_type': formula_type,
                     'variables': list(variables),
                     'constants': list(constants),
-                    'has_equals': '=' in formula,
-                    'has_fraction': '/' in formula,
-                    'has_power': '^' in formula or '**' in formula,
-                    'has_subscript': '_' in formula,
-                    'has_square_root': '√' in formula or 'sqrt' in formula,
-                    'has_summation': '∑' in formula,
-                    'has_product': '∏' in formula,
-                    'has_integral': '∫' in formula,
-                    'has_greek': any(greek in formula for greek in "αβγδεζηθικλμνξοπρστυφχψως"),
-                    'has_matrix': '[' in formula and ']' in formula,
-                    'has_inequality': any(op in formula for op in "<>≤≥"),
-                    'has_percentage': '%' in formula,
-                    'has_measurement': bool(re.search(r'\d+\s*(?:m|kg|s|A|K|mol|cd|Hz|N|Pa|J|W|C|V|Ω|F|H|T|Wb|lm|lx|Bq|Gy|Sv|kat|L|t|ha|eV|u|Da|bar|atm|mmHg|Torr|psi|cal|kcal|Wh|kWh|dB|ppm|ppb|ppt|mol/L|g/L|mg/L|μg/L|ng/L|pg/L|mol/m³|g/m³|mg/m³|μg/m³|ng/m³|pg/m³|mol/kg|g/kg|mg/kg|μg/kg|ng/kg|pg/kg|mol/mol|g/g|mg/g|μg/g|ng/g|pg/g|mol/m²|g/m²|mg/m²|μg/m²|ng/m²|pg/m²|mol/s|g/s|mg/s|μg/s|ng/s|pg/s|mol/min|g/min|mg/min|μg/min|ng/min|pg/min|mol/h|g/h|mg/h|μg/h|ng/h|pg/h|mol/d|g/d|mg/d|μg/d|ng/d|pg/d|mol/wk|g/wk|mg/wk|μg/wk|ng/wk|pg/wk|mol/mo|g/mo|mg/mo|μg/mo|ng/mo|pg/mo|mol/yr|g/yr|mg/yr|μg/yr|ng/yr|pg/yr)', formula))
+                    **dict(flags)
                 }
             ))
     
     return formulas
 
-def extract_from_pdf(pdf_path: str) -> List[DocumentElement]:
-    """Extract all elements (text, tables, charts, formulas) from PDF"""
-    elements = []
-    
-    # Extract text and formulas
+def extract_page(page, page_num: int, pdf_path: str, pdf_name: str, charts_dir: str, pending_ocr: Optional[list] = None):
+    """Parse a page once and run every extractor on it.
+
+    The text layer feeds the text and formula stages, the page's layout objects
+    feed the table stage and chart detection, which renders only pages whose
+    objects can hold a chart.
+    Returns (text and formula elements, tables, charts).
+    """
+    text_elements = []
+    tables = []
+    charts = []
+
+    text = page.extract_text()
+    if text:
+        # Extract formulas from text
+        text_elements.extend(extract_formulas_from_text(text, page_num))
+        
+        # Add text element
+        text_elements.append(DocumentElement(
+            type='text',
+            content=text,
+            page_number=page_num
+        ))
+
+    try:
+        tables = extract_tables_from_page(page, page_num, pdf_path)
+    except Exception as e:
+        print(f"Error extracting tables on page {page_num}: {str(e)}")
+
+    try:
+        charts = extract_charts_from_page(page, page_num, pdf_name, charts_dir, pending_ocr)
+    except Exception as e:
+        print(f"Error extracting charts on page {page_num}: {str(e)}")
+
+    # Giải phóng các object layout đã cache của trang để giữ bộ nhớ ổn định với file lớn
+    page.flush_cache()
+    return text_elements, tables, charts
+
+def _extract_page_range(pdf_path: str, page_numbers: List[int], on_page: Optional[Callable[[int], None]] = None):
+    """Trích xuất mọi loại phần tử cho một nhóm trang; chạy được trong process con"""
+    text_elements = []
+    tables = []
+    charts = []
+    charts_dir = ensure_charts_dir()
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    # OCR chạy trên pool riêng trong lúc các trang tiếp theo được parse
+    pending_ocr = []
     with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, 1):
-            text = page.extract_text()
-            if text:
-                # Extract formulas from text
-                formulas = extract_formulas_from_text(text, page_num)
-                elements.extend(formulas)
-                
-                # Add text element
-                elements.append(DocumentElement(
-                    type='text',
-                    content=text,
-                    page_number=page_num
-                ))
-    
-    # Extract tables
-    tables = extract_tables_from_pdf(pdf_path)
-    elements.extend(tables)
+        for page_num in page_numbers:
+            page_text, page_tables, page_charts = extract_page(pdf.pages[page_num - 1], page_num, pdf_path, pdf_name, charts_dir, pending_ocr)
+            text_elements.extend(page_text)
+            tables.extend(page_tables)
+            charts.extend(page_charts)
+            if on_page is not None:
+                on_page(1)
+    resolve_pending_ocr(pending_ocr)
+    return text_elements, tables, charts
+
+def _shard_pages(page_numbers: List[int], workers: int) -> List[List[int]]:
+    """Chia trang thành các nhóm liên tiếp, nhiều nhóm hơn số worker để cân bằng tải"""
+    shard_count = min(len(page_numbers), workers * 4)
+    size = -(-len(page_numbers) // shard_count)
+    return [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+
+# Module __main__ nhẹ cho process con của pool trích xuất, xem extract_worker.py
+_SPAWN_MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extract_worker.py")
+_spawn_main_lock = threading.Lock()
+
+@contextmanager
+def _spawn_main():
+    """Trong lúc pool tạo process con, trỏ __main__ sang extract_worker.py.
+
+    Spawn ghi lại đường dẫn của module __main__ khi start process con và nạp lại module đó
+    trong process con; không đổi thì mỗi process con chạy lại toàn bộ app.py/chatbot.py.
+    """
+    spawn_main = types.ModuleType("__main__")
+    spawn_main.__file__ = _SPAWN_MAIN_PATH
+    spawn_main.__spec__ = None
+    with _spawn_main_lock:
+        main_module = sys.modules["__main__"]
+        sys.modules["__main__"] = spawn_main
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main_module
+
+def extract_from_pdf(pdf_path: str, pages: Optional[Collection[int]] = None, workers: Optional[int] = None,
+                     progress: Optional[Callable[[int, int], None]] = None, in_subprocess: bool = False) -> List[DocumentElement]:
+    """Extract all elements (text, tables, charts, formulas) from PDF, optionally only from the given pages.
+
+    Each page is parsed once and fed to every extractor. With workers > 1 pages are
+    sharded across a process pool; results are merged back in page order so element
+    indexes stay stable. `progress(pages_done, pages_total)` is called as pages finish.
+    `in_subprocess` always runs the extraction in child processes, so that a
+    background job does not compete with request threads for the GIL.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+    page_numbers = [p for p in range(1, page_count + 1) if pages is None or p in pages]
+
+    workers = EXTRACT_WORKERS if workers is None else workers
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+
+    done = [0]
+
+    def on_page(count: int) -> None:
+        done[0] += count
+        if progress is not None:
+            progress(done[0], len(page_numbers))
+
+    text_elements = []
+    tables = []
+    charts = []
+    if page_numbers and (in_subprocess or (workers > 1 and len(page_numbers) >= PARALLEL_MIN_PAGES)):
+        shards = _shard_pages(page_numbers, workers)
+        results = [None] * len(shards)
+        # spawn thay vì fork vì process cha (Flask, Chroma) có nhiều thread
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            # Process con được start ngay trong submit
+            with _spawn_main():
+                futures = {executor.submit(_extract_page_range, pdf_path, shard): index for index, shard in enumerate(shards)}
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                on_page(len(shards[index]))
+        # Ghép lại theo thứ tự shard để giữ thứ tự trang
+        for shard_text, shard_tables, shard_charts in results:
+            text_elements.extend(shard_text)
+            tables.extend(shard_tables)
+            charts.extend(shard_charts)
+    elif page_numbers:
+        text_elements, tables, charts = _extract_page_range(pdf_path, page_numbers, on_page)
+
+    # Bảng được đánh số theo thứ tự trang trên toàn bộ các trang đã trích xuất
+    for table_index, table in enumerate(tables):
+        table.metadata['table_index'] = table_index
     
-    # Extract charts
-    charts = extract_charts_from_pdf(pdf_path)
-    elements.extend(charts)
+    elements = text_elements + tables + charts
     
     # Sort elements by page number
     elements.sort(key=lambda x: x.page_number)
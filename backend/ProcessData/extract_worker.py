@@ -0,0 +1,6 @@
+"""Module __main__ của các process con trong pool trích xuất (extract_text.extract_from_pdf).
+
+Spawn nạp lại module __main__ của process cha trong mỗi process con; pool trích xuất trỏ
+__main__ sang file này để process con không nạp lại script đang chạy (app.py với Flask,
+chatbot, hàng đợi job...). Cố ý để trống: hàm cần chạy được import từ extract_text.
+"""
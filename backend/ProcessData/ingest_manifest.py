@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+# Các process_pdf chạy song song trong cùng process không được ghi đè manifest của nhau
+_manifest_lock = threading.Lock()
+
+
+def make_chunk_id(doc_id: str, page_number: int, element_type: str, ordinal: int) -> str:
+    """ID chunk xác định theo vị trí (tài liệu, trang, loại, thứ tự) để upsert lặp lại không tạo bản sao"""
+    key = f"{doc_id}|{page_number}|{element_type}|{ordinal}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """Manifest JSON ghi lại hash của file, hash từng trang và các chunk ID đã sinh ra.
+
+    Cấu trúc mỗi tài liệu:
+        {
+            "name": "ICT205_ASS.pdf",
+            "file_hash": "...",
+            "ingested_at": "...",
+            "pages": {"1": {"hash": "...", "chunk_ids": [...], "tables": 0}, ...}
+        }
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {"documents": {}}
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with _manifest_lock:
+            return self._read()["documents"].get(doc_id)
+
+    def update(self, doc_id: str, name: str, file_hash: str, pages: Dict[int, Dict[str, Any]]) -> None:
+        with _manifest_lock:
+            data = self._read()
+            data["documents"][doc_id] = {
+                "name": name,
+                "file_hash": file_hash,
+                "ingested_at": datetime.now().isoformat(),
+                "pages": {str(page): info for page, info in sorted(pages.items())},
+            }
+            self._write(data)
+
+    def remove(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with _manifest_lock:
+            data = self._read()
+            entry = data["documents"].pop(doc_id, None)
+            self._write(data)
+            return entry
@@ -0,0 +1,184 @@
+import os
+import json
+import uuid
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Số job nạp tài liệu chạy cùng lúc
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_JOBS_DB = os.getenv("INGEST_JOBS_DB", "ingest_jobs.db")
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobContext:
+    """Được truyền cho handler để cập nhật giai đoạn và tiến độ của job"""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self._progress: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def update(self, stage: Optional[str] = None, **progress) -> None:
+        with self._lock:
+            self._progress.update(progress)
+            self.queue._update_progress(self.job_id, stage, dict(self._progress))
+
+
+class JobQueue:
+    """Hàng đợi job chạy nền với pool worker giới hạn, trạng thái lưu trong SQLite.
+
+    `handlers` ánh xạ loại job sang hàm `handler(payload, context) -> result`. Job đang
+    chờ hoặc đang chạy dở khi server tắt sẽ được chạy lại khi khởi động.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[Dict[str, Any], JobContext], Any]],
+                 db_path: str = INGEST_JOBS_DB, workers: int = INGEST_WORKERS):
+        self.handlers = handlers
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest-job")
+        self._init_db()
+        self._resume()
+
+    def submit(self, kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job type: {kind}")
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, payload, status, stage, progress, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), JOB_QUEUED, JOB_QUEUED, "{}",
+                 datetime.now().isoformat())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self._executor.submit(self._run, job_id)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 50) -> list:
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [self._to_dict(row) for row in rows]
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None or job["status"] != JOB_QUEUED:
+            return
+        self._set_status(job_id, JOB_RUNNING, stage=JOB_RUNNING, started_at=datetime.now().isoformat())
+        context = JobContext(self, job_id)
+        try:
+            result = self.handlers[job["kind"]](job["payload"], context)
+            self._set_status(job_id, JOB_SUCCEEDED, stage="done", result=result,
+                             finished_at=datetime.now().isoformat())
+        except Exception as e:
+            print(f"Error running job {job_id}: {str(e)}")
+            self._set_status(job_id, JOB_FAILED, stage="failed", error=str(e),
+                             finished_at=datetime.now().isoformat())
+
+    def _resume(self) -> None:
+        """Đưa các job chưa xong từ lần chạy trước vào lại hàng đợi theo thứ tự tạo"""
+        conn = self._connect()
+        try:
+            conn.execute('UPDATE jobs SET status = ?, stage = ? WHERE status = ?', (JOB_QUEUED, JOB_QUEUED, JOB_RUNNING))
+            conn.commit()
+            rows = conn.execute('SELECT id FROM jobs WHERE status = ? ORDER BY created_at', (JOB_QUEUED,)).fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            self._executor.submit(self._run, row["id"])
+
+    def _set_status(self, job_id: str, status: str, stage: str, result: Any = None, error: Optional[str] = None,
+                    started_at: Optional[str] = None, finished_at: Optional[str] = None) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                '''
+                UPDATE jobs SET status = ?, stage = ?,
+                    result = COALESCE(?, result), error = ?,
+                    started_at = COALESCE(?, started_at), finished_at = ?
+                WHERE id = ?
+                ''',
+                (status, stage, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, started_at, finished_at, job_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _update_progress(self, job_id: str, stage: Optional[str], progress: Dict[str, Any]) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                'UPDATE jobs SET stage = COALESCE(?, stage), progress = ? WHERE id = ?',
+                (stage, json.dumps(progress), job_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "payload": json.loads(row["payload"]),
+            "status": row["status"],
+            "stage": row["stage"],
+            "progress": json.loads(row["progress"]) if row["progress"] else {},
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)')
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TextIO
+
+# Số request một worker xử lý cùng lúc (các request khác chờ trong hàng đợi của process)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "4"))
+
+Handler = Callable[[Dict[str, Any], Callable[..., None]], Any]
+
+
+class JsonLinesWorker:
+    """Worker sống lâu nói giao thức JSON lines qua stdin/stdout (dùng cho gateway Node).
+
+    Mỗi dòng vào là một request `{"id": ..., "method": "...", "params": {...}}`; mỗi dòng ra
+    là `{"id": ..., "ok": true, "result": ...}` hoặc `{"id": ..., "ok": false, "error": "..."}`,
+    theo thứ tự xong trước trả trước nên nhiều request có thể chạy song song. Handler nhận
+    `(params, progress)`; `progress(stage, **counts)` gửi dòng `{"id": ..., "event": "progress"}`.
+    Khi sẵn sàng worker gửi `{"event": "ready"}`; stdin đóng thì chờ các request dở rồi thoát.
+    """
+
+    def __init__(self, handlers: Dict[str, Handler], threads: int = WORKER_THREADS,
+                 on_start: Optional[Callable[[], Any]] = None):
+        self.handlers = dict(handlers)
+        self.handlers.setdefault("ping", lambda params, progress: "pong")
+        self.threads = max(1, threads)
+        self.on_start = on_start
+        self._out: Optional[TextIO] = None
+        self._out_lock = threading.Lock()
+
+    def serve(self, stdin: TextIO = None, stdout: TextIO = None) -> None:
+        stdin = stdin or sys.stdin
+        self._out = stdout or self._take_stdout()
+        if self.on_start is not None:
+            self.on_start()
+        self._send({"event": "ready", "pid": os.getpid(), "methods": sorted(self.handlers)})
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="json-worker") as executor:
+            for line in stdin:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Request must be a JSON object")
+                except ValueError as e:
+                    self._send({"id": None, "ok": False, "error": f"Invalid request: {str(e)}"})
+                    continue
+                executor.submit(self._handle, request)
+
+    @staticmethod
+    def _take_stdout() -> TextIO:
+        """Giữ riêng fd 1 (pipe giao thức) cho worker và trỏ fd 1 sang stderr, để mọi thứ khác
+        ghi ra stdout (print của backend, process con trích xuất, tesseract/Java) không lẫn vào giao thức"""
+        sys.stdout.flush()
+        protocol_fd = os.dup(1)
+        os.dup2(2, 1)
+        return os.fdopen(protocol_fd, "w", encoding="utf-8")
+
+    def _handle(self, request: Dict[str, Any]) -> None:
+        request_id = request.get("id")
+        handler = self.handlers.get(request.get("method"))
+        if handler is None:
+            self._send({"id": request_id, "ok": False, "error": f"Unknown method: {request.get('method')}"})
+            return
+
+        def progress(stage: Optional[str] = None, **counts) -> None:
+            self._send({"id": request_id, "event": "progress", "stage": stage, **counts})
+
+        try:
+            result = handler(request.get("params") or {}, progress)
+        except Exception as e:
+            traceback.print_exc()
+            self._send({"id": request_id, "ok": False, "error": str(e)})
+            return
+        self._send({"id": request_id, "ok": True, "result": result})
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        line = json.dumps(message, ensure_ascii=False, default=str)
+        with self._out_lock:
+            self._out.write(line + "\n")
+            self._out.flush()
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# File được process_pdf ghi lại mỗi khi index thay đổi (dùng chung với cache câu trả lời)
+INDEX_VERSION_FILE = "index_version"
+LEXICAL_INDEX_DB = "lexical_index.sqlite"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Số có phân cách (730.000, 1,5, 145/2020), phần trăm, mã văn bản (nđ-cp) và âm tiết
+_TOKEN_RE = re.compile(r"\d+(?:[.,/]\d+)*%?|\w+(?:-\w+)*", re.UNICODE)
+
+# Nội dung bảng/biểu đồ/công thức được process_pdf ghi bằng nhãn tiếng Anh ("Table 2:")
+_LABEL_ALIASES = [
+    (re.compile(r"\bbảng\b"), "bảng table"),
+    (re.compile(r"\bbiểu[\s_-]*đồ\b"), "biểu đồ chart"),
+    (re.compile(r"\bcông\s+thức\b"), "công thức formula"),
+]
+
+
+def tokenize_vi(text: str) -> List[str]:
+    """Tách term cho tiếng Việt: âm tiết đã chuẩn hóa NFC/chữ thường và cặp âm tiết liền kề.
+
+    Từ tiếng Việt thường gồm nhiều âm tiết ("nghỉ phép", "bảo hiểm"), nên mỗi cặp
+    âm tiết liền kề được thêm dưới dạng "nghỉ_phép" để khớp cụm từ chính xác hơn.
+    """
+    syllables = _TOKEN_RE.findall(unicodedata.normalize("NFC", text).lower())
+    return syllables + [f"{a}_{b}" for a, b in zip(syllables, syllables[1:])]
+
+
+def expand_query(query: str) -> str:
+    """Thêm nhãn tiếng Anh sau "bảng"/"biểu đồ"/"công thức" để "bảng 2" khớp được "Table 2"."""
+    text = unicodedata.normalize("NFC", query).lower()
+    for pattern, replacement in _LABEL_ALIASES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Đánh giá bộ lọc metadata kiểu Chroma `where` ({key: value}, $eq/$ne/$in/$nin, $and/$or)"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class LexicalIndex:
+    """Chỉ mục ngược BM25 trên cùng các chunk/ID đã ghi vào ChromaDB, lưu trong SQLite.
+
+    process_pdf ghi qua `upsert`/`delete`; phía chatbot đọc qua `search`, bản sao trong
+    bộ nhớ được nạp lại khi file `index_version` thay đổi.
+    """
+
+    def __init__(self, chroma_dir: str = "./chroma_db", db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(chroma_dir, LEXICAL_INDEX_DB)
+        self.version_path = os.path.join(chroma_dir, INDEX_VERSION_FILE)
+        self._lock = threading.Lock()
+        self._loaded_stat = False
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._ids: List[str] = []
+        self._lengths: List[int] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._avg_length = 0.0
+        self._init_db()
+
+    def upsert(self, docs: List[Any], ids: List[str]) -> None:
+        """Ghi (hoặc ghi đè) các langchain Document theo chunk ID"""
+        conn = self._connect()
+        try:
+            conn.executemany('DELETE FROM postings WHERE chunk_id = ?', [(chunk_id,) for chunk_id in ids])
+            for doc, chunk_id in zip(docs, ids):
+                terms = Counter(tokenize_vi(doc.page_content))
+                conn.execute(
+                    'INSERT OR REPLACE INTO chunks (id, length, content, metadata) VALUES (?, ?, ?, ?)',
+                    (chunk_id, sum(terms.values()), doc.page_content, json.dumps(doc.metadata, ensure_ascii=False))
+                )
+                conn.executemany(
+                    'INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)',
+                    [(term, chunk_id, tf) for term, tf in terms.items()]
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete(self, ids: List[str]) -> None:
+        conn = self._connect()
+        try:
+            conn.executemany('DELETE FROM postings WHERE chunk_id = ?', [(chunk_id,) for chunk_id in ids])
+            conn.executemany('DELETE FROM chunks WHERE id = ?', [(chunk_id,) for chunk_id in ids])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def search(self, query: str, k: int = 10, where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, float]]:
+        """Trả về tối đa k cặp (chunk_id, điểm BM25) theo điểm giảm dần, chỉ trong các chunk khớp `where`"""
+        with self._lock:
+            self._refresh()
+            n = len(self._ids)
+            if not n:
+                return []
+            scores: Dict[int, float] = {}
+            for term in set(tokenize_vi(expand_query(query))):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_index, tf in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc_index] / self._avg_length)
+                    scores[doc_index] = scores.get(doc_index, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            if where:
+                scores = {i: score for i, score in scores.items() if matches_where(self._metadata[i], where)}
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+            return [(self._ids[doc_index], score) for doc_index, score in ranked]
+
+    def get(self, ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """Lấy (nội dung, metadata) của các chunk theo ID"""
+        if not ids:
+            return {}
+        conn = self._connect()
+        try:
+            placeholders = ",".join("?" * len(ids))
+            rows = conn.execute(
+                f'SELECT id, content, metadata FROM chunks WHERE id IN ({placeholders})', list(ids)
+            ).fetchall()
+        finally:
+            conn.close()
+        return {chunk_id: (content, json.loads(metadata)) for chunk_id, content, metadata in rows}
+
+    def _refresh(self) -> None:
+        """Nạp lại chỉ mục vào bộ nhớ nếu process_pdf đã ghi dữ liệu mới"""
+        try:
+            stat = os.stat(self.version_path)
+            current_stat = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            current_stat = None
+        if self._loaded_stat is not False and current_stat == self._loaded_stat:
+            return
+        conn = self._connect()
+        try:
+            chunk_rows = conn.execute('SELECT id, length, metadata FROM chunks').fetchall()
+            positions = {chunk_id: i for i, (chunk_id, _, _) in enumerate(chunk_rows)}
+            postings: Dict[str, List[Tuple[int, int]]] = {}
+            for term, chunk_id, tf in conn.execute('SELECT term, chunk_id, tf FROM postings'):
+                if chunk_id in positions:
+                    postings.setdefault(term, []).append((positions[chunk_id], tf))
+        finally:
+            conn.close()
+        self._ids = [chunk_id for chunk_id, _, _ in chunk_rows]
+        self._lengths = [length for _, length, _ in chunk_rows]
+        self._metadata = [json.loads(metadata) for _, _, metadata in chunk_rows]
+        self._avg_length = (sum(self._lengths) / len(self._lengths) if self._lengths else 0.0) or 1.0
+        self._postings = postings
+        self._loaded_stat = current_stat
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    length INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, chunk_id)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings (chunk_id)')
+            conn.commit()
+        finally:
+            conn.close()
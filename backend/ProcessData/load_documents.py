@@ -1,7 +1,7 @@
 import os
 import sys
 import json
-from typing import List, Dict, Any, Union
+from typing import List, Dict, Any, Union, Optional, Callable
 from datetime import datetime
 
 from dotenv import load_dotenv
@@ -9,11 +9,19 @@ from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
-from extract_text import extract_from_pdf, DocumentElement
+from extract_text import extract_from_pdf, compute_page_hashes, hash_file, DocumentElement
+from embedding_cache import CachedEmbeddings
+from embedding_writer import EmbeddingWriter
+from ingest_manifest import IngestManifest, make_chunk_id
+from lexical_index import LexicalIndex
+from element_registry import ElementRegistry
+from table_store import TableStore
 
 # Load biến môi trường
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
+# Cho phép trỏ tới server embedding tương thích OpenAI khác (vd. server giả khi kiểm thử)
+embedding_api_base = os.getenv("EMBEDDING_API_BASE")
 
 def convert_metadata_value(value: Any) -> Union[str, int, float, bool]:
     """Convert complex metadata values to supported types"""
@@ -35,6 +43,11 @@ def ensure_chroma_dir():
         print(f" Đã tạo thư mục {chroma_dir}")
     return chroma_dir
 
+def mark_index_updated(chroma_dir: str = "./chroma_db") -> None:
+    """Ghi lại phiên bản mới của index để các cache câu trả lời tự làm mới"""
+    with open(os.path.join(chroma_dir, "index_version"), "w", encoding="utf-8") as f:
+        f.write(datetime.now().isoformat())
+
 def process_text_elements(elements: List[DocumentElement], splitter: RecursiveCharacterTextSplitter) -> List[Document]:
     """Process text elements with appropriate chunking"""
     docs = []
@@ -79,7 +92,9 @@ def process_table_elements(elements: List[DocumentElement]) -> List[Document]:
             for idx, row in enumerate(table_content['data'], 1):
                 row_text = f"Row {idx}: "
                 row_items = []
-                for col, val in zip(table_content['columns'], row):
+                # Dòng có thể là dict {cột: giá trị} (records) hoặc list giá trị
+                values = row.values() if isinstance(row, dict) else row
+                for col, val in zip(table_content['columns'], values):
                     row_items.append(f"{col}={val}")
                 row_text += " | ".join(row_items)
                 table_text += row_text + "\n"
@@ -226,14 +241,84 @@ def process_formula_elements(elements: List[DocumentElement]) -> List[Document]:
             ))
     return docs
 
-def process_pdf(pdf_path: str) -> str:
-    """Process PDF file and store different types of elements in ChromaDB"""
-    ensure_chroma_dir()
+def assign_chunk_ids(docs: List[Document], doc_id: str) -> List[str]:
+    """Gán chunk ID xác định cho từng document theo (trang, loại, thứ tự trong trang)"""
+    ids = []
+    ordinals: Dict[tuple, int] = {}
+    for doc in docs:
+        key = (doc.metadata['page_number'], doc.metadata['type'])
+        ordinal = ordinals.get(key, 0)
+        ordinals[key] = ordinal + 1
+        chunk_id = make_chunk_id(doc_id, doc.metadata['page_number'], doc.metadata['type'], ordinal)
+        doc.metadata['chunk_id'] = chunk_id
+        doc.metadata['chunk_index'] = ordinal
+        doc.metadata['source'] = doc_id
+        ids.append(chunk_id)
+    return ids
+
+def renumber_tables(elements: List[DocumentElement], pages: Dict[int, str], processed: set, old_pages: Dict[str, Any]) -> None:
+    """Đánh lại table_index theo thứ tự trang trên toàn tài liệu, dùng số bảng trong manifest cho các trang không xử lý lại"""
+    tables_by_page: Dict[int, List[DocumentElement]] = {}
+    for element in elements:
+        if element.type == 'table':
+            tables_by_page.setdefault(element.page_number, []).append(element)
+
+    table_index = 0
+    for page_num in sorted(pages):
+        if page_num in processed:
+            for element in tables_by_page.get(page_num, []):
+                element.metadata['table_index'] = table_index
+                table_index += 1
+        else:
+            table_index += old_pages.get(str(page_num), {}).get('tables', 0)
+
+def process_pdf(pdf_path: str, progress: Optional[Callable[..., None]] = None, in_subprocess: bool = False) -> str:
+    """Process PDF file and store different types of elements in ChromaDB.
+
+    Only pages whose content changed since the last run are re-extracted; chunks of
+    changed or removed pages are replaced using deterministic chunk IDs.
+    `progress(stage, **counts)` receives the current stage and the pages extracted,
+    chunks embedded and vectors written so far (used by background ingestion jobs).
+    """
+    report = progress or (lambda stage=None, **counts: None)
+    chroma_dir = ensure_chroma_dir()
+    doc_id = os.path.abspath(pdf_path)
+    manifest = IngestManifest(os.path.join(chroma_dir, "ingest_manifest.json"))
+
+    # Bỏ qua file không thay đổi
+    file_hash = hash_file(pdf_path)
+    entry = manifest.get(doc_id)
+    if entry and entry['file_hash'] == file_hash:
+        return f"Tài liệu {os.path.basename(pdf_path)} không thay đổi kể từ lần xử lý trước, bỏ qua."
+
+    old_pages = entry['pages'] if entry else {}
+    report("hashing")
+    page_hashes = compute_page_hashes(pdf_path)
+    changed = {p for p, h in page_hashes.items() if old_pages.get(str(p), {}).get('hash') != h}
+    removed = {int(p) for p in old_pages if int(p) not in page_hashes}
+
+    # Số bảng trên một trang thay đổi làm lệch table_index của các trang sau, nên xử lý lại cả các trang đó
+    processed = set(changed)
+    if changed or removed:
+        first_change = min(changed | removed)
+        processed |= {
+            p for p in page_hashes
+            if p > first_change and old_pages.get(str(p), {}).get('tables', 0) > 0
+        }
     
-    # Extract all elements from PDF
-    elements = extract_from_pdf(pdf_path)
+    # Extract elements from the pages that need processing
+    report("extracting", pages_total=len(processed), pages_extracted=0)
+    elements = extract_from_pdf(
+        pdf_path,
+        pages=processed,
+        progress=lambda done, total: report(None, pages_extracted=done),
+        in_subprocess=in_subprocess
+    ) if processed else []
+    renumber_tables(elements, page_hashes, processed, old_pages)
     
     # Initialize text splitter for text content
+    # chunk_overlap giữ nguyên cho truy xuất; phần gối đầu giữa các chunk liền kề được
+    # ContextPacker (models/context_compressor.py) bỏ đi khi ghép context vào prompt
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=2000,
         chunk_overlap=200,
@@ -248,20 +333,84 @@ def process_pdf(pdf_path: str) -> str:
     
     # Combine all documents
     all_docs = text_docs + table_docs + chart_docs + formula_docs
+    ids = assign_chunk_ids(all_docs, doc_id)
+
+    # Chunk cũ của các trang đã xử lý lại hoặc đã bị xóa mà không còn được sinh ra nữa
+    new_ids = set(ids)
+    stale_ids = [
+        chunk_id
+        for page, info in old_pages.items()
+        if int(page) in processed or int(page) in removed
+        for chunk_id in info.get('chunk_ids', [])
+        if chunk_id not in new_ids
+    ]
     
-    # Create embeddings and store in ChromaDB
-    embedding = OpenAIEmbeddings(api_key=api_key)
-    vectorstore = Chroma.from_documents(
-        documents=all_docs,
-        embedding=embedding,
-        persist_directory="./chroma_db"
+    # Create embeddings (reusing cached vectors for known chunks) and store in ChromaDB batch by batch
+    embedding = CachedEmbeddings(
+        # EmbeddingWriter tự thử lại và backoff nên tắt retry của client
+        OpenAIEmbeddings(api_key=api_key, base_url=embedding_api_base, max_retries=0),
+        db_path=os.path.join(chroma_dir, "embedding_cache.sqlite")
+    )
+    vectorstore = Chroma(
+        persist_directory=chroma_dir,
+        embedding_function=embedding
     )
-    vectorstore.persist()
+    # Chỉ mục BM25 giữ đúng tập chunk/ID như ChromaDB để retriever lai ghép hai kết quả
+    lexical_index = LexicalIndex(chroma_dir)
+    # Tra cứu trực tiếp bảng/biểu đồ/công thức theo chỉ số hoặc trang
+    element_registry = ElementRegistry(chroma_dir)
+    # Bảng được lưu thêm dạng có cấu trúc để chatbot lọc/tính toán trực tiếp
+    table_store = TableStore(chroma_dir)
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+        lexical_index.delete(stale_ids)
+        element_registry.delete(stale_ids)
+        table_store.delete(stale_ids)
+    report("embedding", chunks_total=len(all_docs), chunks_embedded=0, vectors_written=0)
+    writer = EmbeddingWriter(vectorstore, embedding)
+    writer.write(all_docs, ids, progress=report)
+    report("indexing")
+    lexical_index.upsert(all_docs, ids)
+    element_registry.upsert(all_docs, ids)
+    # process_table_elements sinh đúng một document cho mỗi bảng, theo thứ tự
+    table_store.upsert([element for element in elements if element.type == 'table'], table_docs)
+    if stale_ids or all_docs:
+        vectorstore.persist()
+        mark_index_updated(chroma_dir)
+
+    # Cập nhật manifest
+    pages = {}
+    for page_num, page_hash in page_hashes.items():
+        if page_num in processed:
+            pages[page_num] = {'hash': page_hash, 'chunk_ids': [], 'tables': 0}
+        else:
+            pages[page_num] = old_pages[str(page_num)]
+    for doc in all_docs:
+        page_info = pages[doc.metadata['page_number']]
+        page_info['chunk_ids'].append(doc.metadata['chunk_id'])
+        if doc.metadata['type'] == 'table':
+            page_info['tables'] += 1
+    manifest.update(doc_id, os.path.basename(pdf_path), file_hash, pages)
     
-    return f"Đã xử lý và lưu {len(text_docs)} đoạn văn bản, {len(table_docs)} bảng, {len(chart_docs)} biểu đồ, và {len(formula_docs)} công thức vào ChromaDB."
+    cache_stats = embedding.stats()
+    return (
+        f"Đã xử lý {len(processed)}/{len(page_hashes)} trang thay đổi ({len(removed)} trang bị xóa) và lưu "
+        f"{len(text_docs)} đoạn văn bản, {len(table_docs)} bảng, {len(chart_docs)} biểu đồ, và {len(formula_docs)} công thức vào ChromaDB. "
+        f"Đã xóa {len(stale_ids)} chunk cũ. "
+        f"Embedding cache: {cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']} đoạn trúng cache ({cache_stats['hit_rate']:.0%})."
+    )
+
+def serve_worker() -> None:
+    """Chế độ worker sống lâu cho gateway Node (`python load_documents.py --worker`), xem JsonLinesWorker"""
+    from json_worker import JsonLinesWorker
+    JsonLinesWorker({
+        "process_pdf": lambda params, progress: process_pdf(params["file_path"], progress=progress),
+    }, threads=int(os.getenv("INGEST_WORKERS", "1"))).serve()
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if sys.argv[1:] == ["--worker"]:
+        serve_worker()
+    elif len(sys.argv) > 1:
         pdf_path = sys.argv[1]
         result = process_pdf(pdf_path)
         print(result)
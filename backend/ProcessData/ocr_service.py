@@ -0,0 +1,251 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pytesseract
+
+# Số lệnh tesseract chạy đồng thời trong mỗi process (tesseract là process riêng nên dùng thread là đủ)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+# Cache kết quả OCR dùng chung giữa các process trích xuất và giữa các lần nạp tài liệu
+OCR_CACHE_DB = os.getenv("OCR_CACHE_DB", "./chroma_db/ocr_cache.sqlite")
+OCR_LANG = os.getenv("OCR_LANG", "eng+vie")
+# Ghép các vùng biểu đồ của một trang thành một ảnh để chỉ gọi tesseract một lần. Tắt mặc
+# định: text được ghép lại từ từng từ của image_to_data theo tọa độ y nên xuống dòng/khoảng
+# trắng khác image_to_string, tức là khác nội dung được embed
+OCR_BATCH_PAGE = os.getenv("OCR_BATCH_PAGE", "0") == "1"
+
+OCR_FAILED_TEXT = "Không thể trích xuất text từ biểu đồ"
+# Khoảng trắng giữa các vùng khi ghép ảnh, đủ lớn để tesseract không nối dòng giữa hai vùng
+_BATCH_GAP = 40
+
+
+def image_key(image: np.ndarray, lang: str = OCR_LANG) -> str:
+    """Khóa cache theo nội dung ảnh: sha256 của ngôn ngữ OCR, kích thước và pixel"""
+    digest = hashlib.sha256(f"{lang}\0{image.shape}\0{image.dtype}\0".encode("utf-8"))
+    digest.update(np.ascontiguousarray(image).tobytes())
+    return digest.hexdigest()
+
+
+def _stack_images(images: List[np.ndarray]):
+    """Ghép các ảnh theo chiều dọc trên nền trắng, trả về ảnh ghép và khoảng y của từng ảnh"""
+    width = max(img.shape[1] for img in images)
+    channels = images[0].shape[2] if images[0].ndim == 3 else None
+    height = sum(img.shape[0] for img in images) + _BATCH_GAP * (len(images) + 1)
+    shape = (height, width, channels) if channels else (height, width)
+    canvas = np.full(shape, 255, dtype=np.uint8)
+
+    spans = []
+    y = _BATCH_GAP
+    for img in images:
+        h, w = img.shape[:2]
+        canvas[y:y+h, :w] = img
+        spans.append((y, y + h))
+        y += h + _BATCH_GAP
+    return canvas, spans
+
+
+def _split_batch_text(data: Dict[str, list], spans) -> List[str]:
+    """Chia kết quả image_to_data của ảnh ghép về từng vùng theo tọa độ y của mỗi từ"""
+    lines: List[Dict[tuple, List[str]]] = [{} for _ in spans]
+    for i, word in enumerate(data["text"]):
+        if not word or not word.strip():
+            continue
+        center = data["top"][i] + data["height"][i] / 2
+        for region, (top, bottom) in enumerate(spans):
+            if top - _BATCH_GAP / 2 <= center < bottom + _BATCH_GAP / 2:
+                line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+                lines[region].setdefault(line_key, []).append(word)
+                break
+
+    texts = []
+    for region_lines in lines:
+        out = []
+        previous = None
+        for (block, par, _), words in region_lines.items():
+            # Dòng trống giữa các đoạn giống định dạng của image_to_string
+            if previous is not None and previous != (block, par):
+                out.append("")
+            out.append(" ".join(words))
+            previous = (block, par)
+        texts.append("\n".join(out) + "\n" if out else "")
+    return texts
+
+
+class OcrService:
+    """Pool OCR giới hạn số tesseract chạy song song, kèm cache SQLite theo hash ảnh.
+
+    Ảnh giống hệt nhau (logo, hình lặp lại giữa các trang/tài liệu) chỉ được OCR một
+    lần. Các vùng của cùng một trang được gửi chung một lệnh tesseract.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, db_path: Optional[str] = OCR_CACHE_DB,
+                 lang: str = OCR_LANG, batch_page: bool = OCR_BATCH_PAGE):
+        self.lang = lang
+        self.batch_page = batch_page
+        # Hai chế độ cho text định dạng khác nhau nên không dùng chung mục cache
+        self._key_lang = f"{lang}+batch" if batch_page else lang
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ocr")
+        self._lock = threading.Lock()
+        # Các ảnh đang được OCR, để request trùng nhau chờ chung một kết quả
+        self._inflight: Dict[str, Future] = {}
+        if self.db_path:
+            self._init_db()
+
+    def submit_page(self, images: List[np.ndarray]) -> Future:
+        """Gửi các vùng biểu đồ của một trang; Future trả về danh sách text theo đúng thứ tự"""
+        keys = [image_key(img, self._key_lang) for img in images]
+        cached = self._lookup(set(keys))
+
+        pending: Dict[str, Future] = {}
+        missing: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key, img in zip(keys, images):
+                if key in cached or key in pending or key in missing:
+                    continue
+                if key in self._inflight:
+                    pending[key] = self._inflight[key]
+                else:
+                    missing[key] = img
+            hit_count = sum(1 for key in keys if key in cached)
+            self.hits += hit_count
+            self.misses += len(keys) - hit_count
+
+            if missing:
+                batch_future = self._executor.submit(self._run, list(missing.keys()), list(missing.values()))
+                for key in missing:
+                    item_future: Future = Future()
+                    self._inflight[key] = item_future
+                    pending[key] = item_future
+                batch_future.add_done_callback(lambda f, ks=list(missing.keys()): self._resolve(ks, f))
+
+        result: Future = Future()
+        if not pending:
+            result.set_result([cached[key] for key in keys])
+            return result
+
+        remaining = [len(pending)]
+
+        def _on_done(_):
+            with self._lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            texts = dict(cached)
+            for key, future in pending.items():
+                texts[key] = future.result()
+            result.set_result([texts[key] for key in keys])
+
+        for future in pending.values():
+            future.add_done_callback(_on_done)
+        return result
+
+    def ocr_page(self, images: List[np.ndarray]) -> List[str]:
+        return self.submit_page(images).result()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _run(self, keys: List[str], images: List[np.ndarray]) -> List[Optional[str]]:
+        """Chạy tesseract cho các ảnh chưa có trong cache; None nghĩa là OCR lỗi"""
+        if self.batch_page and len(images) > 1:
+            try:
+                canvas, spans = _stack_images(images)
+                data = pytesseract.image_to_data(canvas, lang=self.lang, output_type=pytesseract.Output.DICT)
+                texts = _split_batch_text(data, spans)
+            except Exception as e:
+                print(f"Error running batched OCR, falling back to single images: {str(e)}")
+                texts = [self._ocr_one(img) for img in images]
+        else:
+            texts = [self._ocr_one(img) for img in images]
+
+        self._store({key: text for key, text in zip(keys, texts) if text is not None})
+        return texts
+
+    def _ocr_one(self, image: np.ndarray) -> Optional[str]:
+        try:
+            return pytesseract.image_to_string(image, lang=self.lang)
+        except Exception as e:
+            print(f"Error running OCR: {str(e)}")
+            return None
+
+    def _resolve(self, keys: List[str], batch_future: Future) -> None:
+        try:
+            texts = batch_future.result()
+        except Exception as e:
+            print(f"Error running OCR batch: {str(e)}")
+            texts = [None] * len(keys)
+        with self._lock:
+            futures = [self._inflight.pop(key) for key in keys]
+        for future, text in zip(futures, texts):
+            # Lỗi OCR không được cache để lần nạp sau còn thử lại
+            future.set_result(text if text is not None else OCR_FAILED_TEXT)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ocr_cache (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _lookup(self, keys: set) -> Dict[str, str]:
+        if not self.db_path or not keys:
+            return {}
+        keys = list(keys)
+        conn = self._connect()
+        try:
+            placeholders = ",".join("?" * len(keys))
+            rows = conn.execute(f"SELECT key, text FROM ocr_cache WHERE key IN ({placeholders})", keys).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    def _store(self, entries: Dict[str, str]) -> None:
+        if not self.db_path or not entries:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO ocr_cache (key, text) VALUES (?, ?)", list(entries.items()))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+_service: Optional[OcrService] = None
+_service_lock = threading.Lock()
+
+
+def get_ocr_service() -> OcrService:
+    """OcrService dùng chung trong process (mỗi process trích xuất con có pool riêng)"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = OcrService()
+        return _service
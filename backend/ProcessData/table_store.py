@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import math
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+TABLE_STORE_DB = "table_store.sqlite"
+
+# Phép gộp được phép trên một cột số
+AGGREGATES = {
+    'sum': 'SUM',
+    'avg': 'AVG',
+    'min': 'MIN',
+    'max': 'MAX',
+    'count': 'COUNT',
+}
+
+_NUMBER_RE = re.compile(r"-?\d[\d.,\s]*")
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """Đọc số từ ô bảng theo cả cách viết Việt ("1.234.567", "1,5") lẫn Anh ("1,234.5", "12%").
+
+    Khi có cả "." và "," thì dấu xuất hiện sau cùng là dấu thập phân. Khi chỉ có một loại
+    dấu, nó là dấu phân cách hàng nghìn nếu mọi nhóm sau nó đều đủ 3 chữ số.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if isinstance(value, float) and math.isnan(value) else float(value)
+    match = _NUMBER_RE.search(str(value))
+    if not match:
+        return None
+    number = re.sub(r"\s", "", match.group()).rstrip(".,")
+    if "." in number and "," in number:
+        decimal = "." if number.rfind(".") > number.rfind(",") else ","
+        thousands = "," if decimal == "." else "."
+        number = number.replace(thousands, "").replace(decimal, ".")
+    elif "." in number or "," in number:
+        sep = "." if "." in number else ","
+        groups = number.split(sep)
+        if len(groups) > 2 or all(len(group) == 3 for group in groups[1:]):
+            number = number.replace(sep, "")
+        else:
+            number = number.replace(sep, ".")
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def _cell_text(value: Any) -> Optional[str]:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return str(value).strip()
+
+
+@dataclass
+class StoredTable:
+    name: str
+    chunk_id: str
+    source: str
+    table_index: int
+    page_number: int
+    columns: List[str]
+    title: str = ''
+
+
+class TableStore:
+    """Lưu mỗi bảng trích xuất thành một bảng SQLite thật để truy vấn lọc/gộp trực tiếp.
+
+    Cột thứ i của bảng gốc được lưu thành `c{i}` (text gốc) và `n{i}` (giá trị số đã
+    đọc, NULL nếu ô không phải số). Bảng `catalog` ánh xạ chunk ID, tài liệu,
+    table_index và trang sang tên bảng SQLite cùng tên cột gốc.
+    """
+
+    def __init__(self, chroma_dir: str = "./chroma_db", db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(chroma_dir, TABLE_STORE_DB)
+        self._init_db()
+
+    def upsert(self, elements: Sequence[Any], docs: Sequence[Any]) -> None:
+        """Ghi các DocumentElement loại 'table' cùng document đã gán chunk ID tương ứng"""
+        conn = self._connect()
+        try:
+            for element, doc in zip(elements, docs):
+                chunk_id = doc.metadata['chunk_id']
+                self._drop(conn, chunk_id)
+                content = element.content
+                rows = [list(row.values() if isinstance(row, dict) else row) for row in content.get('data', [])]
+                columns = [str(col) for col in content.get('columns', [])] or [
+                    f"Unnamed: {i}" for i in range(max((len(row) for row in rows), default=0))
+                ]
+                name = f"t_{chunk_id}"
+                column_defs = "".join(f", c{i} TEXT, n{i} REAL" for i in range(len(columns)))
+                conn.execute(f'CREATE TABLE "{name}" (row_number INTEGER PRIMARY KEY{column_defs})')
+                placeholders = ", ".join("?" * (2 * len(columns) + 1))
+                records = []
+                for row_number, row in enumerate(rows, 1):
+                    record = [row_number]
+                    for i in range(len(columns)):
+                        cell = row[i] if i < len(row) else None
+                        record += [_cell_text(cell), parse_number(cell)]
+                    records.append(record)
+                conn.executemany(f'INSERT INTO "{name}" VALUES ({placeholders})', records)
+                conn.execute(
+                    'INSERT INTO catalog (chunk_id, name, source, table_index, page_number, columns, title) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (chunk_id, name, doc.metadata.get('source', ''), int(element.metadata['table_index']),
+                     int(element.page_number), json.dumps(columns, ensure_ascii=False), doc.metadata.get('title', ''))
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def delete(self, chunk_ids: Sequence[str]) -> None:
+        conn = self._connect()
+        try:
+            for chunk_id in chunk_ids:
+                self._drop(conn, chunk_id)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def find(self, table_index: int, source: Optional[str] = None) -> List[StoredTable]:
+        query = 'SELECT chunk_id, name, source, table_index, page_number, columns, title FROM catalog WHERE table_index = ?'
+        params: list = [table_index]
+        if source is not None:
+            query += ' AND source = ?'
+            params.append(source)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query + ' ORDER BY source', params).fetchall()
+        finally:
+            conn.close()
+        return [
+            StoredTable(name=name, chunk_id=chunk_id, source=src, table_index=index, page_number=page,
+                        columns=json.loads(columns), title=title or '')
+            for chunk_id, name, src, index, page, columns, title in rows
+        ]
+
+    def rows(self, table: StoredTable, filters: Optional[Dict[int, str]] = None, limit: Optional[int] = None) -> List[Tuple[int, List[Optional[str]]]]:
+        """Các dòng (số thứ tự, giá trị gốc) thỏa mọi điều kiện `{cột: chuỗi con}` (không phân biệt hoa thường)"""
+        where, params = self._where(filters)
+        select = ", ".join(f"c{i}" for i in range(len(table.columns))) or "NULL"
+        sql = f'SELECT row_number, {select} FROM "{table.name}"{where} ORDER BY row_number'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        conn = self._connect()
+        try:
+            return [(row[0], list(row[1:])) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def numeric_columns(self, table: StoredTable) -> Set[int]:
+        """Chỉ số các cột có ít nhất một ô đọc được thành số"""
+        if not table.columns:
+            return set()
+        select = ", ".join(f"COUNT(n{i})" for i in range(len(table.columns)))
+        conn = self._connect()
+        try:
+            counts = conn.execute(f'SELECT {select} FROM "{table.name}"').fetchone()
+        finally:
+            conn.close()
+        return {i for i, count in enumerate(counts) if count}
+
+    def aggregate(self, table: StoredTable, op: str, column: int, filters: Optional[Dict[int, str]] = None,
+                  row_numbers: Optional[Sequence[int]] = None) -> Tuple[Optional[float], int]:
+        """Tính SUM/AVG/MIN/MAX/COUNT trên các ô số của một cột; trả về (giá trị, số ô số được dùng)"""
+        where, params = self._where(filters, numeric_column=column, row_numbers=row_numbers)
+        sql = f'SELECT {AGGREGATES[op]}(n{column}), COUNT(n{column}) FROM "{table.name}"{where}'
+        conn = self._connect()
+        try:
+            value, count = conn.execute(sql, params).fetchone()
+        finally:
+            conn.close()
+        return value, count
+
+    def extreme_row(self, table: StoredTable, column: int, highest: bool = True,
+                    filters: Optional[Dict[int, str]] = None) -> Optional[Tuple[int, List[Optional[str]]]]:
+        """Dòng có giá trị số lớn nhất (hoặc nhỏ nhất) ở một cột"""
+        where, params = self._where(filters, numeric_column=column)
+        select = ", ".join(f"c{i}" for i in range(len(table.columns)))
+        order = "DESC" if highest else "ASC"
+        sql = f'SELECT row_number, {select} FROM "{table.name}"{where} ORDER BY n{column} {order} LIMIT 1'
+        conn = self._connect()
+        try:
+            row = conn.execute(sql, params).fetchone()
+        finally:
+            conn.close()
+        return (row[0], list(row[1:])) if row else None
+
+    def _where(self, filters: Optional[Dict[int, str]], numeric_column: Optional[int] = None,
+               row_numbers: Optional[Sequence[int]] = None) -> Tuple[str, list]:
+        clauses, params = [], []
+        for column, needle in (filters or {}).items():
+            clauses.append(f"LOWER(c{int(column)}) LIKE ?")
+            params.append(f"%{needle.lower()}%")
+        if row_numbers:
+            clauses.append(f"row_number IN ({', '.join('?' * len(row_numbers))})")
+            params.extend(row_numbers)
+        if numeric_column is not None:
+            clauses.append(f"n{int(numeric_column)} IS NOT NULL")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def _drop(self, conn: sqlite3.Connection, chunk_id: str) -> None:
+        row = conn.execute('SELECT name FROM catalog WHERE chunk_id = ?', (chunk_id,)).fetchone()
+        if row:
+            conn.execute(f'DROP TABLE IF EXISTS "{row[0]}"')
+            conn.execute('DELETE FROM catalog WHERE chunk_id = ?', (chunk_id,))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS catalog (
+                    chunk_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    table_index INTEGER NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    columns TEXT NOT NULL,
+                    title TEXT
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_catalog_index ON catalog (table_index, source)')
+            conn.commit()
+        finally:
+            conn.close()
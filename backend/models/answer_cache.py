@@ -0,0 +1,270 @@
+import os
+import re
+import copy
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# File được process_pdf ghi lại mỗi khi có document mới trong ChromaDB
+INDEX_VERSION_FILE = "index_version"
+
+
+def normalize_question(question: str) -> str:
+    """Chuẩn hóa câu hỏi: NFC, chữ thường, bỏ dấu câu và khoảng trắng thừa"""
+    text = unicodedata.normalize("NFC", question).lower()
+    text = re.sub(r"[^\w\s%/.,-]", " ", text)
+    text = re.sub(r"[.,?!]+(\s|$)", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def question_numbers(normalized: str) -> tuple:
+    """Các số trong câu hỏi đã chuẩn hóa (số bảng, số biểu đồ, số liệu...), theo thứ tự xuất hiện"""
+    return tuple(_NUMBER_RE.findall(normalized))
+
+
+@dataclass
+class CacheLookup:
+    result: Optional[Dict[str, Any]]
+    kind: Optional[str]  # 'exact', 'semantic' hoặc None nếu miss
+    embedding: Optional[np.ndarray] = None
+
+
+class _CacheEntry:
+    __slots__ = ("question", "embedding", "result", "created_at", "numbers")
+
+    def __init__(self, question: str, embedding: Optional[np.ndarray], result: Dict[str, Any], created_at: float,
+                 numbers: tuple = ()):
+        self.question = question
+        self.embedding = embedding
+        self.result = result
+        self.created_at = created_at
+        self.numbers = numbers
+
+
+class AnswerCache:
+    """Cache câu trả lời: khớp chính xác câu hỏi đã chuẩn hóa, sau đó so khớp embedding.
+
+    Cache tự xóa khi file `index_version` trong thư mục ChromaDB thay đổi, tức là
+    mỗi lần process_pdf ghi thêm document mới. Khớp embedding chỉ nhận entry có cùng các
+    số trong câu hỏi: "tổng lương bảng 2" và "tổng lương bảng 3" gần như cùng embedding
+    nhưng hỏi về hai bảng khác nhau.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Optional[Callable[[str], List[float]]] = None,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 512,
+        ttl_seconds: Optional[float] = 3600,
+        db_path: Optional[str] = None,
+        chroma_dir: str = "./chroma_db",
+    ):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.version_path = os.path.join(chroma_dir, INDEX_VERSION_FILE)
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version_stat = None
+        self._index_version = self._read_index_version()
+        self._counters = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+        if self.db_path:
+            self._init_db()
+            self._load_from_db()
+
+    def get(self, question: str) -> CacheLookup:
+        """Tìm câu trả lời đã cache cho câu hỏi; trả về embedding đã tính để dùng lại khi put"""
+        key = normalize_question(question)
+        with self._lock:
+            self._check_index_version()
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry):
+                self._entries.move_to_end(key)
+                self._counters["exact_hits"] += 1
+                return CacheLookup(copy.deepcopy(entry.result), "exact")
+
+        if self.embed_fn is None:
+            with self._lock:
+                self._counters["misses"] += 1
+            return CacheLookup(None, None)
+
+        embedding = self._embed(key)
+        numbers = question_numbers(key)
+        with self._lock:
+            best_key, best_score = None, -1.0
+            for entry_key, entry in self._entries.items():
+                if entry.embedding is None or self._expired(entry) or entry.numbers != numbers:
+                    continue
+                score = float(np.dot(embedding, entry.embedding))
+                if score > best_score:
+                    best_key, best_score = entry_key, score
+            if best_key is not None and best_score >= self.similarity_threshold:
+                self._entries.move_to_end(best_key)
+                self._counters["semantic_hits"] += 1
+                return CacheLookup(copy.deepcopy(self._entries[best_key].result), "semantic", embedding)
+            self._counters["misses"] += 1
+        return CacheLookup(None, None, embedding)
+
+    def put(self, question: str, result: Dict[str, Any], embedding: Optional[np.ndarray] = None) -> None:
+        key = normalize_question(question)
+        if embedding is None and self.embed_fn is not None:
+            embedding = self._embed(key)
+        entry = _CacheEntry(question, embedding, copy.deepcopy(result), time.time(), question_numbers(key))
+        with self._lock:
+            self._check_index_version()
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._persist(key, entry)
+            self._evict()
+
+    def invalidate(self) -> None:
+        """Xóa toàn bộ cache (ví dụ sau khi nạp thêm tài liệu)"""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._counters["exact_hits"] + self._counters["semantic_hits"]
+            lookups = hits + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "similarity_threshold": self.similarity_threshold,
+                "index_version": self._index_version,
+            }
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expired(self, entry: _CacheEntry) -> bool:
+        return self.ttl_seconds is not None and time.time() - entry.created_at > self.ttl_seconds
+
+    def _evict(self) -> None:
+        expired = [key for key, entry in self._entries.items() if self._expired(entry)]
+        for key in expired:
+            self._remove(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self._counters["evictions"] += 1
+        if self.db_path:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM answer_cache WHERE key = ?", (key,))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._counters["invalidations"] += 1
+        if self.db_path:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM answer_cache")
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _read_index_version(self) -> str:
+        try:
+            stat = os.stat(self.version_path)
+        except OSError:
+            self._version_stat = None
+            return ""
+        self._version_stat = (stat.st_mtime_ns, stat.st_size)
+        with open(self.version_path, encoding="utf-8") as f:
+            return f.read().strip()
+
+    def _check_index_version(self) -> None:
+        """Xóa cache nếu ChromaDB đã được ghi thêm kể từ lần kiểm tra trước"""
+        try:
+            stat = os.stat(self.version_path)
+            current_stat = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            current_stat = None
+        if current_stat == self._version_stat:
+            return
+        version = self._read_index_version()
+        if version != self._index_version:
+            self._index_version = version
+            self._clear()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self) -> None:
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    key TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    embedding TEXT,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    index_version TEXT NOT NULL
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _persist(self, key: str, entry: _CacheEntry) -> None:
+        if not self.db_path:
+            return
+        embedding = json.dumps(entry.embedding.tolist()) if entry.embedding is not None else None
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO answer_cache (key, question, embedding, result, created_at, index_version) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, entry.question, embedding, json.dumps(entry.result, ensure_ascii=False),
+                 entry.created_at, self._index_version)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _load_from_db(self) -> None:
+        """Nạp lại các entry còn hạn và cùng phiên bản index từ SQLite"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM answer_cache WHERE index_version != ?", (self._index_version,))
+            if self.ttl_seconds is not None:
+                conn.execute("DELETE FROM answer_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            conn.commit()
+            rows = conn.execute(
+                'SELECT key, question, embedding, result, created_at FROM answer_cache '
+                'ORDER BY created_at DESC LIMIT ?',
+                (self.max_entries,)
+            ).fetchall()
+        finally:
+            conn.close()
+        for key, question, embedding, result, created_at in reversed(rows):
+            vector = np.asarray(json.loads(embedding), dtype=np.float32) if embedding else None
+            self._entries[key] = _CacheEntry(question, vector, json.loads(result), created_at, question_numbers(key))
@@ -2,19 +2,39 @@ import os
 import sys
 import json
 import re
-from typing import List, Dict, Any
+import queue
+import time
+import threading
+from typing import List, Dict, Any, Iterator, Optional
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain.callbacks.base import BaseCallbackHandler
 from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
 from langchain.memory import ConversationSummaryBufferMemory
 from langchain.prompts import PromptTemplate
 from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import LLMChainExtractor
+from langchain.retrievers.document_compressors import DocumentCompressorPipeline, LLMChainExtractor
 from langchain.schema import Document
-
-dotenv_path = r"C:\Users\DELL\OneDrive\Desktop\ai-policy-chatbot\backend\ProcessData\.env"  
-load_dotenv(dotenv_path=dotenv_path)
+from memory_store import ConversationMemoryStore
+from answer_cache import AnswerCache
+from context_compressor import ContextPacker, ExtractiveCompressor, openai_token_counter
+from hybrid_retriever import HybridRetriever
+from retrieval_router import Route, RoutedRetriever, DEFAULT_ROUTE, use_route, vector_search
+from pipeline_metrics import LLMMetricsHandler, TimedCompressor, record_request, stage, timed, trace_request
+
+# Chỉ mục BM25 do process_pdf ghi nằm cùng thư mục xử lý tài liệu
+PROCESS_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ProcessData")
+sys.path.append(PROCESS_DATA_DIR)
+from lexical_index import LexicalIndex
+from element_registry import ElementRegistry
+from table_store import TableStore
+from table_query import answer_table_question
+from chat_store import get_chat_store
+
+# .env nằm cạnh app.py trong ProcessData; biến đã có trong môi trường được giữ nguyên
+load_dotenv(dotenv_path=os.path.join(PROCESS_DATA_DIR, ".env"))
 
 def ensure_chroma_dir():
     chroma_dir = "./chroma_db"
@@ -22,44 +42,22 @@ def ensure_chroma_dir():
         os.makedirs(chroma_dir)
     return chroma_dir
 
-ensure_chroma_dir()
-
-# Khởi tạo embedding model
-embedding = OpenAIEmbeddings()
-
-# Khởi tạo vectorstore với metadata filtering
-vectorstore = Chroma(
-    persist_directory="./chroma_db",
-    embedding_function=embedding
-)
-
-# Khởi tạo LLM với các tham số tối ưu cho tốc độ
-llm = ChatOpenAI(
-    model="gpt-3.5-turbo",  
-    temperature=0.1,
-    max_tokens=1024,  
-    frequency_penalty=0.1,
-    presence_penalty=0.1,
-    request_timeout=30  
-)
-
-# Tạo compressor nhẹ hơn
-compressor = LLMChainExtractor.from_llm(llm)
+# Tag của LLM -> tên bước trong metrics; lần gọi LLM khác (rút gọn câu hỏi) là "condense"
+LLM_STAGE_TAGS = {"answer": "generation"}
 
-# Tạo retriever với contextual compression và số lượng documents ít hơn
-base_retriever = vectorstore.as_retriever(
-    search_type="similarity",
-    search_kwargs={
-        "k": 3,  # Giảm số lượng documents để lấy
-        "filter": None
-    }
-)
+# Nén context: "extractive" chọn câu/dòng bảng khớp câu hỏi ngay trong process (vài ms),
+# "llm" dùng LLMChainExtractor (thêm một lần gọi LLM cho mỗi document)
+CONTEXT_COMPRESSOR = os.getenv("CONTEXT_COMPRESSOR", "extractive")
+# RETRIEVER_MODE=hybrid ghép kết quả vector với BM25 (RRF), "vector" chỉ dùng similarity
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "hybrid")
 
-retriever = ContextualCompressionRetriever(
-    base_compressor=compressor,
-    base_retriever=base_retriever,
-    max_documents=3  # Di chuyển max_documents vào đây
-)
+# Mỗi loại câu hỏi chỉ tìm trong chunk cùng loại (metadata `type` do process_pdf ghi), với k riêng
+RETRIEVAL_ROUTES = {
+    'table': Route('table', where={'type': 'table'}, k=int(os.getenv("ROUTE_TABLE_K", "2"))),
+    'chart': Route('chart', where={'type': 'chart'}, k=int(os.getenv("ROUTE_CHART_K", "2"))),
+    'formula': Route('formula', where={'type': 'formula'}, k=int(os.getenv("ROUTE_FORMULA_K", "3"))),
+    'default': DEFAULT_ROUTE,
+}
 
 # Tạo custom prompt template để hướng dẫn model trả lời chính xác hơn
 template = """Bạn là một trợ lý AI chuyên nghiệp, được huấn luyện để trả lời câu hỏi dựa trên tài liệu được cung cấp. Hãy tuân thủ các nguyên tắc sau:
@@ -101,28 +99,223 @@ QA_PROMPT = PromptTemplate(
     input_variables=["context", "chat_history", "question"]
 )
 
-# Khởi tạo memory với giới hạn token thấp hơn
-memory = ConversationSummaryBufferMemory(
-    llm=llm,
-    memory_key="chat_history",
-    output_key="answer",
-    return_messages=True,
-    max_token_limit=1000  # Giảm giới hạn token
-)
+# Số chunk tối đa khi cùng một chỉ số có trong nhiều tài liệu
+ELEMENT_LOOKUP_MAX = 3
+# Mặc định kết quả tính được từ bảng chỉ làm context rút gọn cho LLM; TABLE_QUERY_DIRECT=1
+# trả thẳng kết quả mà không gọi LLM khi câu hỏi có từ khóa phép tính và khớp tên cột
+TABLE_QUERY_DIRECT = os.getenv("TABLE_QUERY_DIRECT", "0") == "1"
 
-# Tạo conversation chain với các tham số tối ưu
-conversation_chain = ConversationalRetrievalChain.from_llm(
-    llm=llm,
-    retriever=retriever,
-    memory=memory,
-    combine_docs_chain_kwargs={
-        "prompt": QA_PROMPT,
-        "document_variable_name": "context"  # Chỉ định rõ tên biến
-    },
-    verbose=False,  # Tắt verbose để tăng tốc
-    return_source_documents=True,
-    return_generated_question=True
-)
+class ChatbotComponents:
+    """Các thành phần nặng của chatbot: embedding, Chroma, LLM, retriever, chain, memory, cache.
+
+    Được tạo một lần khi cần (xem get_components), để import module này vẫn nhanh và
+    không phụ thuộc OpenAI/Chroma với các process chỉ nạp tài liệu.
+    """
+
+    def __init__(self):
+        ensure_chroma_dir()
+
+        # Khởi tạo embedding model
+        self.embedding = OpenAIEmbeddings()
+
+        # Khởi tạo vectorstore với metadata filtering
+        self.vectorstore = Chroma(
+            persist_directory="./chroma_db",
+            embedding_function=self.embedding
+        )
+
+        # Khởi tạo LLM với các tham số tối ưu cho tốc độ
+        self.llm = ChatOpenAI(
+            model="gpt-3.5-turbo",  
+            temperature=0.1,
+            max_tokens=1024,  
+            frequency_penalty=0.1,
+            presence_penalty=0.1,
+            request_timeout=30  
+        )
+
+        # LLM sinh câu trả lời bật streaming để có thể đẩy từng token về client;
+        # bước rút gọn câu hỏi (và nén context khi CONTEXT_COMPRESSOR=llm) vẫn dùng LLM thường ở trên
+        self.answer_llm = ChatOpenAI(
+            model="gpt-3.5-turbo",
+            temperature=0.1,
+            max_tokens=1024,
+            frequency_penalty=0.1,
+            presence_penalty=0.1,
+            request_timeout=30,
+            streaming=True,
+            # Nhận usage ở chunk cuối để đếm token thật khi streaming; tag để metrics tách bước sinh câu trả lời
+            stream_usage=True,
+            tags=["answer"]
+        )
+
+        if CONTEXT_COMPRESSOR == "llm":
+            compressor = LLMChainExtractor.from_llm(self.llm)
+        else:
+            compressor = ExtractiveCompressor(token_budget=int(os.getenv("COMPRESSOR_TOKEN_BUDGET", "400")))
+
+        # Ghép context trong ngân sách token (đếm bằng tokenizer của model), bỏ đoạn gối đầu giữa
+        # các chunk liền kề cùng trang; dùng cho cả kết quả retrieval lẫn chunk lấy theo chỉ số bảng/biểu đồ
+        self.context_packer = ContextPacker(
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500")),
+            max_doc_tokens=int(os.getenv("CONTEXT_DOC_TOKENS", "600")),
+            count_tokens=openai_token_counter("gpt-3.5-turbo")
+        )
+
+        # Tạo retriever với contextual compression và số lượng documents ít hơn
+        if RETRIEVER_MODE == "vector":
+            self.lexical_index = None
+            search_fn = vector_search(self.vectorstore)
+        else:
+            self.lexical_index = LexicalIndex("./chroma_db")
+            search_fn = HybridRetriever(
+                vectorstore=self.vectorstore,
+                lexical_index=self.lexical_index,
+                k=3,
+                fetch_k=int(os.getenv("HYBRID_FETCH_K", "10"))
+            ).search
+
+        # Route được chọn cho từng request trong ask_policy_bot; chain không cần tạo lại
+        base_retriever = RoutedRetriever(search_fn=timed("retrieval", search_fn), fallback_k=3)
+
+        retriever = ContextualCompressionRetriever(
+            base_compressor=DocumentCompressorPipeline(transformers=[
+                TimedCompressor(base_compressor=compressor),
+                TimedCompressor(base_compressor=self.context_packer, stage_name="packing")
+            ]),
+            base_retriever=base_retriever,
+            max_documents=3  # Di chuyển max_documents vào đây
+        )
+
+        # Mỗi conversation_id có memory riêng, được loại bỏ theo LRU/TTL và nạp lại từ chat_history.db
+        self.memory_store = ConversationMemoryStore(
+            memory_factory=self.create_memory,
+            history_loader=get_chat_store().recent_messages,
+            max_conversations=int(os.getenv("MEMORY_MAX_CONVERSATIONS", "256")),
+            ttl_seconds=float(os.getenv("MEMORY_TTL_SECONDS", "1800")),
+            max_total_tokens=int(os.getenv("MEMORY_MAX_TOTAL_TOKENS", "200000"))
+        )
+
+        # Cache câu trả lời cho các câu hỏi độc lập (chưa có lịch sử chat); tự xóa khi process_pdf ghi dữ liệu mới
+        self.answer_cache = AnswerCache(
+            embed_fn=self.embedding.embed_query,
+            similarity_threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+            db_path=os.getenv("ANSWER_CACHE_DB") or None,
+            chroma_dir="./chroma_db"
+        ) if os.getenv("ANSWER_CACHE_ENABLED", "1") == "1" else None
+
+        # Tạo conversation chain dùng chung; lịch sử chat được truyền vào theo từng request
+        self.conversation_chain = ConversationalRetrievalChain.from_llm(
+            llm=self.answer_llm,
+            condense_question_llm=self.llm,
+            retriever=retriever,
+            combine_docs_chain_kwargs={
+                "prompt": QA_PROMPT,
+                "document_variable_name": "context"  # Chỉ định rõ tên biến
+            },
+            verbose=False,  # Tắt verbose để tăng tốc
+            return_source_documents=True,
+            return_generated_question=True
+        )
+
+        # Bảng tra cứu chunk theo chỉ số bảng/biểu đồ do process_pdf ghi
+        self.element_registry = ElementRegistry("./chroma_db")
+        # Bảng dạng có cấu trúc để tính toán số liệu trực tiếp
+        self.table_store = TableStore("./chroma_db")
+
+    # Khởi tạo memory với giới hạn token thấp hơn
+    def create_memory(self) -> ConversationSummaryBufferMemory:
+        return ConversationSummaryBufferMemory(
+            llm=self.llm,
+            memory_key="chat_history",
+            output_key="answer",
+            return_messages=True,
+            max_token_limit=1000  # Giảm giới hạn token
+        )
+
+    def preload_index(self) -> None:
+        """Nạp sẵn chỉ mục tìm kiếm vào bộ nhớ: HNSW của Chroma (tìm theo một vector có sẵn,
+        không gọi API embedding) và bản BM25 trong bộ nhớ của LexicalIndex"""
+        sample = self.vectorstore.get(limit=1, include=["embeddings"])
+        if sample["ids"]:
+            self.vectorstore.similarity_search_by_vector([float(value) for value in sample["embeddings"][0]], k=1)
+        if self.lexical_index is not None:
+            self.lexical_index.search("", k=1)
+
+_components: Optional[ChatbotComponents] = None
+_components_lock = threading.Lock()
+
+def get_components() -> ChatbotComponents:
+    """ChatbotComponents dùng chung trong process, tạo ở lần gọi đầu tiên.
+    Nếu khởi tạo lỗi (thiếu key, Chroma hỏng...), lần gọi sau sẽ thử tạo lại."""
+    global _components
+    if _components is None:
+        with _components_lock:
+            if _components is None:
+                _components = ChatbotComponents()
+    return _components
+
+def components_ready() -> bool:
+    return _components is not None
+
+def warm_up() -> Dict[str, float]:
+    """Tạo các thành phần và nạp sẵn chỉ mục để request đầu tiên không phải chờ;
+    trả về thời gian từng bước (ms)"""
+    start = time.perf_counter()
+    components = get_components()
+    loaded = time.perf_counter()
+    components.preload_index()
+    end = time.perf_counter()
+    return {
+        "components": round((loaded - start) * 1000, 1),
+        "index": round((end - loaded) * 1000, 1)
+    }
+
+def lookup_element_documents(table_num: int = None, chart_num: int = None) -> List[Document]:
+    """Lấy thẳng chunk của bảng/biểu đồ được hỏi theo chỉ số, không qua tìm kiếm tương đồng"""
+    components = get_components()
+    ids = []
+    if table_num is not None:
+        ids += components.element_registry.find('table', table_num)
+    if chart_num is not None:
+        ids += components.element_registry.find('chart', chart_num)
+    ids = ids[:ELEMENT_LOOKUP_MAX]
+    if not ids:
+        return []
+    found = components.vectorstore.get(ids=ids)
+    docs_by_id = {
+        chunk_id: Document(page_content=content, metadata=metadata or {})
+        for chunk_id, content, metadata in zip(found["ids"], found["documents"], found["metadatas"])
+    }
+    return [docs_by_id[chunk_id] for chunk_id in ids if chunk_id in docs_by_id]
+
+def discussed_table_source(question: str, table_num: int) -> str:
+    """Tài liệu chứa bảng được hỏi. Khi nhiều tài liệu cùng có bảng số này, chọn tài liệu có
+    chunk bảng đó gần câu hỏi nhất; None nếu không có bảng nào"""
+    components = get_components()
+    sources = {table.source for table in components.table_store.find(table_num)}
+    if len(sources) <= 1:
+        return next(iter(sources), None)
+    docs = components.vectorstore.similarity_search(
+        question, k=1, filter={"$and": [{"type": "table"}, {"table_index": table_num}]}
+    )
+    return docs[0].metadata.get('source') if docs else None
+
+def answer_from_documents(question: str, chat_history: list, docs: List[Document], callbacks: List[BaseCallbackHandler] = None) -> Dict[str, Any]:
+    """Sinh câu trả lời từ các document cho trước, cùng định dạng kết quả với conversation_chain"""
+    components = get_components()
+    conversation_chain = components.conversation_chain
+    get_chat_history = conversation_chain.get_chat_history or _get_chat_history
+    with stage("packing"):
+        packed_docs = components.context_packer.compress_documents(docs, question)
+    output = conversation_chain.combine_docs_chain.invoke(
+        {"input_documents": packed_docs, "question": question, "chat_history": get_chat_history(chat_history)},
+        config={"callbacks": callbacks} if callbacks else None
+    )
+    # source_documents giữ bản đầy đủ để trả bảng/ảnh cho client
+    return {"answer": output["output_text"], "source_documents": docs, "generated_question": question}
 
 def process_table_context(docs: List[Document]) -> str:
     """Xử lý context từ bảng để tạo mô tả chi tiết hơn"""
@@ -170,11 +363,33 @@ def process_formula_context(docs: List[Document]) -> str:
             formula_contexts.append(f"Công thức (trang {doc.metadata.get('page_number')}):\n{formula_data}")
     return "\n\n".join(formula_contexts)
 
-def ask_policy_bot(question: str) -> Dict[str, Any]:
+class TokenQueueHandler(BaseCallbackHandler):
+    """Đẩy các token do LLM streaming sinh ra vào một queue"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if token:
+            self.queue.put(token)
+
+def ask_policy_bot(question: str, conversation_id: str = None, callbacks: List[BaseCallbackHandler] = None) -> Dict[str, Any]:
     """
     Hàm xử lý câu hỏi và trả về câu trả lời cùng với metadata, bảng, công thức hoặc ảnh nếu có
     """
+    # Đo thời gian từng bước và token của request này (xem /metrics)
+    with trace_request() as trace:
+        callbacks = list(callbacks or []) + [LLMMetricsHandler(trace, LLM_STAGE_TAGS)]
+        return _ask_policy_bot(question, conversation_id, callbacks, trace)
+
+def _ask_policy_bot(question: str, conversation_id: str, callbacks: List[BaseCallbackHandler], trace) -> Dict[str, Any]:
+    path = "error"
     try:
+        # Lần hỏi đầu tiên (nếu chưa warm-up) tạo LLM, Chroma... tại đây; lỗi khởi tạo trả về như lỗi thường
+        components = get_components()
+        memory_store = components.memory_store
+        answer_cache = components.answer_cache
+
         is_table_question = 'bảng' in question.lower() or 'số liệu' in question.lower()
         is_chart_question = 'biểu đồ' in question.lower() or 'đồ thị' in question.lower() or 'ảnh' in question.lower() or 'image' in question.lower()
         is_formula_question = extract_formula(question)
@@ -184,25 +399,73 @@ def ask_policy_bot(question: str) -> Dict[str, Any]:
 
         if is_table_question:
             prompt = f"Phân tích bảng số liệu: {question}"
+            question_type = 'table'
         elif is_chart_question:
             prompt = f"Phân tích biểu đồ: {question}"
+            question_type = 'chart'
         elif is_formula_question:
             prompt = f"Phân tích công thức: {question}"
+            question_type = 'formula'
         else:
             prompt = question
-
-        response = conversation_chain.invoke(
-            {"question": prompt},
-            timeout=30
-        )
+            question_type = 'default'
+
+        with stage("memory"):
+            memory = memory_store.get(conversation_id)
+            chat_history = memory.load_memory_variables({})["chat_history"]
+
+        # Chỉ dùng cache khi câu hỏi không phụ thuộc vào lịch sử hội thoại
+        cache_lookup = None
+        if answer_cache is not None and not chat_history:
+            with stage("cache_lookup"):
+                cache_lookup = answer_cache.get(prompt)
+            if cache_lookup.result is not None:
+                cached = cache_lookup.result
+                memory_store.save_turn(conversation_id, memory, question, cached["answer"])
+                cached["metadata"]["cache"] = cache_lookup.kind
+                cached["metadata"]["timings_ms"] = trace.timings_ms()
+                path = "cache"
+                return cached
+
+        # Câu hỏi nêu rõ số bảng/biểu đồ: lấy chunk theo ID, bỏ qua tìm kiếm tương đồng
+        with stage("element_lookup"):
+            element_docs = lookup_element_documents(table_num, chart_num)
+        table_answer = None
+        if table_num is not None:
+            with stage("table_query"):
+                source = discussed_table_source(question, table_num)
+                table_answer = answer_table_question(components.table_store, question, table_num, source)
+            # Chỉ giữ bảng cùng số của tài liệu đang được hỏi
+            element_docs = [doc for doc in element_docs
+                            if source is None or doc.metadata.get('type') != 'table' or doc.metadata.get('source') == source]
+        if table_answer is not None:
+            # Thay bảng đầy đủ bằng kết quả truy vấn và các dòng liên quan
+            element_docs = [table_answer.document] + [doc for doc in element_docs if doc.metadata.get('type') != 'table']
+        if table_answer is not None and TABLE_QUERY_DIRECT and table_answer.direct:
+            response = {"answer": table_answer.text, "source_documents": element_docs, "generated_question": prompt}
+            path = "table_query"
+        elif element_docs:
+            response = answer_from_documents(prompt, chat_history, element_docs, callbacks)
+            path = "element"
+        else:
+            # Bước condense/generation được đo qua callback, retrieval/compression qua wrapper
+            with use_route(RETRIEVAL_ROUTES[question_type]):
+                response = components.conversation_chain.invoke(
+                    {"question": prompt, "chat_history": chat_history},
+                    config={"callbacks": callbacks},
+                    timeout=30
+                )
+            path = "rag"
         answer = response["answer"]
+        # Memory lưu câu hỏi gốc như chat store (history_loader nạp lại sau khi bị evict); tiền tố
+        # "Phân tích ..." chỉ dùng làm đầu vào của chain
+        memory_store.save_turn(conversation_id, memory, question, answer)
         source_docs = response.get("source_documents", [])
 
-        # Lấy usage nếu có
-        usage = response.get("usage", {})
-        prompt_tokens = usage.get("prompt_tokens", 0)
-        completion_tokens = usage.get("completion_tokens", 0)
-        total_tokens = usage.get("total_tokens", 0)
+        # Token thật của mọi lần gọi LLM trong request, do LLMMetricsHandler đếm
+        prompt_tokens = trace.prompt_tokens
+        completion_tokens = trace.completion_tokens
+        total_tokens = prompt_tokens + completion_tokens
 
         # Tìm bảng phù hợp nhất
         table_data = None
@@ -254,9 +517,15 @@ def ask_policy_bot(question: str) -> Dict[str, Any]:
                 "is_table_question": is_table_question,
                 "is_chart_question": is_chart_question,
                 "is_formula_question": is_formula_question,
-                "num_sources": len(source_docs)
+                "num_sources": len(source_docs),
+                "element_lookup": bool(element_docs),
+                "table_query": table_answer.op if table_answer is not None else None,
+                "retrieval_route": question_type,
+                "timings_ms": trace.timings_ms()
             }
         }
+        if cache_lookup is not None:
+            answer_cache.put(prompt, result, embedding=cache_lookup.embedding)
         return result
     except Exception as e:
         print(f"Error in ask_policy_bot: {str(e)}")
@@ -268,8 +537,67 @@ def ask_policy_bot(question: str) -> Dict[str, Any]:
             "sources": None,
             "metadata": {"error": str(e)}
         }
+    finally:
+        record_request(trace, path)
+
+_STREAM_END = object()
+
+def stream_policy_bot(question: str, conversation_id: str = None) -> Iterator[Dict[str, Any]]:
+    """
+    Phiên bản streaming của ask_policy_bot: sinh ra {"type": "token", "content": ...} cho từng token
+    của câu trả lời, sau cùng là {"type": "final", "result": ...} với cùng payload như ask_policy_bot.
+    Lỗi không được ask_policy_bot xử lý được raise lại ở phía đọc generator.
+    """
+    handler = TokenQueueHandler()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = ask_policy_bot(question, conversation_id=conversation_id, callbacks=[handler])
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            handler.queue.put(_STREAM_END)
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+
+    while True:
+        token = handler.queue.get()
+        if token is _STREAM_END:
+            break
+        yield {"type": "token", "content": token}
+
+    worker.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    yield {"type": "final", "result": outcome["result"]}
+
+def serve_worker() -> None:
+    """Chế độ worker sống lâu cho gateway Node (`python chatbot.py --worker`), xem JsonLinesWorker"""
+    from json_worker import JsonLinesWorker
+
+    def warm_up_worker() -> None:
+        # Trả chi phí tạo chain một lần trước khi báo ready; lỗi thì thử lại ở request đầu tiên
+        try:
+            print(f"Chatbot warm-up xong: {warm_up()}")
+        except Exception as e:
+            print(f"Chatbot warm-up lỗi: {str(e)}")
+
+    JsonLinesWorker({
+        "ask": lambda params, progress: ask_policy_bot(params["question"], conversation_id=params.get("conversation_id")),
+        "warmup": lambda params, progress: warm_up(),
+    }, on_start=warm_up_worker if os.getenv("CHATBOT_WARMUP", "1") == "1" else None).serve()
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["--worker"]:
+        serve_worker()
+        sys.exit(0)
+    if len(sys.argv) > 1:
+        # Một câu hỏi qua tham số dòng lệnh: in kết quả dạng JSON
+        print(json.dumps(ask_policy_bot(" ".join(sys.argv[1:])), ensure_ascii=False, default=str))
+        sys.exit(0)
+
     print("Policy Chatbot đang lắng nghe (gõ 'exit' để thoát):\n")
     while True:
         question = input("Bạn: ")
@@ -277,7 +605,7 @@ if __name__ == "__main__":
             print("Kết thúc hội thoại.")
             break
             
-        response = ask_policy_bot(question)
+        response = ask_policy_bot(question, conversation_id="cli")
         print("\nBot:", response["answer"])
         
         # In thêm thông tin nếu có
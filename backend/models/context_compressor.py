@@ -0,0 +1,281 @@
+import re
+import math
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Tách câu ở dấu kết thúc câu có khoảng trắng phía sau (không tách "730.000") hoặc xuống dòng
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+# Các loại document có cấu trúc theo dòng (bảng, biểu đồ, công thức do process_pdf sinh ra)
+_LINE_TYPES = ("table", "chart", "formula")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Phần gối đầu ngắn hơn ngưỡng này (ký tự) không được coi là trùng giữa hai chunk liền nhau
+MIN_OVERLAP_CHARS = 30
+
+
+def tokenize(text: str) -> List[str]:
+    """Tách từ đơn giản cho tiếng Việt/tiếng Anh: NFC, chữ thường, chuỗi ký tự chữ/số"""
+    return _TOKEN_RE.findall(unicodedata.normalize("NFC", text).lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """Ước lượng số token của model OpenAI (~4 ký tự một token)"""
+    return max(1, len(text) // 4)
+
+
+@lru_cache(maxsize=None)
+def openai_token_counter(model: str = "gpt-3.5-turbo") -> Callable[[str], int]:
+    """Hàm đếm token bằng tokenizer thật của model (tiktoken); nếu không nạp được encoding
+    (thiếu tiktoken, không tải được file BPE khi offline) thì dùng estimate_tokens"""
+    try:
+        import tiktoken
+        encoding = tiktoken.encoding_for_model(model)
+    except Exception as e:
+        print(f"Không nạp được tokenizer của {model}, ước lượng token theo số ký tự: {str(e)}")
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def split_spans(doc: Document) -> Tuple[List[str], List[str]]:
+    """Chia document thành (phần đầu luôn giữ, các span để chấm điểm).
+
+    Bảng: phần đầu là tiêu đề/mô tả/cột, mỗi dòng "Row k" là một span. Biểu đồ và
+    công thức: dòng đầu là phần đầu, mỗi dòng còn lại là một span. Văn bản: mỗi câu.
+    """
+    content = doc.page_content
+    doc_type = doc.metadata.get("type")
+    if doc_type in _LINE_TYPES:
+        lines = [line for line in content.split("\n") if line.strip()]
+        if doc_type == "table" and "Data:" in lines:
+            split_at = lines.index("Data:") + 1
+        else:
+            split_at = 1
+        return lines[:split_at], lines[split_at:]
+    return [], [span.strip() for span in _SENTENCE_SPLIT_RE.split(content) if span.strip()]
+
+
+def bm25_scores(query_terms: Sequence[str], spans: Sequence[Sequence[str]]) -> List[float]:
+    """Điểm BM25 của từng span với câu hỏi, IDF tính trên chính tập span được truy xuất"""
+    if not spans:
+        return []
+    n = len(spans)
+    avg_len = sum(len(span) for span in spans) / n or 1.0
+    df = Counter(term for span in spans for term in set(span))
+    query = set(query_terms)
+    scores = []
+    for span in spans:
+        tf = Counter(span)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(span) / avg_len)
+        score = 0.0
+        for term in query:
+            if term in tf:
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                score += idf * tf[term] * (BM25_K1 + 1) / (tf[term] + norm)
+        scores.append(score)
+    return scores
+
+
+class ExtractiveCompressor(BaseDocumentCompressor):
+    """Nén context cục bộ, thay cho LLMChainExtractor (một lần gọi LLM cho mỗi document).
+
+    Chấm điểm câu/dòng bảng theo BM25 với câu hỏi, giữ các span khớp có điểm cao nhất
+    trong giới hạn `token_budget` của mỗi document, theo thứ tự xuất hiện ban đầu.
+    Document không có span nào khớp bị bỏ, trừ khi không document nào khớp.
+    """
+
+    token_budget: int = 400
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+        query_terms = tokenize(query)
+        split = [split_spans(doc) for doc in documents]
+        span_tokens = [[tokenize(span) for span in spans] for _, spans in split]
+        # IDF trên toàn bộ span của các document để từ phổ biến trong tài liệu có trọng số thấp
+        flat_scores = bm25_scores(query_terms, [tokens for doc_spans in span_tokens for tokens in doc_spans])
+
+        scored = []
+        offset = 0
+        for doc, (head, spans) in zip(documents, split):
+            scores = flat_scores[offset:offset + len(spans)]
+            offset += len(spans)
+            scored.append((doc, head, spans, scores))
+
+        any_match = any(score > 0 for _, _, _, scores in scored for score in scores)
+        compressed = []
+        for doc, head, spans, scores in scored:
+            if any_match and spans and max(scores) <= 0:
+                continue
+            content = self._select(head, spans, scores)
+            compressed.append(Document(page_content=content, metadata=dict(doc.metadata)))
+        return compressed
+
+    def _select(self, head: List[str], spans: List[str], scores: List[float]) -> str:
+        budget = self.token_budget - sum(estimate_tokens(line) for line in head)
+        ranked = sorted(range(len(spans)), key=lambda i: scores[i], reverse=True)
+        keep = set()
+        for i in ranked:
+            # Luôn giữ ít nhất span tốt nhất, kể cả khi vượt ngân sách hoặc không khớp
+            if keep and scores[i] <= 0:
+                break
+            cost = estimate_tokens(spans[i])
+            if keep and cost > budget:
+                continue
+            keep.add(i)
+            budget -= cost
+            if budget <= 0:
+                break
+        selected = [spans[i] for i in sorted(keep)]
+        if head:
+            return "\n".join(head + selected)
+        return " ".join(selected)
+
+
+def _normalize_span(span: str) -> str:
+    return " ".join(tokenize(span))
+
+
+def overlap_length(first: str, second: str, min_chars: int = MIN_OVERLAP_CHARS) -> int:
+    """Độ dài phần cuối của `first` trùng với phần đầu của `second` (chunk_overlap của text splitter)"""
+    if len(first) < min_chars or len(second) < min_chars:
+        return 0
+    probe = second[:min_chars]
+    start = first.find(probe, max(0, len(first) - len(second)))
+    while start != -1:
+        # Lần xuất hiện sớm nhất khớp trọn đến cuối `first` là phần gối đầu dài nhất
+        if second.startswith(first[start:]):
+            return len(first) - start
+        start = first.find(probe, start + 1)
+    return 0
+
+
+class ContextPacker(BaseDocumentCompressor):
+    """Ghép context cho prompt trong một ngân sách token, đếm bằng tokenizer thật.
+
+    Đứng giữa retrieval/nén context và combine_docs_chain. Document được xét theo thứ tự
+    truy xuất: bỏ phần gối đầu với chunk liền kề cùng trang đã chọn (chunk_overlap) và các
+    câu đã có trong chunk cùng trang; document vượt `max_doc_tokens` hoặc phần ngân sách
+    còn lại được cắt còn các dòng bảng/câu khớp câu hỏi nhất. Tổng không quá `token_budget`.
+    """
+
+    token_budget: int = 1500
+    max_doc_tokens: int = 600
+    count_tokens: Callable[[str], int] = estimate_tokens
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        query_terms = tokenize(query)
+        packed: List[Document] = []
+        remaining = self.token_budget
+        for doc in documents:
+            if remaining <= 0:
+                break
+            content = self._dedupe(doc, packed)
+            if not content.strip():
+                continue
+            limit = min(self.max_doc_tokens, remaining)
+            cost = self.count_tokens(content)
+            if cost > limit:
+                content = self._fit(Document(page_content=content, metadata=doc.metadata), query_terms, limit)
+                if not content:
+                    continue
+                cost = self.count_tokens(content)
+            packed.append(Document(page_content=content, metadata=dict(doc.metadata)))
+            remaining -= cost
+        return packed
+
+    def _dedupe(self, doc: Document, packed: List[Document]) -> str:
+        """Bỏ phần văn bản đã có trong các chunk cùng trang đã chọn"""
+        content = doc.page_content
+        if doc.metadata.get("type") in _LINE_TYPES:
+            return content
+        page = _page_key(doc.metadata)
+        neighbours = [kept for kept in packed
+                      if kept.metadata.get("type") not in _LINE_TYPES and _page_key(kept.metadata) == page]
+        if page is None or not neighbours:
+            return content
+        index = doc.metadata.get("chunk_index")
+        if index is not None:
+            for kept in neighbours:
+                if kept.metadata.get("chunk_index") == index - 1:
+                    content = content[overlap_length(kept.page_content, content):]
+                elif kept.metadata.get("chunk_index") == index + 1:
+                    content = content[:len(content) - overlap_length(content, kept.page_content)]
+        seen = {_normalize_span(span) for kept in neighbours for span in _SENTENCE_SPLIT_RE.split(kept.page_content)}
+        spans = [span.strip() for span in _SENTENCE_SPLIT_RE.split(content) if span.strip()]
+        fresh = [span for span in spans if _normalize_span(span) not in seen]
+        if len(fresh) == len(spans):
+            return content
+        return " ".join(fresh)
+
+    def _fit(self, doc: Document, query_terms: List[str], limit: int) -> str:
+        """Cắt document còn phần đầu (tiêu đề/cột bảng) và các span khớp câu hỏi nhất trong `limit` token"""
+        head, spans = split_spans(doc)
+        budget = limit - sum(self.count_tokens(line) for line in head)
+        if budget <= 0:
+            return ""
+        span_tokens = [tokenize(span) for span in spans]
+        # Từ có trong mọi dòng (vd. "phòng" ở cột Phòng) không phân biệt được dòng nào khớp
+        common = set.intersection(*(set(tokens) for tokens in span_tokens)) if span_tokens else set()
+        scores = bm25_scores([term for term in query_terms if term not in common], span_tokens)
+        candidates = list(range(len(spans)))
+        if any(score > 0 for score in scores):
+            # Bảng lớn chỉ giữ các dòng khớp câu hỏi
+            candidates = [i for i in candidates if scores[i] > 0]
+            candidates.sort(key=lambda i: scores[i], reverse=True)
+        keep = []
+        for i in candidates:
+            cost = self.count_tokens(spans[i])
+            if cost <= budget:
+                keep.append(i)
+                budget -= cost
+        if not keep and candidates:
+            # Span tốt nhất dài hơn cả ngân sách: giữ phần đầu của nó
+            return "\n".join(head + [self._truncate(spans[candidates[0]], budget)])
+        content = self._join(head, [spans[i] for i in sorted(keep)])
+        # Tổng đếm từng span lệch với cả đoạn đã ghép: bỏ dần span xếp hạng thấp nhất cho vừa
+        while len(keep) > 1 and self.count_tokens(content) > limit:
+            keep.pop()
+            content = self._join(head, [spans[i] for i in sorted(keep)])
+        return content
+
+    @staticmethod
+    def _join(head: List[str], selected: List[str]) -> str:
+        if head:
+            return "\n".join(head + selected)
+        return " ".join(selected)
+
+    def _truncate(self, text: str, limit: int) -> str:
+        """Phần đầu dài nhất (theo từ) của `text` có không quá `limit` token"""
+        words = text.split()
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(" ".join(words[:middle])) <= limit:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low])
+
+
+def _page_key(metadata: Dict[str, Any]) -> Optional[Tuple[Any, Any]]:
+    if metadata.get("page_number") is None:
+        return None
+    return metadata.get("source"), metadata.get("page_number")
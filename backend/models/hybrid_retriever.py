@@ -0,0 +1,54 @@
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+def doc_key(doc: Document) -> str:
+    """Khóa ghép kết quả: chunk_id do process_pdf gán, hoặc nội dung với dữ liệu cũ chưa có ID"""
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[str]:
+    """Ghép nhiều danh sách đã xếp hạng: điểm = tổng 1 / (rrf_k + thứ hạng)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=lambda key: scores[key], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Kết hợp tìm kiếm vector (Chroma) và BM25 (LexicalIndex) bằng reciprocal rank fusion.
+
+    Mỗi nguồn lấy `fetch_k` ứng viên, trả về `k` document có điểm RRF cao nhất. Tìm
+    kiếm từ khóa bắt được số điều, "bảng 2", đơn vị... mà embedding hay bỏ sót.
+    """
+
+    vectorstore: Any
+    lexical_index: Any
+    k: int = 3
+    fetch_k: int = 10
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search(query, self.k)
+
+    def search(self, query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Tìm k document theo RRF, giới hạn trong các chunk có metadata khớp bộ lọc Chroma `where`"""
+        fetch_k = max(self.fetch_k, k)
+        vector_docs = self.vectorstore.similarity_search(query, k=fetch_k, filter=where)
+        lexical_hits = self.lexical_index.search(query, k=fetch_k, where=where)
+
+        docs_by_key = {doc_key(doc): doc for doc in vector_docs}
+        fused = reciprocal_rank_fusion(
+            [[doc_key(doc) for doc in vector_docs], [chunk_id for chunk_id, _ in lexical_hits]],
+            rrf_k=self.rrf_k
+        )[:k]
+
+        # Chỉ đọc nội dung cho các chunk chỉ có trong kết quả BM25
+        lexical_only = self.lexical_index.get([key for key in fused if key not in docs_by_key])
+        for chunk_id, (content, metadata) in lexical_only.items():
+            docs_by_key[chunk_id] = Document(page_content=content, metadata=metadata)
+        return [docs_by_key[key] for key in fused if key in docs_by_key]
@@ -0,0 +1,182 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class _MemoryEntry:
+    __slots__ = ("memory", "last_access", "tokens")
+
+    def __init__(self, memory: Any):
+        self.memory = memory
+        self.last_access = time.monotonic()
+        self.tokens = 0
+
+
+class ConversationMemoryStore:
+    """Registry memory theo conversation_id với chính sách LRU + TTL và giới hạn tổng số token.
+
+    Memory bị loại khỏi registry sẽ được nạp lại (lazy) qua `history_loader(conversation_id,
+    limit)` (vd. ChatStore.recent_messages, các cặp (nội dung, is_bot) cũ -> mới) khi cuộc
+    hội thoại quay lại, chỉ giữ những tin nhắn gần nhất vừa với `max_token_limit`
+    của memory để không phải gọi LLM tóm tắt lại.
+    """
+
+    def __init__(
+        self,
+        memory_factory: Callable[[], Any],
+        history_loader: Callable[[str, int], List[Tuple[str, bool]]],
+        max_conversations: int = 256,
+        ttl_seconds: float = 1800,
+        max_total_tokens: int = 200_000,
+        reload_messages: int = 20,
+    ):
+        self.memory_factory = memory_factory
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        self.max_total_tokens = max_total_tokens
+        self.reload_messages = reload_messages
+        self.history_loader = history_loader
+        self._entries: "OrderedDict[str, _MemoryEntry]" = OrderedDict()
+        self._total_tokens = 0
+        self._lock = threading.Lock()
+
+    def get(self, conversation_id: Optional[str]) -> Any:
+        """Trả về memory của cuộc hội thoại, tạo mới hoặc nạp lại từ DB nếu cần"""
+        if not conversation_id:
+            # Không có conversation_id: dùng memory tạm, không lưu vào registry
+            return self.memory_factory()
+
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                entry.last_access = time.monotonic()
+                self._entries.move_to_end(conversation_id)
+                return entry.memory
+
+        # Nạp lịch sử ngoài lock để không chặn các cuộc hội thoại khác
+        memory = self._load(conversation_id)
+
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                entry = _MemoryEntry(memory)
+                self._entries[conversation_id] = entry
+                self._set_tokens(entry, self._measure(memory))
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(conversation_id)
+            self._enforce_limits(keep=conversation_id)
+            return entry.memory
+
+    def save_turn(self, conversation_id: Optional[str], memory: Any, question: str, answer: str) -> None:
+        """Lưu một lượt hỏi-đáp vào memory và cập nhật kích thước trong registry"""
+        memory.save_context({"question": question}, {"answer": answer})
+        if not conversation_id:
+            return
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or entry.memory is not memory:
+                return
+            self._set_tokens(entry, self._measure(memory))
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(conversation_id)
+            self._enforce_limits(keep=conversation_id)
+
+    def evict(self, conversation_id: str) -> None:
+        with self._lock:
+            self._remove(conversation_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_tokens = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "conversations": len(self._entries),
+                "total_tokens": self._total_tokens,
+                "max_conversations": self.max_conversations,
+                "max_total_tokens": self.max_total_tokens,
+            }
+
+    def _load(self, conversation_id: str) -> Any:
+        memory = self.memory_factory()
+        history = self.history_loader(conversation_id, self.reload_messages)
+        if not history:
+            return memory
+
+        # Chỉ giữ các tin nhắn mới nhất vừa với giới hạn token của memory
+        limit = getattr(memory, "max_token_limit", None)
+        kept: List[Tuple[str, bool]] = []
+        used = 0
+        for content, is_bot in reversed(history):
+            tokens = self._count_tokens(memory, content)
+            if limit is not None and kept and used + tokens > limit:
+                break
+            kept.append((content, is_bot))
+            used += tokens
+
+        for content, is_bot in reversed(kept):
+            if is_bot:
+                memory.chat_memory.add_ai_message(content)
+            else:
+                memory.chat_memory.add_user_message(content)
+        return memory
+
+    def _count_tokens(self, memory: Any, text: str) -> int:
+        llm = getattr(memory, "llm", None)
+        if llm is not None:
+            try:
+                return llm.get_num_tokens(text)
+            except Exception:
+                pass
+        return len(text) // 4 + 1
+
+    def _measure(self, memory: Any) -> int:
+        """Ước lượng số token memory đang giữ (tin nhắn + phần tóm tắt)"""
+        messages = memory.chat_memory.messages
+        summary = getattr(memory, "moving_summary_buffer", "") or ""
+        llm = getattr(memory, "llm", None)
+        if llm is not None:
+            try:
+                tokens = llm.get_num_tokens_from_messages(messages) if messages else 0
+                return tokens + (llm.get_num_tokens(summary) if summary else 0)
+            except Exception:
+                pass
+        return sum(len(m.content) // 4 + 1 for m in messages) + len(summary) // 4
+
+    def _set_tokens(self, entry: _MemoryEntry, tokens: int) -> None:
+        self._total_tokens += tokens - entry.tokens
+        entry.tokens = tokens
+
+    def _remove(self, conversation_id: str) -> None:
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self._total_tokens -= entry.tokens
+
+    def _evict_expired(self) -> None:
+        if self.ttl_seconds is None:
+            return
+        deadline = time.monotonic() - self.ttl_seconds
+        # OrderedDict theo thứ tự truy cập nên các entry hết hạn nằm ở đầu
+        while self._entries:
+            conversation_id, entry = next(iter(self._entries.items()))
+            if entry.last_access >= deadline:
+                break
+            self._remove(conversation_id)
+
+    def _enforce_limits(self, keep: Optional[str] = None) -> None:
+        self._evict_expired()
+        while self._entries and (
+            len(self._entries) > self.max_conversations or self._total_tokens > self.max_total_tokens
+        ):
+            conversation_id = next(iter(self._entries))
+            if conversation_id == keep:
+                # Không loại memory đang được dùng cho request hiện tại
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(conversation_id)
+                continue
+            self._remove(conversation_id)
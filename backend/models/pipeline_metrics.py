@@ -0,0 +1,256 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler, Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.outputs import LLMResult
+
+# Biên các bucket thời gian (giây), đủ chi tiết cho cả bước vài ms lẫn lần gọi LLM vài giây
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """Histogram Prometheus có nhãn: mỗi bộ nhãn giữ số đếm từng bucket, tổng và số lần đo"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Vị trí cuối của series là sum, kế cuối là bucket +Inf
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.setdefault(tuple(labels), [0.0] * (len(self.buckets) + 2))
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.label_names, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {_format_value(cumulative)}")
+        return lines
+
+
+class Counter:
+    """Counter Prometheus có nhãn"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *labels: str) -> None:
+        with self._lock:
+            self._series[tuple(labels)] = self._series.get(tuple(labels), 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for labels, value in sorted(series.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "chatbot_stage_seconds",
+    "Thời gian từng bước của pipeline chat (condense, retrieval, compression, packing, generation, persist...)",
+    ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "chatbot_request_seconds",
+    "Tổng thời gian ask_policy_bot theo nhánh xử lý (cache, table_query, element, rag)",
+    ["path"]
+)
+LLM_TOKENS = Counter(
+    "chatbot_llm_tokens_total",
+    "Số token prompt/completion do OpenAI báo về, theo bước gọi LLM",
+    ["stage", "kind"]
+)
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, LLM_TOKENS]
+
+
+def render_metrics() -> str:
+    """Toàn bộ metric ở định dạng text của Prometheus (cho endpoint /metrics)"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    """Thời gian từng bước và số token của một request; `stage` là bước đang chạy"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.stage: Optional[str] = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def timings_ms(self) -> Dict[str, float]:
+        return {stage: round(seconds * 1000, 1) for stage, seconds in self.stages.items()}
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_request() -> Iterator[RequestTrace]:
+    """Gom các bước đo trong khối with (cùng thread) vào một RequestTrace"""
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record_request(trace: RequestTrace, path: str) -> None:
+    REQUEST_SECONDS.observe(time.perf_counter() - trace.started, path)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Đo một bước: ghi vào histogram và vào trace của request hiện tại (nếu có)"""
+    trace = current_trace()
+    outer = trace.stage if trace is not None else None
+    if trace is not None:
+        trace.stage = name
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        if trace is not None:
+            trace.add(name, elapsed)
+            trace.stage = outer
+
+
+def timed(name: str, fn: Callable) -> Callable:
+    """Bọc hàm để mỗi lần gọi được đo như một bước `name`"""
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+class TimedCompressor(BaseDocumentCompressor):
+    """Bọc compressor của ContextualCompressionRetriever để đo bước nén context (hoặc bước `stage_name`)"""
+
+    base_compressor: Any
+    stage_name: str = "compression"
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        with stage(self.stage_name):
+            return self.base_compressor.compress_documents(documents, query, callbacks=callbacks)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Đo thời gian và token của từng lần gọi LLM trong một request.
+
+    Bước được xác định theo tag của model (`stage_tags`, vd. {"answer": "generation"}); lần
+    gọi không có tag khớp được tính là `default_stage`. Lần gọi LLM nằm trong một bước đang
+    đo (vd. nén context bằng LLM) chỉ được cộng token, thời gian đã thuộc về bước đó.
+    """
+
+    def __init__(self, trace: Optional[RequestTrace], stage_tags: Dict[str, str], default_stage: str = "condense"):
+        self.trace = trace
+        self.stage_tags = stage_tags
+        self.default_stage = default_stage
+        self._runs: Dict[UUID, Tuple[str, float, bool]] = {}
+
+    def _start(self, run_id: UUID, tags: Optional[List[str]]) -> None:
+        name = next((self.stage_tags[tag] for tag in tags or [] if tag in self.stage_tags), self.default_stage)
+        nested = self.trace is not None and self.trace.stage is not None
+        if nested:
+            name = self.trace.stage
+        self._runs[run_id] = (name, time.perf_counter(), nested)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     tags: Optional[List[str]] = None, **kwargs: Any) -> None:
+        self._start(run_id, tags)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            tags: Optional[List[str]] = None, **kwargs: Any) -> None:
+        self._start(run_id, tags)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        name, start, nested = self._runs.pop(run_id, (self.default_stage, time.perf_counter(), True))
+        if not nested:
+            elapsed = time.perf_counter() - start
+            STAGE_SECONDS.observe(elapsed, name)
+            if self.trace is not None:
+                self.trace.add(name, elapsed)
+        prompt_tokens, completion_tokens = llm_token_usage(response)
+        LLM_TOKENS.inc(prompt_tokens, name, "prompt")
+        LLM_TOKENS.inc(completion_tokens, name, "completion")
+        if self.trace is not None:
+            self.trace.prompt_tokens += prompt_tokens
+            self.trace.completion_tokens += completion_tokens
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._runs.pop(run_id, None)
+
+
+def llm_token_usage(response: LLMResult) -> Tuple[int, int]:
+    """(prompt, completion) token của một lần gọi: usage_metadata của message (có cả khi
+    streaming với stream_usage=True), nếu không có thì token_usage trong llm_output"""
+    prompt_tokens = completion_tokens = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                found = True
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    if not found:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
@@ -0,0 +1,59 @@
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+
+@dataclass(frozen=True)
+class Route:
+    """Cách truy xuất cho một loại câu hỏi: bộ lọc Chroma `where` trên metadata và số document"""
+    name: str
+    where: Optional[Dict[str, Any]] = None
+    k: int = 3
+
+
+DEFAULT_ROUTE = Route("default")
+
+# Route của request hiện tại; mỗi thread/request có giá trị riêng nên chain dùng chung vẫn an toàn
+_active_route: contextvars.ContextVar = contextvars.ContextVar("retrieval_route", default=None)
+
+
+@contextmanager
+def use_route(route: Route) -> Iterator[Route]:
+    """Áp dụng `route` cho mọi lần truy xuất trong khối with (trong thread hiện tại)"""
+    token = _active_route.set(route)
+    try:
+        yield route
+    finally:
+        _active_route.reset(token)
+
+
+def vector_search(vectorstore) -> Callable[[str, int, Optional[Dict[str, Any]]], List[Document]]:
+    """Hàm tìm kiếm chỉ dùng similarity của Chroma, cùng chữ ký với HybridRetriever.search"""
+    def search(query: str, k: int, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return vectorstore.similarity_search(query, k=k, filter=where)
+    return search
+
+
+class RoutedRetriever(BaseRetriever):
+    """Retriever định tuyến theo từng request: lọc theo metadata `type` và k riêng cho mỗi loại.
+
+    Route lấy từ `use_route(...)` nếu đang được đặt, nếu không thì từ `router(query)`.
+    Khi bộ lọc không trả về document nào, tìm lại không lọc với `fallback_k`.
+    `search_fn(query, k, where)` là backend tìm kiếm (vector hoặc lai BM25 + vector).
+    """
+
+    search_fn: Callable[[str, int, Optional[Dict[str, Any]]], List[Document]]
+    router: Callable[[str], Route] = lambda query: DEFAULT_ROUTE
+    fallback_k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        route = _active_route.get() or self.router(query)
+        docs = self.search_fn(query, route.k, route.where)
+        if not docs and route.where:
+            docs = self.search_fn(query, self.fallback_k, None)
+        return docs
@@ -0,0 +1,193 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+
+from langchain.schema import Document
+from table_store import TableStore, StoredTable, parse_number
+
+# Từ khóa nhận diện phép tính, xét theo thứ tự (cụm dài trước để "tổng số dòng" là đếm).
+# "tổng"/"cộng" đứng một mình không đủ ("tổng quan", "cộng đồng"): chỉ tính là tổng khi đứng
+# ngay trước tên cột (xem _SUM_PREFIX)
+_OPERATIONS = [
+    ('count', ['số dòng', 'bao nhiêu dòng', 'đếm', 'count', 'how many']),
+    ('compare', ['so sánh', 'chênh lệch', 'compare', 'difference']),
+    ('avg', ['trung bình', 'bình quân', 'average', 'mean']),
+    ('sum', ['tổng cộng', 'tổng số', 'tính tổng', 'cộng lại', 'sum', 'total']),
+    ('max', ['lớn nhất', 'cao nhất', 'nhiều nhất', 'tối đa', 'max', 'highest', 'largest']),
+    ('min', ['nhỏ nhất', 'thấp nhất', 'ít nhất', 'tối thiểu', 'min', 'lowest', 'smallest']),
+]
+_OP_LABELS = {
+    'sum': 'tổng',
+    'avg': 'trung bình',
+    'max': 'lớn nhất',
+    'min': 'nhỏ nhất',
+    'count': 'số dòng',
+}
+# Số dòng tối đa được quét để khớp nhãn dòng trong câu hỏi và đưa vào context
+MAX_SCAN_ROWS = 2000
+MAX_CONTEXT_ROWS = 20
+_SUM_PREFIX = "tổng"
+# Phép tính có thể trả thẳng kết quả mà không cần LLM (khi đã khớp được cột)
+DIRECT_OPERATIONS = ('sum', 'avg', 'max', 'min', 'count', 'compare')
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", str(text)).lower()).strip()
+
+
+def format_number(value: float) -> str:
+    """Định dạng số kiểu Việt Nam: 1.234.567 hoặc 1.234,56"""
+    if float(value).is_integer():
+        return f"{int(value):,}".replace(",", ".")
+    return f"{value:,.2f}".replace(",", "\0").replace(".", ",").replace("\0", ".")
+
+
+@dataclass
+class TableAnswer:
+    table: StoredTable
+    op: str  # sum/avg/min/max/count/compare/lookup
+    text: str
+    column: Optional[str] = None
+    value: Optional[float] = None
+    rows: List[Tuple[int, List[Optional[str]]]] = field(default_factory=list)
+
+    @property
+    def direct(self) -> bool:
+        """Đủ chắc để trả lời không qua LLM: có từ khóa phép tính và khớp được một cột"""
+        return self.op in DIRECT_OPERATIONS and self.column is not None
+
+    @property
+    def document(self) -> Document:
+        """Context rút gọn thay cho toàn bộ bảng: kết quả tính và các dòng liên quan"""
+        lines = [f"Table {self.table.table_index}:"]
+        if self.table.title:
+            lines.append(f"Title: {self.table.title}")
+        lines.append("Columns: " + ", ".join(self.table.columns))
+        lines.append(f"Kết quả truy vấn: {self.text}")
+        if self.rows:
+            lines.append("Data:")
+            for row_number, values in self.rows[:MAX_CONTEXT_ROWS]:
+                cells = " | ".join(f"{col}={val}" for col, val in zip(self.table.columns, values))
+                lines.append(f"Row {row_number}: {cells}")
+        return Document(
+            page_content="\n".join(lines),
+            metadata={
+                'type': 'table',
+                'table_index': self.table.table_index,
+                'page_number': self.table.page_number,
+                'chunk_id': self.table.chunk_id,
+                'source': self.table.source,
+                'table_query': self.op,
+            }
+        )
+
+
+def detect_operation(question: str) -> Optional[str]:
+    text = _normalize(question)
+    for op, keywords in _OPERATIONS:
+        if any(re.search(rf"(?<!\w){re.escape(keyword)}(?!\w)", text) for keyword in keywords):
+            return op
+    return None
+
+
+def match_column(question: str, columns: List[str], numeric: Optional[Set[int]] = None) -> Optional[int]:
+    """Cột có tên xuất hiện trong câu hỏi: ưu tiên cột số (nếu có `numeric`), rồi tên dài nhất"""
+    text = _normalize(question)
+    best, best_key = None, None
+    for i, name in enumerate(columns):
+        name = _normalize(name)
+        if name.startswith("unnamed") or len(name) < 2:
+            continue
+        if re.search(rf"(?<!\w){re.escape(name)}(?!\w)", text):
+            key = (numeric is not None and i in numeric, len(name))
+            if best_key is None or key > best_key:
+                best, best_key = i, key
+    return best
+
+
+def match_rows(question: str, rows: List[Tuple[int, List[Optional[str]]]]) -> List[Tuple[int, List[Optional[str]]]]:
+    """Các dòng có một ô chữ (nhãn dòng) được nhắc tới nguyên văn trong câu hỏi"""
+    text = _normalize(question)
+    matched = []
+    for row_number, values in rows:
+        for value in values:
+            label = _normalize(value) if value else ""
+            if len(label) >= 2 and not re.fullmatch(r"[\d.,%\s-]+", label) and re.search(rf"(?<!\w){re.escape(label)}(?!\w)", text):
+                matched.append((row_number, values))
+                break
+    return matched
+
+
+def answer_table_question(store: TableStore, question: str, table_index: int,
+                          source: Optional[str] = None) -> Optional[TableAnswer]:
+    """Trả lời câu hỏi số liệu về một bảng bằng truy vấn trực tiếp trên bảng đã lưu.
+
+    Hỗ trợ tra cứu ô (dòng + cột), lọc theo nhãn dòng, tổng/trung bình/lớn nhất/nhỏ nhất/
+    đếm trên một cột và so sánh các dòng. Trả về None khi không hiểu được câu hỏi, để
+    chatbot dùng luồng LLM thông thường. `source` giới hạn ở tài liệu đang được hỏi; nếu
+    không có mà nhiều tài liệu cùng có bảng số này thì không đoán, trả về None.
+    """
+    tables = store.find(table_index, source)
+    if not tables or len({table.source for table in tables}) > 1:
+        return None
+    table = tables[0]
+    label = f"Bảng {table.table_index} (trang {table.page_number})"
+    op = detect_operation(question)
+    if op is None:
+        column = match_column(question, table.columns)
+        if column is not None and re.search(
+                rf"(?<!\w){_SUM_PREFIX}\s+{re.escape(_normalize(table.columns[column]))}(?!\w)", _normalize(question)):
+            op = 'sum'
+    numeric = store.numeric_columns(table) if op in ('sum', 'avg', 'max', 'min', 'compare') else None
+    column = match_column(question, table.columns, numeric)
+    rows = match_rows(question, store.rows(table, limit=MAX_SCAN_ROWS))
+    column_name = table.columns[column] if column is not None else None
+
+    if op == 'count':
+        count = len(rows) if rows else len(store.rows(table, limit=MAX_SCAN_ROWS))
+        return TableAnswer(table, op, f"{label} có {count} dòng{' khớp' if rows else ''}.", value=count, rows=rows)
+
+    if column is None:
+        return None
+
+    if op == 'compare' and len(rows) >= 2:
+        parts = [f"dòng {row_number}: {values[column]}" for row_number, values in rows]
+        text = f"{label}, cột '{column_name}': " + "; ".join(parts)
+        numeric = [parse_number(values[column]) for _, values in rows]
+        numeric = [value for value in numeric if value is not None]
+        if len(numeric) == 2:
+            text += f". Chênh lệch: {format_number(abs(numeric[0] - numeric[1]))}"
+        return TableAnswer(table, op, text + ".", column=column_name, rows=rows)
+
+    if op in ('max', 'min') and not rows:
+        extreme = store.extreme_row(table, column, highest=(op == 'max'))
+        if extreme is None:
+            return None
+        row_number, values = extreme
+        # Cột đầu tiên thường là nhãn dòng (tên phòng ban, hạng mục...)
+        row_label = f"dòng {row_number}" + (f", {table.columns[0]}={values[0]}" if column != 0 and values[0] else "")
+        return TableAnswer(
+            table, op,
+            f"{label}: giá trị {_OP_LABELS[op]} của cột '{column_name}' là {values[column]} ({row_label}).",
+            column=column_name, value=parse_number(values[column]), rows=[extreme]
+        )
+
+    if op in ('sum', 'avg', 'max', 'min'):
+        # Lọc theo nhãn dòng nếu câu hỏi nhắc tới dòng cụ thể
+        row_numbers = [row_number for row_number, _ in rows] or None
+        value, used = store.aggregate(table, op, column, row_numbers=row_numbers)
+        if value is None:
+            return None
+        scope = f" trên {used} dòng khớp" if rows else f" trên {used} dòng"
+        return TableAnswer(
+            table, op,
+            f"{label}: {_OP_LABELS[op]} cột '{column_name}'{scope} là {format_number(value)}.",
+            column=column_name, value=value, rows=rows
+        )
+
+    if rows:
+        parts = [f"dòng {row_number}: {values[column]}" for row_number, values in rows]
+        return TableAnswer(table, 'lookup', f"{label}, cột '{column_name}': " + "; ".join(parts) + ".",
+                           column=column_name, rows=rows)
+    return None
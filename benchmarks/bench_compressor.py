@@ -0,0 +1,112 @@
+"""So sánh độ trễ nén context: ExtractiveCompressor cục bộ và LLMChainExtractor.
+
+Dùng các document tổng hợp theo đúng định dạng process_pdf sinh ra (văn bản, bảng,
+biểu đồ, công thức), mỗi câu hỏi nén 3 document như retriever của chatbot.
+LLMChainExtractor chỉ được đo khi có --llm và OPENAI_API_KEY.
+
+    python benchmarks/bench_compressor.py --queries 200
+    python benchmarks/bench_compressor.py --queries 5 --llm
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from typing import List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "models"))
+
+from langchain_core.documents import Document
+from context_compressor import ExtractiveCompressor, estimate_tokens
+
+_SENTENCES = [
+    "Người lao động được nghỉ phép năm 12 ngày làm việc theo Điều 113 của Bộ luật Lao động.",
+    "Mức phụ cấp ăn trưa là 730.000 đồng mỗi tháng cho nhân viên chính thức.",
+    "Thời gian thử việc không quá 60 ngày đối với chức danh cần trình độ cao đẳng.",
+    "Người sử dụng lao động phải thông báo trước ít nhất 45 ngày khi chấm dứt hợp đồng.",
+    "Nhân viên làm thêm giờ vào ngày nghỉ hằng tuần được trả ít nhất 200% tiền lương.",
+    "Khoảng cách an toàn tối thiểu 2 m, tải trọng tối đa 50 kg cho mỗi người.",
+    "Chế độ thai sản được hưởng 6 tháng theo quy định của Luật Bảo hiểm xã hội.",
+    "Công ty đóng bảo hiểm y tế 3% và người lao động đóng 1,5% tiền lương tháng.",
+]
+
+_QUERIES = [
+    "Người lao động được nghỉ phép năm bao nhiêu ngày?",
+    "Phân tích bảng số liệu: bảng 2 cho biết phụ cấp phòng Kế toán là bao nhiêu?",
+    "Thời gian thử việc tối đa là bao lâu?",
+    "Phân tích biểu đồ: xu hướng doanh thu theo quý?",
+    "Tỷ lệ đóng bảo hiểm y tế của người lao động?",
+]
+
+
+def make_documents(rng: random.Random) -> List[Document]:
+    text = " ".join(rng.choice(_SENTENCES) for _ in range(30))
+    rows = "\n".join(
+        f"Row {i}: Phòng={rng.choice(['Kế toán', 'Nhân sự', 'Kỹ thuật', 'Kinh doanh'])} | "
+        f"Lương={rng.randint(8, 40)} triệu | Phụ cấp={rng.randint(1, 5)} triệu"
+        for i in range(1, 41)
+    )
+    table = (
+        "Table 2:\nTitle: Lương và phụ cấp theo phòng ban\nColumns:\n- Phòng: \n- Lương: \n- Phụ cấp: \n\n"
+        f"Data:\n{rows}\n"
+    )
+    chart = (
+        "Chart 1:\nTitle: Doanh thu theo quý\nType: bar\nDescription: Doanh thu tăng đều qua các quý\n"
+        "Key Data Points:\n- Q1: 120\n- Q2: 135\n- Q3: 150\n- Q4: 171\n"
+        "Trends:\n- Doanh thu tăng 12% mỗi quý\nPosition: [10, 20, 300, 200]"
+    )
+    return [
+        Document(page_content=text, metadata={"type": "text", "page_number": 3}),
+        Document(page_content=table, metadata={"type": "table", "page_number": 5, "table_index": 2}),
+        Document(page_content=chart, metadata={"type": "chart", "page_number": 7, "chart_index": 1}),
+    ]
+
+
+def _measure(compressor, batches, queries) -> List[float]:
+    timings = []
+    for docs, query in zip(batches, queries):
+        start = time.perf_counter()
+        compressor.compress_documents(docs, query)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _report(name: str, timings: List[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{name:<11} p50 {statistics.median(timings) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=400)
+    parser.add_argument("--llm", action="store_true", help="đo thêm LLMChainExtractor (gọi OpenAI)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    batches = [make_documents(rng) for _ in range(args.queries)]
+    queries = [rng.choice(_QUERIES) for _ in range(args.queries)]
+
+    extractive = ExtractiveCompressor(token_budget=args.budget)
+    before = sum(estimate_tokens(doc.page_content) for docs in batches for doc in docs)
+    after = sum(
+        estimate_tokens(doc.page_content)
+        for docs, query in zip(batches, queries)
+        for doc in extractive.compress_documents(docs, query)
+    )
+    print(f"{args.queries} câu hỏi x 3 document, context ~{before // args.queries} -> ~{after // args.queries} token/câu hỏi")
+    _report("extractive", _measure(extractive, batches, queries))
+
+    if args.llm:
+        if not os.getenv("OPENAI_API_KEY"):
+            raise SystemExit("Cần OPENAI_API_KEY để đo LLMChainExtractor")
+        from langchain_openai import ChatOpenAI
+        from langchain.retrievers.document_compressors import LLMChainExtractor
+        llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.1, max_tokens=1024, request_timeout=30)
+        _report("llm", _measure(LLMChainExtractor.from_llm(llm), batches, queries))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Micro-benchmark cho extract_formulas_from_text trên một tập trang tổng hợp.
+
+So sánh bộ quét đã biên dịch với bản cũ (~20 lượt re.finditer, regex đơn vị dựng lại
+cho mỗi match, ~60 lần str.replace), kiểm tra kết quả giống hệt nhau rồi in thời gian.
+
+    python benchmarks/bench_formulas.py --pages 200 --repeat 3
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from typing import List
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "ProcessData"))
+
+import extract_text
+from extract_text import DocumentElement, extract_formulas_from_text
+
+def legacy_extract_formulas_from_text(text: str, page_num: int) -> List[DocumentElement]:
+    """Bản cũ của extract_formulas_from_text, giữ nguyên để so sánh kết quả và tốc độ"""
+    formulas = []
+    
+    # Enhanced patterns for mathematical expressions
+    patterns = [
+        # LaTeX style formulas
+        r'\$([^$]+)\$',  # Inline math
+        r'\$\$([^$]+)\$\$',  # Display math
+        # Equations and expressions
+        r'([a-zA-Z][a-zA-Z0-9]*\s*=\s*[^=]+)',  # Equations with variables
+        r'([a-zA-Z][a-zA-Z0-9]*\s*\([^)]+\)\s*=\s*[^=]+)',  # Function definitions
+        r'([a-zA-Z][a-zA-Z0-9]*\s*\([^)]+\)\s*[+\-*/]\s*[^=]+)',  # Function expressions
+        # Fractions and ratios
+        r'(\d+/\d+)',  # Simple fractions
+        r'([a-zA-Z0-9]+\s*/\s*[a-zA-Z0-9]+)',  # Fractions with variables
+        # Square roots and radicals
+        r'√\s*\(([^)]+)\)',  # Square root
+        r'sqrt\s*\(([^)]+)\)',  # Square root (alternative notation)
+        # Powers and exponents
+        r'([a-zA-Z0-9]+\s*\^\s*[a-zA-Z0-9]+)',  # Power with ^
+        r'([a-zA-Z0-9]+\s*\*\*\s*[a-zA-Z0-9]+)',  # Power with **
+        # Subscripts
+        r'([a-zA-Z0-9]+\s*_\s*[a-zA-Z0-9]+)',  # Subscript
+        # Summations and products
+        r'(∑|∏)\s*([^∑∏]+)',  # Summation or product
+        # Integrals
+        r'∫\s*([^∫]+)',  # Integral
+        # Greek letters and special symbols
+        r'([α-ωΑ-Ω][a-zA-Z0-9]*)',  # Greek letters
+        # Matrices
+        r'\[([^\[\]]+)\]',  # Matrix notation
+        # Inequalities
+        r'([a-zA-Z0-9]+\s*[<>≤≥]\s*[a-zA-Z0-9]+)',  # Inequalities
+        # Percentages
+        r'(\d+%)',  # Percentages
+        # Units and measurements
+        r'(\d+\s*(?:m|kg|s|A|K|mol|cd|Hz|N|Pa|J|W|C|V|Ω|F|H|T|Wb|lm|lx|Bq|Gy|Sv|kat|L|t|ha|eV|u|Da|bar|atm|mmHg|Torr|psi|cal|kcal|Wh|kWh|dB|ppm|ppb|ppt|mol/L|g/L|mg/L|μg/L|ng/L|pg/L|mol/m³|g/m³|mg/m³|μg/m³|ng/m³|pg/m³|mol/kg|g/kg|mg/kg|μg/kg|ng/kg|pg/kg|mol/mol|g/g|mg/g|μg/g|ng/g|pg/g|mol/m²|g/m²|mg/m²|μg/m²|ng/m²|pg/m²|mol/s|g/s|mg/s|μg/s|ng/s|pg/s|mol/min|g/min|mg/min|μg/min|ng/min|pg/min|mol/h|g/h|mg/h|μg/h|ng/h|pg/h|mol/d|g/d|mg/d|μg/d|ng/d|pg/d|mol/wk|g/wk|mg/wk|μg/wk|ng/wk|pg/wk|mol/mo|g/mo|mg/mo|μg/mo|ng/mo|pg/mo|mol/yr|g/yr|mg/yr|μg/yr|ng/yr|pg/yr))',  # Units
+    ]
+    
+    for pattern in patterns:
+        matches = re.finditer(pattern, text)
+        for match in matches:
+            formula = match.group(1).strip()
+            # Get context (text before and after the formula)
+            start = max(0, match.start() - 150)  # Increased context window
+            end = min(len(text), match.end() + 150)
+            context = text[start:end]
+            
+            # Enhanced formula type identification
+            formula_type = "unknown"
+            if "=" in formula:
+                formula_type = "equation"
+            elif "/" in formula:
+                formula_type = "fraction"
+            elif "^" in formula or "**" in formula:
+                formula_type = "power"
+            elif "_" in formula:
+                formula_type = "subscript"
+            elif "√" in formula or "sqrt" in formula:
+                formula_type = "square_root"
+            elif "∑" in formula or "∏" in formula:
+                formula_type = "summation_or_product"
+            elif "∫" in formula:
+                formula_type = "integral"
+            elif any(greek in formula for greek in "αβγδεζηθικλμνξοπρστυφχψως"):
+                formula_type = "greek_notation"
+            elif "[" in formula and "]" in formula:
+                formula_type = "matrix"
+            elif any(op in formula for op in "<>≤≥"):
+                formula_type = "inequality"
+            elif "%" in formula:
+                formula_type = "percentage"
+            elif re.search(r'\d+\s*(?:m|kg|s|A|K|mol|cd|Hz|N|Pa|J|W|C|V|Ω|F|H|T|Wb|lm|lx|Bq|Gy|Sv|kat|L|t|ha|eV|u|Da|bar|atm|mmHg|Torr|psi|cal|kcal|Wh|kWh|dB|ppm|ppb|ppt|mol/L|g/L|mg/L|μg/L|ng/L|pg/L|mol/m³|g/m³|mg/m³|μg/m³|ng/m³|pg/m³|mol/kg|g/kg|mg/kg|μg/kg|ng/kg|pg/kg|mol/mol|g/g|mg/g|μg/g|ng/g|pg/g|mol/m²|g/m²|mg/m²|μg/m²|ng/m²|pg/m²|mol/s|g/s|mg/s|μg/s|ng/s|pg/s|mol/min|g/min|mg/min|μg/min|ng/min|pg/min|mol/h|g/h|mg/h|μg/h|ng/h|pg/h|mol/d|g/d|mg/d|μg/d|ng/d|pg/d|mol/wk|g/wk|mg/wk|μg/wk|ng/wk|pg/wk|mol/mo|g/mo|mg/mo|μg/mo|ng/mo|pg/mo|mol/yr|g/yr|mg/yr|μg/yr|ng/yr|pg/yr)', formula):
+                formula_type = "measurement"
+            
+            # Extract variables and constants
+            variables = set(re.findall(r'[a-zA-Z][a-zA-Z0-9]*', formula))
+            constants = set(re.findall(r'\b\d+(?:\.\d+)?\b', formula))
+            
+            # Create LaTeX-like representation using string replacement
+            latex = formula
+            replacements = [
+                ('^', '^{'),
+                ('_', '_{'),
+                ('√', r'\sqrt{'),
+                ('sqrt', r'\sqrt{'),
+                ('∑', r'\sum'),
+                ('∏', r'\prod'),
+                ('∫', r'\int'),
+                ('α', r'\alpha'),
+                ('β', r'\beta'),
+                ('γ', r'\gamma'),
+                ('δ', r'\delta'),
+                ('ε', r'\varepsilon'),
+                ('ζ', r'\zeta'),
+                ('η', r'\eta'),
+                ('θ', r'\theta'),
+                ('ι', r'\iota'),
+                ('κ', r'\kappa'),
+                ('λ', r'\lambda'),
+                ('μ', r'\mu'),
+                ('ν', r'\nu'),
+                ('ξ', r'\xi'),
+                ('ο', r'\omicron'),
+                ('π', r'\pi'),
+                ('ρ', r'\rho'),
+                ('σ', r'\sigma'),
+                ('τ', r'\tau'),
+                ('υ', r'\upsilon'),
+                ('φ', r'\phi'),
+                ('χ', r'\chi'),
+                ('ψ', r'\psi'),
+                ('ω', r'\omega'),
+                ('≤', r'\leq'),
+                ('≥', r'\geq'),
+                ('≠', r'\neq'),
+                ('±', r'\pm'),
+                ('∞', r'\infty'),
+                ('∂', r'\partial'),
+                ('∇', r'\nabla'),
+                ('∅', r'\emptyset'),
+                ('∈', r'\in'),
+                ('∉', r'\notin'),
+                ('⊂', r'\subset'),
+                ('⊃', r'\supset'),
+                ('∪', r'\cup'),
+                ('∩', r'\cap'),
+                ('∅', r'\emptyset'),
+                ('∀', r'\forall'),
+                ('∃', r'\exists'),
+                ('∄', r'\nexists'),
+                ('∝', r'\propto'),
+                ('∞', r'\infty'),
+                ('ℵ', r'\aleph'),
+                ('ℜ', r'\Re'),
+                ('ℑ', r'\Im'),
+                ('℘', r'\wp'),
+                ('ℵ', r'\aleph'),
+                ('ℶ', r'\beth'),
+                ('ℷ', r'\gimel'),
+                ('ℸ', r'\daleth')
+            ]
+            
+            for old, new in replacements:
+                latex = latex.replace(old, new)
+            
+            formulas.append(DocumentElement(
+                type='formula',
+                content={
+                    'formula': formula,
+                    'context': context,
+                    'latex': latex,
+                    'variables': list(variables),
+                    'constants': list(constants)
+                },
+                page_number=page_num,
+                metadata={
+                    'formula_index': len(formulas),
+                    'formula_type': formula_type,
+                    'variables': list(variables),
+                    'constants': list(constants),
+                    'has_equals': '=' in formula,
+                    'has_fraction': '/' in formula,
+                    'has_power': '^' in formula or '**' in formula,
+                    'has_subscript': '_' in formula,
+                    'has_square_root': '√' in formula or 'sqrt' in formula,
+                    'has_summation': '∑' in formula,
+                    'has_product': '∏' in formula,
+                    'has_integral': '∫' in formula,
+                    'has_greek': any(greek in formula for greek in "αβγδεζηθικλμνξοπρστυφχψως"),
+                    'has_matrix': '[' in formula and ']' in formula,
+                    'has_inequality': any(op in formula for op in "<>≤≥"),
+                    'has_percentage': '%' in formula,
+                    'has_measurement': bool(re.search(r'\d+\s*(?:m|kg|s|A|K|mol|cd|Hz|N|Pa|J|W|C|V|Ω|F|H|T|Wb|lm|lx|Bq|Gy|Sv|kat|L|t|ha|eV|u|Da|bar|atm|mmHg|Torr|psi|cal|kcal|Wh|kWh|dB|ppm|ppb|ppt|mol/L|g/L|mg/L|μg/L|ng/L|pg/L|mol/m³|g/m³|mg/m³|μg/m³|ng/m³|pg/m³|mol/kg|g/kg|mg/kg|μg/kg|ng/kg|pg/kg|mol/mol|g/g|mg/g|μg/g|ng/g|pg/g|mol/m²|g/m²|mg/m²|μg/m²|ng/m²|pg/m²|mol/s|g/s|mg/s|μg/s|ng/s|pg/s|mol/min|g/min|mg/min|μg/min|ng/min|pg/min|mol/h|g/h|mg/h|μg/h|ng/h|pg/h|mol/d|g/d|mg/d|μg/d|ng/d|pg/d|mol/wk|g/wk|mg/wk|μg/wk|ng/wk|pg/wk|mol/mo|g/mo|mg/mo|μg/mo|ng/mo|pg/mo|mol/yr|g/yr|mg/yr|μg/yr|ng/yr|pg/yr)', formula))
+                }
+            ))
+    
+    return formulas
+
+
+_SENTENCES = [
+    "Người lao động được nghỉ phép năm 12 ngày làm việc theo Điều 113 của Bộ luật Lao động ngày 20/11/2019.",
+    "Mức phụ cấp được tính theo công thức P = L x 30% trong đó L là lương cơ bản.",
+    "Tiền lương làm thêm giờ W = H * 150% * T, áp dụng cho ngày thường.",
+    "Tỷ lệ hoàn thành = số sản phẩm đạt / tổng số sản phẩm, tối thiểu 95%.",
+    "Nồng độ bụi không vượt quá 8 mg/m³ và độ ồn dưới 85 dB trong 8 h làm việc.",
+    "Hệ số điều chỉnh α1 và β2 được áp dụng khi x ≤ 10 hoặc y ≥ 5.",
+    "Chỉ số năng suất E_t = sqrt(a^2 + b^2) được làm tròn đến 2 chữ số.",
+    "Tổng thưởng ∑ thưởng quý chia cho 4 quý, xem bảng [1, 2, 3] ở phụ lục.",
+    "Khoảng cách an toàn tối thiểu 2 m, tải trọng tối đa 50 kg cho mỗi người.",
+    "Nhiệt độ phòng làm việc từ 20 đến 28 độ, độ ẩm 40% đến 80%.",
+    "Thời gian thử việc không quá 60 ngày đối với chức danh cần trình độ cao đẳng.",
+    "f(x) = 2x + 1 là hàm tính điểm thưởng, với x là số năm công tác.",
+    "Phí đóng bảo hiểm $r = 8\\%$ trên tổng thu nhập chịu thuế.",
+    "Người sử dụng lao động phải thông báo trước ít nhất 45 ngày theo Nghị định 145/2020/NĐ-CP.",
+]
+
+
+def make_corpus(pages: int, sentences_per_page: int = 40, seed: int = 42) -> List[str]:
+    """Sinh các trang văn bản chính sách tổng hợp với mật độ công thức, đơn vị, ngày tháng như tài liệu thật"""
+    rng = random.Random(seed)
+    return ["\n".join(rng.choice(_SENTENCES) for _ in range(sentences_per_page)) for _ in range(pages)]
+
+
+def _time(fn, corpus: List[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        # Xóa cache phân loại để mỗi lần đo đều là lần chạy "lạnh"
+        extract_text._analyze_formula.cache_clear()
+        start = time.perf_counter()
+        for page_num, text in enumerate(corpus, 1):
+            fn(text, page_num)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.pages)
+
+    # Kết quả phải giống hệt bản cũ, kể cả thứ tự và formula_index
+    for page_num, text in enumerate(corpus, 1):
+        if extract_formulas_from_text(text, page_num) != legacy_extract_formulas_from_text(text, page_num):
+            raise SystemExit(f"Kết quả khác bản cũ ở trang {page_num}")
+
+    count = sum(len(extract_formulas_from_text(text, n)) for n, text in enumerate(corpus, 1))
+    legacy = _time(legacy_extract_formulas_from_text, corpus, args.repeat)
+    compiled = _time(extract_formulas_from_text, corpus, args.repeat)
+    print(f"{args.pages} trang, {count} công thức")
+    print(f"legacy:   {legacy * 1000:.1f} ms ({legacy / args.pages * 1000:.2f} ms/trang)")
+    print(f"compiled: {compiled * 1000:.1f} ms ({compiled / args.pages * 1000:.2f} ms/trang)")
+    print(f"speedup:  {legacy / compiled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""Benchmark offline cho nạp tài liệu và hỏi đáp, không cần OpenAI key.
+
+OpenAIEmbeddings/ChatOpenAI được thay bằng bản giả có độ trễ cấu hình được (xem
+benchmarks/fakes.py); tài liệu là PDF chính sách tổng hợp (benchmarks/synthetic_pdf.py).
+Mỗi lần chạy dùng một thư mục làm việc tạm (chroma_db, chat_history.db...) và đo:
+
+    extract  extract_from_pdf: thời gian, trang/giây, RSS đỉnh, với từng số worker
+    ingest   process_pdf theo từng bước (hashing, extracting, embedding, indexing) và
+             lần nạp lại khi file không đổi
+    ask      ask_policy_bot tuần tự theo phiên hội thoại: p50/p95, câu hỏi/giây, thời gian
+             từng bước (metadata.timings_ms), số token
+    http     POST /api/chat qua HTTP với nhiều client đồng thời
+
+Kết quả được ghi ra JSON; --compare in chênh lệch so với một lần chạy trước.
+
+    python benchmarks/bench_pipeline.py --pages 20 --questions 30 --concurrency 8
+    python benchmarks/bench_pipeline.py --stages ask,http --llm-latency-ms 0 --compare benchmarks/results/old.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import contextlib
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(os.path.join(REPO_DIR, "backend", "ProcessData"))
+sys.path.append(os.path.join(REPO_DIR, "backend", "models"))
+
+STAGES = ["extract", "ingest", "ask", "http"]
+
+QUESTIONS = [
+    "Người lao động được nghỉ phép năm bao nhiêu ngày?",
+    "Thời gian thử việc tối đa là bao lâu?",
+    "Bảng 1 có lương bình quân cao nhất là bao nhiêu?",
+    "Phân tích bảng 2: phụ cấp của phòng Kế toán là bao nhiêu?",
+    "Công thức tính tiền làm thêm giờ là gì?",
+    "Tỷ lệ đóng bảo hiểm y tế của công ty là bao nhiêu?",
+    "Khiếu nại về tiền lương được giải quyết trong bao lâu?",
+    "Chế độ thai sản được hưởng mấy tháng?",
+]
+
+
+def rss_bytes() -> int:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        # Không có psutil: RSS đỉnh của cả process (KB trên Linux)
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakMemory:
+    """Lấy mẫu RSS trong một thread nền; `peak_mb` là mức tăng đỉnh so với lúc bắt đầu"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    def __enter__(self) -> "PeakMemory":
+        self.start = self.peak = rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+    @property
+    def peak_mb(self) -> float:
+        return round((self.peak - self.start) / 2 ** 20, 1)
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def pct(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 1)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 1),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool):
+    """Ẩn log print của backend trong lúc đo (mọi thread đều ghi ra sys.stdout)"""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_extract(pdf_path: str, pages: int, workers: List[int]) -> Dict[str, Any]:
+    from extract_text import extract_from_pdf
+    results = {}
+    for count in workers:
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            elements = extract_from_pdf(pdf_path, workers=count)
+            seconds = time.perf_counter() - start
+        by_type: Dict[str, int] = {}
+        for element in elements:
+            by_type[element.type] = by_type.get(element.type, 0) + 1
+        results[f"workers_{count}"] = {
+            "seconds": round(seconds, 3),
+            "pages_per_s": round(pages / seconds, 2),
+            "peak_rss_mb": memory.peak_mb,
+            "elements": by_type,
+        }
+    return results
+
+
+def bench_ingest(pdf_path: str, pages: int) -> Dict[str, Any]:
+    from load_documents import process_pdf
+    marks = []
+    counts: Dict[str, Any] = {}
+
+    def progress(stage: Optional[str] = None, **values) -> None:
+        if stage is not None:
+            marks.append((stage, time.perf_counter()))
+        counts.update(values)
+
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        summary = process_pdf(pdf_path, progress=progress)
+        end = time.perf_counter()
+    stages = {}
+    for (stage, at), (_, until) in zip(marks, marks[1:] + [(None, end)]):
+        stages[stage] = round(until - at, 3)
+
+    start_unchanged = time.perf_counter()
+    process_pdf(pdf_path)
+    return {
+        "seconds": round(end - start, 3),
+        "pages_per_s": round(pages / (end - start), 2),
+        "chunks": counts.get("chunks_total", 0),
+        "chunks_per_s": round(counts.get("chunks_total", 0) / (end - start), 2),
+        "stages_s": stages,
+        "unchanged_s": round(time.perf_counter() - start_unchanged, 3),
+        "peak_rss_mb": memory.peak_mb,
+        "summary": summary,
+    }
+
+
+def bench_ask(questions: List[str], sessions: int) -> Dict[str, Any]:
+    from chatbot import ask_policy_bot
+    latencies: List[float] = []
+    stage_totals: Dict[str, List[float]] = {}
+    paths: Dict[str, int] = {}
+    errors = prompt_tokens = completion_tokens = 0
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        for session in range(sessions):
+            for question in questions:
+                began = time.perf_counter()
+                response = ask_policy_bot(question, conversation_id=f"bench-ask-{session}")
+                latencies.append(time.perf_counter() - began)
+                metadata = response.get("metadata") or {}
+                if metadata.get("error"):
+                    errors += 1
+                    continue
+                for stage, ms in (metadata.get("timings_ms") or {}).items():
+                    stage_totals.setdefault(stage, []).append(ms)
+                path = metadata.get("table_query") and "table_query" or ("element" if metadata.get("element_lookup") else "rag")
+                paths[path] = paths.get(path, 0) + 1
+                sources = response.get("sources") or {}
+                prompt_tokens += sources.get("prompt_tokens", 0)
+                completion_tokens += sources.get("completion_tokens", 0)
+        elapsed = time.perf_counter() - start
+    return {
+        "latency": summarize(latencies),
+        "questions_per_s": round(len(latencies) / elapsed, 2),
+        "stage_mean_ms": {stage: round(statistics.mean(values), 1) for stage, values in sorted(stage_totals.items())},
+        "paths": paths,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "errors": errors,
+        "peak_rss_mb": memory.peak_mb,
+    }
+
+
+def bench_http(questions: List[str], concurrency: int, requests_per_client: int) -> Dict[str, Any]:
+    from werkzeug.serving import make_server
+    import app as flask_app
+
+    # Không in log truy cập của werkzeug cho từng request
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, flask_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/chat"
+
+    def client(index: int) -> List[tuple]:
+        results = []
+        conversation_id = f"bench-http-{index}"
+        for i in range(requests_per_client):
+            body = json.dumps({"question": questions[(index + i) % len(questions)], "conversation_id": conversation_id})
+            request = urllib.request.Request(url, data=body.encode("utf-8"), headers={"Content-Type": "application/json"})
+            began = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=120) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except Exception:
+                status = 0
+            results.append((time.perf_counter() - began, status))
+        return results
+
+    try:
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                outcomes = [item for results in pool.map(client, range(concurrency)) for item in results]
+            elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    return {
+        "concurrency": concurrency,
+        "latency": summarize([seconds for seconds, status in outcomes if status == 200]),
+        "requests_per_s": round(len(outcomes) / elapsed, 2),
+        "errors": sum(1 for _, status in outcomes if status != 200),
+        "peak_rss_mb": memory.peak_mb,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(value: Any, prefix: str = "") -> Dict[str, float]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """In các chỉ số thời gian/thông lượng/bộ nhớ thay đổi giữa hai lần chạy"""
+    old, new = _flatten(previous["results"]), _flatten(current["results"])
+    print(f"\nSo với {previous.get('git_commit')} ({previous.get('timestamp')}):")
+    for key in sorted(old.keys() & new.keys()):
+        if not key.endswith(("_ms", "_s", "seconds", "_per_s", "_mb")) or not old[key]:
+            continue
+        change = (new[key] - old[key]) / old[key] * 100
+        # Thông lượng tăng là tốt, các chỉ số còn lại giảm là tốt
+        worse = change < 0 if key.endswith("_per_s") else change > 0
+        marker = "  <-- kém hơn" if worse and abs(change) >= 10 else ""
+        print(f"  {key:<45} {old[key]:>10.2f} -> {new[key]:>10.2f}  ({change:+.1f}%){marker}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", default=",".join(STAGES), help="các bước cần đo, cách nhau bởi dấu phẩy")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--pdf", help="dùng PDF có sẵn thay vì sinh tài liệu tổng hợp")
+    parser.add_argument("--workers", default="1", help="số worker trích xuất, vd. 1,4")
+    parser.add_argument("--sessions", type=int, default=3, help="số phiên hội thoại cho bước ask")
+    parser.add_argument("--questions", type=int, default=len(QUESTIONS), help="số câu hỏi mỗi phiên")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=5, help="số request mỗi client HTTP")
+    parser.add_argument("--embed-latency-ms", type=float, default=40)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--answer-tokens", type=int, default=80)
+    parser.add_argument("--output", help="file JSON kết quả (mặc định benchmarks/results/<thời điểm>.json)")
+    parser.add_argument("--compare", help="file JSON của một lần chạy trước để so sánh")
+    parser.add_argument("--keep", action="store_true", help="giữ thư mục làm việc tạm")
+    parser.add_argument("--verbose", action="store_true", help="hiện log của backend")
+    args = parser.parse_args()
+    stages = [stage for stage in args.stages.split(",") if stage]
+
+    # Cấu hình phải có trước khi import fakes và các module backend
+    os.environ.update({
+        "BENCH_EMBED_LATENCY_MS": str(args.embed_latency_ms),
+        "BENCH_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "BENCH_LLM_PER_TOKEN_MS": str(args.llm_token_ms),
+        "BENCH_ANSWER_TOKENS": str(args.answer_tokens),
+    })
+    # Đo toàn bộ pipeline cho mọi câu hỏi, không trả lời từ cache
+    os.environ.setdefault("ANSWER_CACHE_ENABLED", "0")
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    import fakes
+    fakes.install()
+
+    workdir = tempfile.mkdtemp(prefix="policy-bench-")
+    os.chdir(workdir)
+    pdf_path = os.path.abspath(args.pdf) if args.pdf else os.path.join(workdir, "policy.pdf")
+    if not args.pdf:
+        from synthetic_pdf import generate_policy_pdf
+        generate_policy_pdf(pdf_path, pages=args.pages)
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = len(pdf.pages)
+
+    questions = (QUESTIONS * (args.questions // len(QUESTIONS) + 1))[:args.questions]
+    results: Dict[str, Any] = {}
+    runners: Dict[str, Callable[[], Dict[str, Any]]] = {
+        "extract": lambda: bench_extract(pdf_path, pages, [int(w) for w in args.workers.split(",")]),
+        "ingest": lambda: bench_ingest(pdf_path, pages),
+        "ask": lambda: bench_ask(questions, args.sessions),
+        "http": lambda: bench_http(questions, args.concurrency, args.requests),
+    }
+    try:
+        for stage in STAGES:
+            # ask/http cần dữ liệu đã nạp, nên luôn nạp (không ghi kết quả nếu không yêu cầu)
+            if stage not in stages and not (stage == "ingest" and {"ask", "http"} & set(stages)):
+                continue
+            print(f"[{stage}] ...", flush=True)
+            with quiet(not args.verbose):
+                outcome = runners[stage]()
+            if stage in stages:
+                results[stage] = outcome
+                print(json.dumps(outcome, ensure_ascii=False, indent=2))
+    finally:
+        os.chdir(BENCH_DIR)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")} | {"pdf_pages": pages},
+        "results": results,
+    }
+    output = args.output or os.path.join(BENCH_DIR, "results", f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã ghi kết quả: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Backend giả cho benchmark: thay OpenAIEmbeddings và ChatOpenAI bằng bản cục bộ, tất định.
+
+Vector embedding là bag-of-words được băm vào BENCH_EMBED_DIM chiều (văn bản giống nhau
+cho vector giống nhau, các đoạn chung từ khóa vẫn gần nhau nên truy xuất có nghĩa).
+Chat model trả lời bằng các câu đầu của context, có streaming và usage_metadata như OpenAI.
+Độ trễ mô phỏng được cấu hình bằng biến môi trường (mili giây):
+
+    BENCH_EMBED_LATENCY_MS      mỗi lần gọi embed (mặc định 40)
+    BENCH_EMBED_PER_TEXT_MS     thêm cho mỗi đoạn văn bản (mặc định 0.5)
+    BENCH_LLM_LATENCY_MS        tới token đầu tiên (mặc định 300)
+    BENCH_LLM_PER_TOKEN_MS      mỗi token sinh ra (mặc định 15)
+    BENCH_ANSWER_TOKENS         độ dài câu trả lời (mặc định 80 token)
+
+`install()` phải được gọi trước khi import load_documents/chatbot/app.
+"""
+import os
+import re
+import time
+import zlib
+import math
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+EMBED_DIM = int(os.getenv("BENCH_EMBED_DIM", "256"))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _ms(name: str, default: float) -> float:
+    return float(os.getenv(name, default)) / 1000
+
+
+def count_tokens(text: str) -> int:
+    """Ước lượng số token như các benchmark khác: số từ"""
+    return len(_WORD_RE.findall(text))
+
+
+class FakeEmbeddings(Embeddings):
+    """Embedding tất định: mỗi từ (chữ thường) được băm vào một chiều, vector chuẩn hóa L2"""
+
+    def __init__(self, dim: int = EMBED_DIM, **kwargs: Any):
+        # Nhận và bỏ qua các tham số của OpenAIEmbeddings (api_key, base_url, max_retries...)
+        self.dim = dim
+        self.latency = _ms("BENCH_EMBED_LATENCY_MS", 40)
+        self.per_text = _ms("BENCH_EMBED_PER_TEXT_MS", 0.5)
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in _WORD_RE.findall(text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency + self.per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model tất định thay ChatOpenAI.
+
+    Prompt rút gọn câu hỏi của ConversationalRetrievalChain được trả lời bằng chính câu
+    hỏi tiếp theo; các prompt khác được trả lời bằng BENCH_ANSWER_TOKENS từ đầu của phần
+    Context (hoặc của prompt nếu không có).
+    """
+
+    model_name: str = "fake-gpt"
+    streaming: bool = False
+    answer_tokens: int = int(os.getenv("BENCH_ANSWER_TOKENS", "80"))
+    first_token_latency: float = _ms("BENCH_LLM_LATENCY_MS", 300)
+    per_token_latency: float = _ms("BENCH_LLM_PER_TOKEN_MS", 15)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def get_token_ids(self, text: str) -> List[int]:
+        # ChatOpenAI đếm bằng tiktoken; bản mặc định của langchain cần transformers
+        return [zlib.crc32(word.encode("utf-8")) for word in _WORD_RE.findall(text)]
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        follow_up = re.search(r"Follow Up Input:\s*(.*?)\s*Standalone question:", prompt, re.S)
+        if follow_up:
+            return follow_up.group(1).strip()
+        context = prompt.split("Context:", 1)[-1]
+        words = context.split()[:self.answer_tokens]
+        return " ".join(words) or "Không có thông tin."
+
+    def _usage(self, messages: List[BaseMessage], answer: str) -> dict:
+        prompt_tokens = sum(count_tokens(str(message.content)) for message in messages)
+        completion_tokens = count_tokens(answer)
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        answer = self._answer(messages)
+        time.sleep(self.first_token_latency + self.per_token_latency * count_tokens(answer))
+        message = AIMessage(content=answer, usage_metadata=self._usage(messages, answer))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        answer = self._answer(messages)
+        time.sleep(self.first_token_latency)
+        for i, word in enumerate(answer.split(" ")):
+            if i:
+                time.sleep(self.per_token_latency)
+            token = word if i == 0 else " " + word
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        # Chunk cuối mang usage như OpenAI khi stream_usage=True
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, answer)))
+
+
+def install() -> None:
+    """Thay lớp OpenAI trong langchain_openai bằng bản giả, trước khi các module backend import chúng"""
+    import langchain_openai
+    langchain_openai.OpenAIEmbeddings = FakeEmbeddings
+    langchain_openai.ChatOpenAI = FakeChatModel
+    os.environ.setdefault("OPENAI_API_KEY", "sk-bench-fake")
@@ -0,0 +1,130 @@
+"""Sinh tài liệu chính sách tổng hợp (PDF) cho benchmark: văn bản, bảng kẻ ô và công thức.
+
+Mỗi trang có tiêu đề điều khoản, vài đoạn văn, một công thức tính lương/bảo hiểm và (cứ
+`table_every` trang) một bảng có đường kẻ để pdfplumber nhận ra. Chữ được nhúng dạng
+TrueType nên pdfplumber đọc lại được tiếng Việt. Cùng seed cho ra cùng tài liệu.
+
+    python benchmarks/synthetic_pdf.py out.pdf --pages 20
+"""
+import random
+import argparse
+from typing import List
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+PAGE_SIZE = (8.27, 11.69)  # A4, inch
+
+_SENTENCES = [
+    "Người lao động được nghỉ phép năm {n} ngày làm việc theo quy định của công ty.",
+    "Mức phụ cấp ăn trưa là {m}.000 đồng mỗi tháng cho nhân viên chính thức.",
+    "Thời gian thử việc không quá {n} ngày đối với chức danh cần trình độ cao đẳng.",
+    "Người sử dụng lao động phải thông báo trước ít nhất {n} ngày khi chấm dứt hợp đồng.",
+    "Nhân viên làm thêm giờ vào ngày nghỉ hằng tuần được trả ít nhất {p}% tiền lương.",
+    "Chế độ thai sản được hưởng {n} tháng theo quy định của Luật Bảo hiểm xã hội.",
+    "Công ty đóng bảo hiểm y tế {p}% và người lao động đóng 1,5% tiền lương tháng.",
+    "Khen thưởng cuối năm được xét dựa trên kết quả đánh giá hiệu quả công việc.",
+    "Mọi khiếu nại về tiền lương được giải quyết trong vòng {n} ngày làm việc.",
+    "Nhân viên công tác xa được thanh toán chi phí đi lại và lưu trú theo thực tế.",
+]
+
+_FORMULAS = [
+    "Lương thực nhận = Lương cơ bản × Hệ số + Phụ cấp - {p}% × Lương cơ bản",
+    "Tiền làm thêm giờ = Lương giờ × Số giờ × {p}%",
+    "BHXH = {p}% × Lương đóng bảo hiểm",
+    "Thưởng = Lương tháng × (Điểm đánh giá / 100) × {n}",
+]
+
+_DEPARTMENTS = ["Kế toán", "Nhân sự", "Kỹ thuật", "Kinh doanh", "Hành chính", "Pháp chế", "Marketing"]
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(n=rng.randint(3, 90), m=rng.randint(5, 99) * 10, p=rng.choice([8, 10, 150, 200, 300]))
+
+
+def _vnd(amount: int) -> str:
+    return f"{amount:,}".replace(",", ".")
+
+
+def _wrap(text: str, width: int = 95) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    return lines + ([line] if line else [])
+
+
+def _draw_table(fig, rng: random.Random, top: float, rows: int) -> float:
+    """Vẽ bảng có đường kẻ từ tọa độ `top` (theo phần của trang); trả về tọa độ dưới cùng"""
+    columns = ["Phòng", "Số nhân viên", "Lương bình quân", "Phụ cấp"]
+    left, width, row_height = 0.08, 0.84, 0.022
+    col_width = width / len(columns)
+    data = [columns] + [
+        [rng.choice(_DEPARTMENTS), str(rng.randint(3, 120)),
+         _vnd(rng.randint(8000, 45000) * 1000), _vnd(rng.randint(5, 30) * 100000)]
+        for _ in range(rows)
+    ]
+    bottom = top - row_height * len(data)
+    for r in range(len(data) + 1):
+        y = top - r * row_height
+        fig.add_artist(plt.Line2D([left, left + width], [y, y], color="black", linewidth=0.6))
+    for c in range(len(columns) + 1):
+        x = left + c * col_width
+        fig.add_artist(plt.Line2D([x, x], [top, bottom], color="black", linewidth=0.6))
+    for r, row in enumerate(data):
+        for c, value in enumerate(row):
+            fig.text(left + c * col_width + 0.008, top - (r + 0.7) * row_height, value, fontsize=8,
+                     weight="bold" if r == 0 else "normal")
+    return bottom
+
+
+def generate_policy_pdf(path: str, pages: int = 10, seed: int = 42, table_every: int = 2, table_rows: int = 12) -> str:
+    """Ghi một PDF `pages` trang vào `path` và trả về đường dẫn"""
+    rng = random.Random(seed)
+    with matplotlib.rc_context({"pdf.fonttype": 42, "font.family": "DejaVu Sans"}):
+        with PdfPages(path) as pdf:
+            table_number = 0
+            for page in range(1, pages + 1):
+                fig = plt.figure(figsize=PAGE_SIZE)
+                y = 0.94
+                fig.text(0.08, y, f"Điều {page}. Quy định về chế độ làm việc và tiền lương", fontsize=12, weight="bold")
+                y -= 0.035
+                for _ in range(3):
+                    paragraph = " ".join(_fill(rng.choice(_SENTENCES), rng) for _ in range(4))
+                    for line in _wrap(paragraph):
+                        fig.text(0.08, y, line, fontsize=9)
+                        y -= 0.018
+                    y -= 0.01
+                fig.text(0.08, y, "Công thức: " + _fill(rng.choice(_FORMULAS), rng), fontsize=9)
+                y -= 0.035
+                if table_every and page % table_every == 0:
+                    table_number += 1
+                    fig.text(0.08, y, f"Bảng {table_number}: Lương và phụ cấp theo phòng ban", fontsize=9, weight="bold")
+                    y = _draw_table(fig, rng, y - 0.012, table_rows) - 0.03
+                paragraph = " ".join(_fill(rng.choice(_SENTENCES), rng) for _ in range(3))
+                for line in _wrap(paragraph):
+                    if y < 0.05:
+                        break
+                    fig.text(0.08, y, line, fontsize=9)
+                    y -= 0.018
+                pdf.savefig(fig)
+                plt.close(fig)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(generate_policy_pdf(args.output, pages=args.pages, seed=args.seed))
+
+
+if __name__ == "__main__":
+    main()
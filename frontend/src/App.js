@@ -10,6 +10,7 @@ function App() {
   const [messages, setMessages] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [conversations, setConversations] = useState([]);
+  const [conversationsCursor, setConversationsCursor] = useState(null);
   const [activeConversationId, setActiveConversationId] = useState(null);
   const messagesEndRef = useRef(null);
 
@@ -27,10 +28,15 @@ function App() {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
-  const fetchConversations = async () => {
+  // Trang đầu danh sách hội thoại; trang sau được nạp bằng cursor khi bấm "Xem thêm"
+  const fetchConversations = async (cursor = null) => {
     try {
-      const response = await axios.get('http://localhost:5000/api/conversations');
-      setConversations(response.data);
+      const response = await axios.get('http://localhost:5000/api/conversations', {
+        params: cursor ? { cursor } : {}
+      });
+      const page = response.data.conversations;
+      setConversations((previous) => (cursor ? [...previous, ...page] : page));
+      setConversationsCursor(response.data.next_cursor);
     } catch (error) {
       console.error('Error fetching conversations:', error);
     }
@@ -106,6 +112,8 @@ function App() {
           conversations={conversations}
           onSelectConversation={handleSelectConversation}
           activeConversationId={activeConversationId}
+          hasMore={Boolean(conversationsCursor)}
+          onLoadMore={() => fetchConversations(conversationsCursor)}
         />
         <div className="chat-main">
           <div className="chat-header">
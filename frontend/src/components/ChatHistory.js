@@ -1,7 +1,7 @@
 import React from 'react';
 import './ChatHistory.css';
 
-const ChatHistory = ({ conversations, onSelectConversation, activeConversationId }) => {
+const ChatHistory = ({ conversations, onSelectConversation, activeConversationId, hasMore, onLoadMore }) => {
   // Nhóm các cuộc hội thoại theo ngày
   const groupedConversations = conversations.reduce((groups, conv) => {
     const date = new Date(conv.date).toLocaleDateString('vi-VN');
@@ -39,6 +39,11 @@ const ChatHistory = ({ conversations, onSelectConversation, activeConversationId
             ))}
           </div>
         ))}
+        {hasMore && (
+          <button className="chat-history-more" onClick={onLoadMore}>
+            Xem thêm
+          </button>
+        )}
       </div>
     </div>
   );
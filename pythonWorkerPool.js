@@ -0,0 +1,163 @@
+const { spawn } = require('child_process');
+const readline = require('readline');
+
+// Một process Python sống lâu (`python <script> --worker`) nói JSON lines qua stdin/stdout
+class PythonWorker {
+  constructor(pool, index) {
+    this.pool = pool;
+    this.index = index;
+    this.pending = new Map();
+    this.ready = false;
+    this.start();
+  }
+
+  start() {
+    const { python, script, cwd, env } = this.pool.options;
+    this.process = spawn(python, [script, '--worker'], { cwd, env: { ...process.env, ...env } });
+    this.ready = false;
+
+    readline.createInterface({ input: this.process.stdout }).on('line', (line) => this.onLine(line));
+    // stderr là log của backend Python
+    readline.createInterface({ input: this.process.stderr }).on('line', (line) => {
+      console.error(`[${this.pool.name}#${this.index}] ${line}`);
+    });
+    // Ghi vào worker vừa chết: lỗi được xử lý ở sự kiện exit
+    this.process.stdin.on('error', (error) => console.error(`[${this.pool.name}#${this.index}] stdin error:`, error.message));
+    this.process.on('exit', (code, signal) => this.onExit(code, signal));
+    this.process.on('error', (error) => console.error(`[${this.pool.name}#${this.index}] spawn error:`, error));
+  }
+
+  onLine(line) {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch (error) {
+      console.error(`[${this.pool.name}#${this.index}] invalid output:`, line);
+      return;
+    }
+    if (message.event === 'ready') {
+      this.ready = true;
+      this.pool.dispatch();
+      return;
+    }
+    const request = this.pending.get(message.id);
+    if (!request) {
+      return;
+    }
+    if (message.event === 'progress') {
+      if (request.onProgress) {
+        request.onProgress(message);
+      }
+      return;
+    }
+    this.finish(message.id);
+    if (message.ok) {
+      request.resolve(message.result);
+    } else {
+      request.reject(new Error(message.error || 'Python worker error'));
+    }
+  }
+
+  send(request) {
+    if (request.timeoutMs) {
+      request.timer = setTimeout(() => {
+        // Process đang kẹt: không nhận thêm request và khởi động lại; các request khác
+        // của nó được trả về đầu hàng đợi để chạy trên worker khác
+        this.ready = false;
+        this.pending.delete(request.id);
+        this.requeuePending();
+        request.reject(new Error(`Python worker timeout after ${request.timeoutMs} ms`));
+        this.process.kill();
+        this.pool.dispatch();
+      }, request.timeoutMs);
+    }
+    this.pending.set(request.id, request);
+    this.process.stdin.write(JSON.stringify({ id: request.id, method: request.method, params: request.params }) + '\n');
+  }
+
+  finish(id) {
+    const request = this.pending.get(id);
+    if (request && request.timer) {
+      clearTimeout(request.timer);
+    }
+    this.pending.delete(id);
+    this.pool.dispatch();
+  }
+
+  requeuePending() {
+    const requests = [...this.pending.values()];
+    for (const request of requests) {
+      clearTimeout(request.timer);
+      request.timer = null;
+    }
+    this.pending.clear();
+    this.pool.queue.unshift(...requests);
+  }
+
+  onExit(code, signal) {
+    this.ready = false;
+    for (const request of this.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(new Error(`Python worker exited (code ${code}, signal ${signal})`));
+    }
+    this.pending.clear();
+    if (!this.pool.closed) {
+      console.error(`[${this.pool.name}#${this.index}] exited, restarting`);
+      setTimeout(() => this.start(), this.pool.options.restartDelayMs);
+    }
+  }
+}
+
+// Pool worker Python: request được gửi tới worker sẵn sàng có ít request đang chạy nhất,
+// mỗi worker nhận tối đa `maxInFlight` request, phần còn lại chờ trong hàng đợi
+class PythonWorkerPool {
+  constructor(name, options) {
+    this.name = name;
+    this.options = {
+      python: process.env.PYTHON_BIN || 'python',
+      size: 1,
+      maxInFlight: 4,
+      timeoutMs: 120000,
+      restartDelayMs: 1000,
+      env: {},
+      ...options
+    };
+    this.queue = [];
+    this.nextId = 1;
+    this.closed = false;
+    this.workers = Array.from({ length: Math.max(1, this.options.size) }, (_, i) => new PythonWorker(this, i));
+  }
+
+  call(method, params = {}, { onProgress, timeoutMs = this.options.timeoutMs } = {}) {
+    return new Promise((resolve, reject) => {
+      this.queue.push({ id: this.nextId++, method, params, onProgress, timeoutMs, resolve, reject });
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    while (this.queue.length) {
+      const available = this.workers
+        .filter((worker) => worker.ready && worker.pending.size < this.options.maxInFlight)
+        .sort((a, b) => a.pending.size - b.pending.size);
+      if (!available.length) {
+        return;
+      }
+      available[0].send(this.queue.shift());
+    }
+  }
+
+  close() {
+    this.closed = true;
+    for (const request of this.queue) {
+      request.reject(new Error('Python worker pool closed'));
+    }
+    this.queue = [];
+    // Đóng stdin: worker chạy nốt các request dở rồi tự thoát
+    for (const worker of this.workers) {
+      worker.process.stdin.end();
+    }
+  }
+}
+
+module.exports = { PythonWorkerPool };
@@ -1,9 +1,9 @@
 const express = require('express');
 const cors = require('cors');
 const dotenv = require('dotenv');
-const { spawn } = require('child_process');
 const fs = require('fs');
 const path = require('path');
+const { PythonWorkerPool } = require('./pythonWorkerPool');
 
 dotenv.config();
 
@@ -13,32 +13,40 @@ const port = process.env.PORT || 5000;
 app.use(cors());
 app.use(express.json());
 
+// Worker Python chạy cùng thư mục với app.py để dùng chung chroma_db và chat_history.db
+const pythonCwd = process.env.PYTHON_WORKER_CWD || path.join(__dirname, 'backend', 'ProcessData');
+
+// Các process Python sống lâu: import langchain/Chroma và tạo chain một lần, không spawn lại mỗi request
+const chatWorkers = new PythonWorkerPool('chatbot', {
+  script: path.join(__dirname, 'backend', 'models', 'chatbot.py'),
+  cwd: pythonCwd,
+  size: parseInt(process.env.CHAT_WORKERS || '2', 10),
+  maxInFlight: parseInt(process.env.CHAT_WORKER_IN_FLIGHT || '4', 10),
+  timeoutMs: parseInt(process.env.CHAT_WORKER_TIMEOUT_MS || '60000', 10)
+});
+
+const ingestWorkers = new PythonWorkerPool('load_documents', {
+  script: path.join(__dirname, 'backend', 'ProcessData', 'load_documents.py'),
+  cwd: pythonCwd,
+  size: 1,
+  maxInFlight: 1,
+  timeoutMs: parseInt(process.env.INGEST_WORKER_TIMEOUT_MS || '1800000', 10)
+});
+
 // Route để xử lý chat
 app.post('/api/chat', async (req, res) => {
   try {
-    const { message } = req.body;
-    
-    // Gọi Python script để xử lý câu hỏi
-    const pythonProcess = spawn('python', ['chatbot.py', message]);
-    
-    let result = '';
-    let error = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      result += data.toString();
-    });
+    const { message, conversation_id } = req.body;
+    if (!message) {
+      return res.status(400).json({ error: 'No message provided' });
+    }
 
-    pythonProcess.stderr.on('data', (data) => {
-      error += data.toString();
-    });
-
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        console.error('Python Error:', error);
-        return res.status(500).json({ error: 'Error processing request' });
-      }
-      res.json({ response: result.trim() });
-    });
+    const result = await chatWorkers.call('ask', { question: message, conversation_id });
+    if (result.metadata && result.metadata.error) {
+      console.error('Python Error:', result.metadata.error);
+      return res.status(500).json({ error: 'Error processing request' });
+    }
+    res.json({ response: result.answer, sources: result.sources, metadata: result.metadata });
   } catch (error) {
     console.error('Error:', error);
     res.status(500).json({ error: 'Internal server error' });
@@ -49,34 +57,24 @@ app.post('/api/chat', async (req, res) => {
 app.post('/api/upload-pdf', async (req, res) => {
   try {
     const { filePath } = req.body;
-    
-    // Gọi Python script để xử lý PDF
-    const pythonProcess = spawn('python', ['load_documents.py', filePath]);
-    
-    let result = '';
-    let error = '';
-
-    pythonProcess.stdout.on('data', (data) => {
-      result += data.toString();
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-      error += data.toString();
-    });
+    if (!filePath || !fs.existsSync(filePath)) {
+      return res.status(404).json({ error: `File không tồn tại: ${filePath}` });
+    }
 
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        console.error('Python Error:', error);
-        return res.status(500).json({ error: 'Error processing PDF' });
-      }
-      res.json({ message: 'PDF processed successfully' });
-    });
+    const summary = await ingestWorkers.call('process_pdf', { file_path: path.resolve(filePath) });
+    res.json({ message: 'PDF processed successfully', summary });
   } catch (error) {
     console.error('Error:', error);
     res.status(500).json({ error: 'Error processing PDF' });
   }
 });
 
-app.listen(port, () => {
+const server = app.listen(port, () => {
   console.log(`Server is running on port ${port}`);
-}); 
\ No newline at end of file
+});
+
+process.on('SIGTERM', () => {
+  server.close();
+  chatWorkers.close();
+  ingestWorkers.close();
+});